@@ -0,0 +1,88 @@
+"""
+Benchmark del parsing HTML delle timeline Nitter.
+
+Confronta il vecchio percorso (analisi completa della pagina con html.parser)
+con parse_html_timeline (sottoalbero della timeline tramite SoupStrainer, lxml
+se installato, stop dopo MAX_TWEETS_PER_FETCH elementi).
+
+Uso:
+    python benchmarks/bench_html_parse.py [pagina.html ...]
+
+Senza argomenti usa le pagine salvate in benchmarks/pages/.
+"""
+import glob
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES_DIR = os.path.join(ROOT, 'benchmarks', 'pages')
+ROUNDS = 50
+
+def import_bot():
+    """Importa il modulo del bot senza toccare i file di stato nella directory corrente"""
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:benchmark')
+    logging.disable(logging.CRITICAL)
+    sys.path.insert(0, ROOT)
+    os.chdir(tempfile.mkdtemp(prefix='bench-'))
+    import twitter_telegram_bot
+    return twitter_telegram_bot
+
+def baseline_parse(content):
+    """Percorso originale (solo ricerca dei contenitori): analisi completa della pagina e catena di find_all"""
+    soup = BeautifulSoup(content, 'html.parser')
+    containers = (
+        soup.find_all('div', class_='timeline-item') or
+        soup.find_all('div', class_='tweet') or
+        soup.find_all('article') or
+        soup.find_all('div', attrs={'data-tweet-id': True})
+    )
+    return containers[:5]
+
+def measure(func, content):
+    """Tempo mediano (ms) e picco di memoria (KB) di una funzione di parsing"""
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        func(content)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    func(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak / 1024
+
+def main():
+    bot_module = import_bot()
+    pages = sys.argv[1:] or sorted(glob.glob(os.path.join(PAGES_DIR, '*.html')))
+    if not pages:
+        print(f"Nessuna pagina trovata in {PAGES_DIR}")
+        return 1
+
+    print(f"Parser HTML: {bot_module.HTML_PARSER}, {ROUNDS} ripetizioni per pagina\n")
+    print(f"{'pagina':<30} {'vecchio ms':>11} {'nuovo ms':>9} {'x':>6} {'vecchio KB':>11} {'nuovo KB':>9}")
+
+    for page in pages:
+        with open(page, 'rb') as f:
+            content = f.read()
+
+        instance = f"bench://{os.path.basename(page)}"
+        # Primo parsing completo: individua e memorizza la strategia per l'istanza
+        tweets = bot_module.parse_html_timeline(content, instance, 'bench')
+        new_parse = lambda data: bot_module.parse_html_timeline(data, instance, 'bench')
+
+        old_ms, old_kb = measure(baseline_parse, content)
+        new_ms, new_kb = measure(new_parse, content)
+        print(f"{os.path.basename(page):<30} {old_ms:>11.2f} {new_ms:>9.2f} {old_ms / new_ms:>6.1f} {old_kb:>11.0f} {new_kb:>9.0f}  ({len(tweets)} tweet)")
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
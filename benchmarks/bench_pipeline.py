@@ -0,0 +1,317 @@
+"""
+Benchmark end-to-end offline del bot, con Nitter e Bot API di Telegram finti
+(benchmarks/fake_services.py, eseguiti in un processo separato).
+
+Scenari:
+- scrape: scrape_twitter_nitter su istanze con latenza, errori 503 e istanze che non rispondono
+- fanout: per ogni numero di canali un nuovo tweet viene pubblicato sul Nitter finto,
+  rilevato dal ciclo di tweet_monitor, accodato da send_tweet_to_all_channels e
+  consegnato dal delivery_worker a tutti i canali (con 429 oltre il limite di Telegram);
+  con --delivery-shards N le consegne passano da N processi di consegna
+
+Riporta latenze (p50/p95), throughput delle consegne, risposte 429 e memoria (RSS).
+Con --save i risultati vengono salvati in JSON; con --baseline vengono confrontati con
+un'esecuzione precedente e lo script esce con codice 1 se una metrica peggiora oltre
+--tolerance.
+
+Uso:
+    python benchmarks/bench_pipeline.py [--channels 10 1000 10000] [--save base.json] [--baseline base.json]
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+import requests
+
+import fake_services
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_CHAT_ID = -1001000000000
+SCRAPE_ACCOUNT = 'benchscrape'
+REGRESSION_MIN_SECONDS = 0.05  # Differenze di tempo più piccole sono considerate rumore
+INFORMATIONAL_METRICS = ('delivered', 'rate_limited')  # Riportate ma non confrontate con la baseline
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end con servizi finti")
+    parser.add_argument('--channels', type=int, nargs='+', default=[10, 1000, 10000], help="Numero di canali per scenario di fan-out")
+    parser.add_argument('--scrape-rounds', type=int, default=20, help="Chiamate a scrape_twitter_nitter nello scenario scrape")
+    parser.add_argument('--instances', type=int, default=8, help="Istanze Nitter finte (usate sia per RSS sia per HTML)")
+    parser.add_argument('--nitter-latency', type=float, default=0.05, help="Latenza media (s) delle istanze Nitter")
+    parser.add_argument('--nitter-failure-rate', type=float, default=0.1, help="Probabilità di un 503 dalle istanze Nitter")
+    parser.add_argument('--dead-instances', type=int, default=1, help="Istanze Nitter che non rispondono")
+    parser.add_argument('--images', type=int, default=1, help="Immagini allegate al tweet pubblicato nel fan-out")
+    parser.add_argument('--delivery-shards', type=int, default=1, help="DELIVERY_SHARDS del bot (processi di consegna)")
+    parser.add_argument('--send-rate', type=float, default=300, help="GLOBAL_SEND_RATE del bot durante il benchmark")
+    parser.add_argument('--telegram-limit', type=int, default=250, help="Messaggi al secondo oltre i quali Telegram risponde 429")
+    parser.add_argument('--telegram-latency', type=float, default=0.0, help="Latenza (s) di ogni chiamata alla Bot API")
+    parser.add_argument('--save', help="Salva i risultati in questo file JSON")
+    parser.add_argument('--baseline', help="Confronta con i risultati salvati in questo file JSON")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Peggioramento relativo ammesso rispetto alla baseline")
+    parser.add_argument('--verbose', action='store_true', help="Mostra i log del bot")
+    parser.add_argument('--trace', help="Scrive gli span (scrape/parse/render/fan-out) del bot in questo file JSON Lines")
+    return parser.parse_args()
+
+def start_services(args):
+    """Avvia Nitter e Telegram finti in un processo separato, ritorna (url Nitter, url Telegram, processo)"""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=fake_services.serve,
+        args=(
+            {
+                'instances': args.instances,
+                'latency': args.nitter_latency,
+                'failure_rate': args.nitter_failure_rate,
+                'dead': args.dead_instances
+            },
+            {'rate_limit': args.telegram_limit, 'latency': args.telegram_latency},
+            sender
+        ),
+        daemon=True
+    )
+    process.start()
+    nitter_port, telegram_port = receiver.recv()
+    return f"http://127.0.0.1:{nitter_port}", f"http://127.0.0.1:{telegram_port}", process
+
+def import_bot(args):
+    """Importa il modulo del bot in una directory temporanea (l'import non avvia nessun servizio)"""
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:benchmark')
+    os.environ['GLOBAL_SEND_RATE'] = str(args.send_rate)
+    os.environ['DELIVERY_SHARDS'] = str(args.delivery_shards)
+    if not args.verbose:
+        # Vale anche per i processi di consegna, che importano di nuovo il modulo
+        os.environ['LOG_LEVEL'] = 'CRITICAL'
+    if args.trace:
+        # Gli span passano da un logger dedicato: i log del bot vanno silenziati per livello
+        os.environ['TRACE_FILE'] = args.trace
+    elif not args.verbose:
+        logging.disable(logging.CRITICAL)
+    sys.path.insert(0, ROOT)
+    os.chdir(tempfile.mkdtemp(prefix='bench-'))
+    import twitter_telegram_bot
+    return twitter_telegram_bot
+
+def configure_bot(bot_module, nitter_url, telegram_url, instances):
+    """Punta il bot ai servizi finti e avvia il monitoraggio e le consegne"""
+    fake_instances = [f"{nitter_url}/n{i}" for i in range(instances)]
+    bot_module.RSS_INSTANCES[:] = fake_instances
+    bot_module.NITTER_INSTANCES[:] = fake_instances
+    # Anche nell'ambiente: i processi di consegna leggono TELEGRAM_API_URL all'import
+    os.environ['TELEGRAM_API_URL'] = bot_module.telebot.apihelper.API_URL = f"{telegram_url}/bot{{0}}/{{1}}"
+    bot_module.configure_logging()
+    bot_module.open_stores()
+    bot_module.threading.Thread(target=bot_module.tweet_monitor, daemon=True).start()
+    bot_module.start_delivery()
+
+def percentile(values, fraction):
+    """Percentile per interpolazione lineare (0 se non ci sono valori)"""
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[round(fraction * 100) - 1]
+
+def rss_mb():
+    """Memoria residente attuale del processo (MB)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return peak_rss_mb()
+
+def peak_rss_mb():
+    """Picco di memoria residente del processo (MB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def publish(nitter_url, account, text, images=0):
+    """Pubblica un tweet sul Nitter finto"""
+    response = requests.post(f"{nitter_url}/_publish", json={'user': account, 'text': text, 'images': images}, timeout=5)
+    response.raise_for_status()
+    return response.json()
+
+def telegram_stats(telegram_url, full=False):
+    return requests.get(f"{telegram_url}/_stats" + ('?full' if full else ''), timeout=30).json()
+
+def bench_scrape(bot_module, nitter_url, rounds):
+    """Latenza di scrape_twitter_nitter; a round alterni viene pubblicato un nuovo tweet"""
+    timings = []
+    fallbacks = 0
+    for n in range(rounds):
+        if n % 2 == 0:
+            publish(nitter_url, SCRAPE_ACCOUNT, f"Scrape benchmark {n}: here we go! #TransferNews")
+        started = time.perf_counter()
+        tweets = bot_module.scrape_twitter_nitter(SCRAPE_ACCOUNT)
+        timings.append(time.perf_counter() - started)
+        if tweets and tweets[0].get('is_test'):
+            fallbacks += 1
+    return {
+        'p50_s': percentile(timings, 0.5),
+        'p95_s': percentile(timings, 0.95),
+        'max_s': max(timings),
+        'fallbacks': fallbacks,
+        'rss_mb': rss_mb()
+    }
+
+def bench_fanout(bot_module, nitter_url, telegram_url, channels, images, send_rate):
+    """
+    Pubblica un tweet seguito da `channels` canali e misura: rilevamento da parte di
+    tweet_monitor, latenza di consegna per chat, throughput e memoria.
+    """
+    account = f"fanout{channels}"
+    registry = bot_module.registry
+
+    # Il primo controllo (senza iscritti) segna come pubblicati i tweet già presenti
+    bot_module.poll_account(account)
+
+    chat_ids = [FIRST_CHAT_ID - channels * 10 - i for i in range(channels)]
+    with registry.lock:
+        for chat_id in chat_ids:
+            registry.add(chat_id, f"Bench {chat_id}")
+            registry.unfollow(chat_id, bot_module.TWITTER_USERNAME)
+            registry.follow(chat_id, account)
+    # I processi di consegna leggono gli iscritti dal file dei canali
+    registry.flush()
+
+    requests.post(f"{telegram_url}/_reset", timeout=5)
+    detected_key = ('tweets_detected_total', (('account', account),))
+    detected_before = bot_module.metrics.counters.get(detected_key, 0)
+    sent_before = bot_module.metrics.counters.get(('deliveries_total', (('outcome', 'sent'),)), 0)
+    timeout = 30 + channels / send_rate * 5
+
+    started = time.time()
+    publish(nitter_url, account, f"Fan-out benchmark a {channels} canali: here we go! #TransferNews", images)
+    bot_module.poll_scheduler.sync(registry.accounts())
+
+    detected_at = None
+    delivered = 0
+    while time.time() - started < timeout:
+        if detected_at is None:
+            if bot_module.metrics.counters.get(detected_key, 0) > detected_before:
+                detected_at = time.time()
+            time.sleep(0.005)
+            continue
+        delivered = telegram_stats(telegram_url)['chats']
+        if delivered >= channels and not len(bot_module.delivery_queue):
+            break
+        time.sleep(0.05)
+
+    stats = telegram_stats(telegram_url, full=True)
+    deliveries = sorted(t - started for t in stats['deliveries'])
+    # Le metriche dei processi di consegna arrivano con un piccolo ritardo
+    settle_until = time.time() + 2
+    while True:
+        sent = bot_module.metrics.counters.get(('deliveries_total', (('outcome', 'sent'),)), 0) - sent_before
+        if sent >= len(deliveries) or time.time() > settle_until:
+            break
+        time.sleep(0.05)
+
+    registry.remove_many(chat_ids)
+    registry.flush()
+    bot_module.poll_scheduler.sync(registry.accounts())
+
+    detect_s = (detected_at - started) if detected_at else float('nan')
+    last_s = deliveries[-1] if deliveries else float('nan')
+    delivery_window = last_s - detect_s
+    return {
+        'delivered': len(deliveries),
+        'complete': len(deliveries) == channels and sent == channels,
+        'detect_s': detect_s,
+        'p50_s': percentile(deliveries, 0.5),
+        'p95_s': percentile(deliveries, 0.95),
+        'e2e_s': last_s,
+        'deliveries_per_s': len(deliveries) / delivery_window if delivery_window > 0 else 0.0,
+        'rate_limited': stats['rate_limited'],
+        'rss_mb': rss_mb(),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def flatten(results):
+    """Risultati come {"scenario.metrica": valore} per il confronto con la baseline"""
+    flat = {}
+    for scenario, values in results.items():
+        for name, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                flat[f"{scenario}.{name}"] = value
+    return flat
+
+def find_regressions(results, baseline, tolerance):
+    """Metriche peggiorate oltre la tolleranza: lista di (nome, baseline, attuale)"""
+    current = flatten(results)
+    regressions = []
+    for name, before in flatten(baseline).items():
+        now = current.get(name)
+        if now is None or before != before or now != now or name.endswith(INFORMATIONAL_METRICS):
+            continue
+        if name.endswith('_per_s'):
+            worse = now < before * (1 - tolerance)
+        else:
+            worse = now > before * (1 + tolerance)
+            if name.endswith('_s'):
+                worse = worse and now - before > REGRESSION_MIN_SECONDS
+            elif name.endswith(('_mb', 'fallbacks')):
+                worse = worse and now - before > 1
+        if worse:
+            regressions.append((name, before, now))
+    return regressions
+
+def print_results(results):
+    scrape = results['scrape']
+    print(f"scrape_twitter_nitter: p50 {scrape['p50_s'] * 1000:.0f} ms, p95 {scrape['p95_s'] * 1000:.0f} ms, "
+          f"max {scrape['max_s'] * 1000:.0f} ms, {scrape['fallbacks']} fallback, RSS {scrape['rss_mb']:.0f} MB\n")
+    print(f"{'canali':>7} {'consegnati':>11} {'rilev. ms':>10} {'p50 ms':>8} {'p95 ms':>8} {'totale ms':>10} {'msg/s':>7} {'429':>5} {'RSS MB':>7} {'picco MB':>9}")
+    for scenario, fanout in results.items():
+        if not scenario.startswith('fanout.'):
+            continue
+        channels = int(scenario.split('.')[1])
+        flag = '' if fanout['complete'] else '  (incompleto)'
+        print(f"{channels:>7} {fanout['delivered']:>11} {fanout['detect_s'] * 1000:>10.0f} {fanout['p50_s'] * 1000:>8.0f} "
+              f"{fanout['p95_s'] * 1000:>8.0f} {fanout['e2e_s'] * 1000:>10.0f} {fanout['deliveries_per_s']:>7.0f} "
+              f"{fanout['rate_limited']:>5} {fanout['rss_mb']:>7.0f} {fanout['peak_rss_mb']:>9.0f}{flag}")
+
+def main():
+    args = parse_args()
+    # Percorsi risolti prima di spostarsi nella directory temporanea
+    save_path = args.save and os.path.abspath(args.save)
+    baseline_path = args.baseline and os.path.abspath(args.baseline)
+    args.trace = args.trace and os.path.abspath(args.trace)
+    nitter_url, telegram_url, services = start_services(args)
+    bot_module = import_bot(args)
+    configure_bot(bot_module, nitter_url, telegram_url, args.instances)
+
+    print(f"Nitter finto: {args.instances} istanze ({args.dead_instances} non rispondono), latenza {args.nitter_latency * 1000:.0f} ms, "
+          f"errori {args.nitter_failure_rate:.0%}; Telegram finto: {args.telegram_limit} msg/s, bot a {args.send_rate:.0f} msg/s\n")
+
+    results = {'scrape': bench_scrape(bot_module, nitter_url, args.scrape_rounds)}
+    for channels in args.channels:
+        results[f"fanout.{channels}"] = bench_fanout(bot_module, nitter_url, telegram_url, channels, args.images, args.send_rate)
+    services.terminate()
+
+    print_results(results)
+    status = 0 if all(value['complete'] for key, value in results.items() if key.startswith('fanout.')) else 1
+
+    if save_path:
+        with open(save_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        print()
+        for name, before, now in regressions:
+            print(f"❌ Regressione {name}: {before:.3f} -> {now:.3f}")
+        if regressions:
+            status = 1
+        else:
+            print(f"✅ Nessuna regressione oltre il {args.tolerance:.0%} rispetto a {args.baseline}")
+
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,450 @@
+"""
+Servizi finti per i benchmark offline: un Nitter (RSS e HTML) e la Bot API di Telegram.
+
+Nitter finto: le istanze sono prefissi di percorso (http://host:porta/n0, /n1, ...) con
+latenza, errori 503 casuali e istanze "morte" che non rispondono. Il feed RSS segue il
+formato di Nitter, la pagina HTML riusa la pagina salvata in benchmarks/pages/ con la
+timeline generata dai tweet pubblicati tramite POST /_publish. Entrambi mostrano PAGE_SIZE
+tweet; le pagine HTML successive si raggiungono con il link "Load more" (?cursor=).
+
+Telegram finto: risponde ai metodi usati dal bot (sendMessage, sendPhoto, sendMediaGroup,
+getMe, ...) e restituisce 429 con retry_after quando si supera il limite di messaggi
+al secondo. GET /_stats riporta messaggi ricevuti, modifiche (editMessageText,
+editMessageCaption), eliminazioni (deleteMessage), 429 e orario di consegna per chat.
+
+Uso autonomo (per provare il bot a mano):
+    python benchmarks/fake_services.py [--nitter-port 8081] [--telegram-port 8082]
+"""
+import argparse
+import html
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RECORDED_PAGE = os.path.join(ROOT, 'benchmarks', 'pages', 'nitter_timeline.html')
+SEED_TWEETS = 20  # Tweet già presenti nella timeline di ogni account
+PAGE_SIZE = 20  # Tweet per pagina HTML (con link "Load more" alla successiva) e nel feed RSS
+FIRST_STATUS_ID = 1742995694426036921
+DEAD_INSTANCE_HANG = 60  # Secondi di attesa delle istanze che non rispondono
+
+# PNG 1x1 restituito per le immagini dei tweet
+PIXEL_PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082'
+)
+
+RSS_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<rss xmlns:atom="http://www.w3.org/2005/Atom" xmlns:dc="http://purl.org/dc/elements/1.1/" version="2.0">
+  <channel>
+    <atom:link href="{base}/{user}/rss" rel="self" type="application/rss+xml" />
+    <title>{user} / @{user}</title>
+    <link>{base}/{user}</link>
+    <description>Twitter feed for: @{user}. Generated by nitter</description>
+    <language>en-us</language>
+    <ttl>40</ttl>
+{items}
+  </channel>
+</rss>
+"""
+
+RSS_ITEM_TEMPLATE = """    <item>
+      <title>{title}</title>
+      <dc:creator>@{user}</dc:creator>
+      <description><![CDATA[<p>{text}</p>{images}]]></description>
+      <pubDate>{date}</pubDate>
+      <guid>{base}/{user}/status/{status_id}#m</guid>
+      <link>{base}/{user}/status/{status_id}#m</link>
+    </item>"""
+
+HTML_ITEM_TEMPLATE = """<div class="timeline-item " data-username="{user}">
+<a class="tweet-link" href="/{user}/status/{status_id}#m"></a>
+<div class="tweet-body">
+<div>
+<div class="tweet-header">
+<a class="tweet-avatar" href="/{user}"><img class="avatar round" src="/pic/profile_images%2F{status_id}_bigger.jpg" alt="" loading="lazy"></a>
+<div class="tweet-name-row">
+<div class="fullname-and-username">
+<a class="fullname" href="/{user}" title="{user}">{user}</a>
+<a class="username" href="/{user}" title="@{user}">@{user}</a>
+</div>
+<span class="tweet-date"><a href="/{user}/status/{status_id}#m" title="{date}">{date}</a></span>
+</div>
+</div>
+</div>
+<div class="tweet-content media-body" dir="auto">{text}</div>
+{attachments}
+<div class="tweet-stats"><span class="tweet-stat"><div class="icon-container"><span class="icon-comment" title=""></span> 75,390</div></span><span class="tweet-stat"><div class="icon-container"><span class="icon-retweet" title=""></span> 39,454</div></span><span class="tweet-stat"><div class="icon-container"><span class="icon-heart" title=""></span> 64,995</div></span></div>
+</div>
+</div>
+"""
+
+HTML_IMAGE_TEMPLATE = '<div class="attachments card"><div class="gallery-row" style=""><div class="attachment image"><a class="still-image" href="/pic/orig/{name}" target="_blank"><img src="/pic/{name}" alt="" loading="lazy"></a></div></div></div>'
+
+def load_recorded_page():
+    """Intestazione e chiusura della pagina Nitter salvata (timeline e "Load more" vengono rigenerati)"""
+    with open(RECORDED_PAGE, encoding='utf-8') as f:
+        page = f.read()
+    start = page.index('<div class="timeline-item')
+    end = page.index('</div>', page.index('<div class="show-more">')) + len('</div>')
+    return page[:start], page[end:]
+
+class FakeNitter:
+    """Stato del Nitter finto: timeline per account e profilo di ogni istanza"""
+
+    def __init__(self, instances=8, latency=0.05, jitter=0.5, failure_rate=0.0, dead=0):
+        self.lock = threading.Lock()
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.dead = {f"n{i}" for i in range(dead)}
+        self.instances = [f"n{i}" for i in range(instances)]
+        self.timelines = {}  # account -> lista di tweet, dal più recente
+        self.next_status_id = FIRST_STATUS_ID
+        self.requests = {}  # (istanza, tipo, esito) -> conteggio
+        self.page_head, self.page_tail = load_recorded_page()
+
+    def new_tweet(self, user, text, images, published):
+        """Crea un tweet (chiamare con il lock acquisito)"""
+        self.next_status_id += 1
+        status_id = self.next_status_id
+        return {
+            'status_id': status_id,
+            'text': text,
+            'date': formatdate(published, usegmt=True),
+            'images': [f"media%2FG{status_id}_{n}.jpg" for n in range(images)]
+        }
+
+    def timeline(self, user):
+        """Timeline di un account, creata al primo accesso (chiamare con il lock acquisito)"""
+        timeline = self.timelines.get(user)
+        if timeline is None:
+            now = time.time()
+            # Creati dal più vecchio, così gli status ID crescono nel tempo come su Twitter
+            timeline = self.timelines[user] = [
+                self.new_tweet(user, f"Tweet {n} di @{user}: here we go! #TransferNews", 0, now - 3600 * (n + 1))
+                for n in reversed(range(SEED_TWEETS))
+            ][::-1]
+        return timeline
+
+    def publish(self, user, text, images=0):
+        """Pubblica un nuovo tweet in cima alla timeline"""
+        with self.lock:
+            timeline = self.timeline(user)
+            tweet = self.new_tweet(user, text, images, time.time())
+            timeline.insert(0, tweet)
+            return dict(tweet, version=len(timeline))
+
+    def snapshot(self, user):
+        """Copia della timeline e relativa versione (per ETag)"""
+        with self.lock:
+            timeline = self.timeline(user)
+            return list(timeline), len(timeline)
+
+    def count(self, instance, kind, outcome):
+        with self.lock:
+            key = f"{instance} {kind} {outcome}"
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            return {'requests': dict(self.requests)}
+
+    def render_rss(self, base, user, timeline):
+        items = []
+        for tweet in timeline:
+            text = html.escape(tweet['text'])
+            images = ''.join(
+                f'<img src="{base}/pic/{name}" style="max-width:250px;" />' for name in tweet['images']
+            )
+            items.append(RSS_ITEM_TEMPLATE.format(
+                base=base, user=user, title=text, text=text, images=images,
+                date=tweet['date'], status_id=tweet['status_id']
+            ))
+            if len(items) >= PAGE_SIZE:
+                break
+        return RSS_TEMPLATE.format(base=base, user=user, items='\n'.join(items))
+
+    def render_html(self, user, timeline, cursor=None):
+        # Il cursore è lo status ID dell'ultimo tweet della pagina precedente
+        if cursor:
+            timeline = [tweet for tweet in timeline if tweet['status_id'] < int(cursor)]
+        page, remaining = timeline[:PAGE_SIZE], timeline[PAGE_SIZE:]
+        # La data è quella del feed RSS (non relativa) così RSS e HTML producono gli stessi ID
+        items = [
+            HTML_ITEM_TEMPLATE.format(
+                user=user, status_id=tweet['status_id'], date=tweet['date'], text=html.escape(tweet['text']),
+                attachments=''.join(HTML_IMAGE_TEMPLATE.format(name=name) for name in tweet['images'])
+            )
+            for tweet in page
+        ]
+        if remaining:
+            items.append(f'<div class="show-more"><a href="?cursor={page[-1]["status_id"]}">Load more</a></div>\n')
+        return self.page_head + ''.join(items) + self.page_tail
+
+class FakeNitterHandler(BaseHTTPRequestHandler):
+    """Richieste al Nitter finto: /<istanza>/<account>[/rss], /<istanza>/pic/..., /_publish, /_stats"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, payload, status=200):
+        self.send_body(status, json.dumps(payload).encode(), 'application/json')
+
+    def do_POST(self):
+        nitter = self.server.fake
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if urlsplit(self.path).path != '/_publish':
+            return self.send_json({'error': 'not found'}, 404)
+        self.send_json(nitter.publish(payload['user'], payload['text'], payload.get('images', 0)))
+
+    def do_GET(self):
+        nitter = self.server.fake
+        url = urlsplit(self.path)
+        path = url.path
+        cursor = parse_qs(url.query).get('cursor', [None])[0]
+        if path == '/_stats':
+            return self.send_json(nitter.stats())
+
+        parts = path.strip('/').split('/')
+        instance = parts[0]
+        if instance not in nitter.instances or len(parts) < 2:
+            return self.send_body(404, b'Not found', 'text/plain')
+        kind = 'pic' if parts[1] == 'pic' else 'rss' if parts[-1] == 'rss' else 'html'
+
+        if instance in nitter.dead:
+            nitter.count(instance, kind, 'hang')
+            time.sleep(DEAD_INSTANCE_HANG)
+            return self.send_body(504, b'Gateway Timeout', 'text/plain')
+
+        time.sleep(nitter.latency * random.uniform(1 - nitter.jitter, 1 + nitter.jitter))
+        if kind == 'pic':
+            nitter.count(instance, kind, 'ok')
+            return self.send_body(200, PIXEL_PNG, 'image/png')
+        if random.random() < nitter.failure_rate:
+            nitter.count(instance, kind, 'error')
+            return self.send_body(503, b'Service Unavailable', 'text/plain')
+
+        user = parts[1]
+        timeline, version = nitter.snapshot(user)
+        etag = f'"{user}-{version}-{cursor or 0}"'
+        if self.headers.get('If-None-Match') == etag:
+            nitter.count(instance, kind, 'not-modified')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        nitter.count(instance, kind, 'ok')
+        base = f"http://{self.headers.get('Host')}/{instance}"
+        if kind == 'rss':
+            body = nitter.render_rss(base, user, timeline)
+            content_type = 'application/rss+xml; charset=utf-8'
+        else:
+            body = nitter.render_html(user, timeline, cursor)
+            content_type = 'text/html; charset=utf-8'
+        self.send_body(200, body.encode(), content_type, [('ETag', etag)])
+
+class FakeTelegram:
+    """Stato della Bot API finta: limite globale di messaggi al secondo e consegne per chat"""
+
+    def __init__(self, rate_limit=30, retry_after=1, latency=0.0):
+        self.lock = threading.Lock()
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.latency = latency
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.window = int(time.time())
+            self.window_count = 0
+            self.messages = 0
+            self.edits = 0
+            self.deletes = 0
+            self.rate_limited = 0
+            self.next_message_id = 1
+            self.deliveries = {}  # chat_id -> orario dell'ultimo messaggio ricevuto
+
+    def admit(self, chat_id, edit=False, delete=False):
+        """Registra un messaggio (o una modifica o eliminazione), False se supera il limite (429)"""
+        now = time.time()
+        with self.lock:
+            if int(now) != self.window:
+                self.window = int(now)
+                self.window_count = 0
+            if self.window_count >= self.rate_limit:
+                self.rate_limited += 1
+                return False
+            self.window_count += 1
+            if edit:
+                self.edits += 1
+            elif delete:
+                self.deletes += 1
+            else:
+                self.messages += 1
+            self.deliveries[chat_id] = now
+            self.next_message_id += 1
+            return self.next_message_id
+
+    def stats(self, full=False):
+        with self.lock:
+            stats = {'messages': self.messages, 'edits': self.edits, 'deletes': self.deletes, 'rate_limited': self.rate_limited, 'chats': len(self.deliveries)}
+            if full:
+                stats['deliveries'] = list(self.deliveries.values())
+            return stats
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    """Richieste alla Bot API finta: /bot<token>/<metodo>, /_stats, /_reset"""
+    protocol_version = 'HTTP/1.1'
+    CHAT_ID_PATTERN = re.compile(rb'name="chat_id"\r\n\r\n(-?\d+)')
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def params(self):
+        """Parametri della chiamata (query string, form o multipart)"""
+        parts = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        content_type = self.headers.get('Content-Type') or ''
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            params.update({key: values[0] for key, values in parse_qs(body.decode()).items()})
+        elif content_type.startswith('multipart/') and 'chat_id' not in params:
+            match = self.CHAT_ID_PATTERN.search(body)
+            if match:
+                params['chat_id'] = match.group(1).decode()
+        return params
+
+    def handle_request(self):
+        telegram = self.server.fake
+        path = urlsplit(self.path).path
+        params = self.params()
+        if path == '/_stats':
+            return self.send_json(telegram.stats(full='full' in self.path))
+        if path == '/_reset':
+            telegram.reset()
+            return self.send_json({'ok': True})
+
+        method = path.rsplit('/', 1)[-1]
+        if method == 'getMe':
+            return self.send_json({'ok': True, 'result': {
+                'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot',
+                'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': False
+            }})
+        if method == 'getUpdates':
+            time.sleep(min(float(params.get('timeout') or 0), 5))
+            return self.send_json({'ok': True, 'result': []})
+        edits = ('editMessageText', 'editMessageCaption')
+        if method not in ('sendMessage', 'sendPhoto', 'sendMediaGroup', 'deleteMessage') + edits:
+            return self.send_json({'ok': True, 'result': True})
+
+        if telegram.latency:
+            time.sleep(telegram.latency)
+        chat_id = int(params.get('chat_id', 0))
+        message_id = telegram.admit(chat_id, edit=method in edits, delete=method == 'deleteMessage')
+        if not message_id:
+            return self.send_json({
+                'ok': False, 'error_code': 429,
+                'description': f"Too Many Requests: retry after {telegram.retry_after}",
+                'parameters': {'retry_after': telegram.retry_after}
+            }, 429)
+
+        def message(offset=0):
+            result = {'message_id': message_id + offset, 'date': int(time.time()), 'chat': {'id': chat_id, 'type': 'channel'}}
+            if method != 'sendMessage':
+                file_id = f"bench-photo-{message_id + offset}"
+                result['photo'] = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1, 'height': 1}]
+            return result
+
+        if method == 'deleteMessage':
+            return self.send_json({'ok': True, 'result': True})
+        if method == 'editMessageText':
+            return self.send_json({'ok': True, 'result': dict(message(), message_id=int(params.get('message_id', 0)), text=params.get('text', ''))})
+        if method == 'editMessageCaption':
+            return self.send_json({'ok': True, 'result': dict(message(), message_id=int(params.get('message_id', 0)), caption=params.get('caption', ''))})
+        if method == 'sendMediaGroup':
+            media = json.loads(params.get('media') or '[]')
+            return self.send_json({'ok': True, 'result': [message(i) for i in range(max(1, len(media)))]})
+        self.send_json({'ok': True, 'result': message()})
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    """Server che ignora le connessioni chiuse dal client (richieste abbandonate dal bot)"""
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+def start_server(handler, fake, port=0):
+    """Avvia un server in un thread, ritorna il server (porta in server.server_address)"""
+    server = QuietHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    server.fake = fake
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def serve(nitter_options, telegram_options, ready=None, nitter_port=0, telegram_port=0):
+    """Avvia entrambi i servizi e resta in esecuzione; invia le porte su ready (Pipe) se fornito"""
+    nitter = start_server(FakeNitterHandler, FakeNitter(**nitter_options), nitter_port)
+    telegram = start_server(FakeTelegramHandler, FakeTelegram(**telegram_options), telegram_port)
+    ports = (nitter.server_address[1], telegram.server_address[1])
+    if ready is not None:
+        ready.send(ports)
+    else:
+        print(f"Nitter finto: http://127.0.0.1:{ports[0]}/n0 ... /n{len(nitter.fake.instances) - 1}")
+        print(f"Telegram finto: http://127.0.0.1:{ports[1]}/bot<token>/<metodo>")
+    while True:
+        time.sleep(3600)
+
+def main():
+    parser = argparse.ArgumentParser(description="Nitter e Bot API di Telegram finti")
+    parser.add_argument('--nitter-port', type=int, default=8081)
+    parser.add_argument('--telegram-port', type=int, default=8082)
+    parser.add_argument('--instances', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--failure-rate', type=float, default=0.1)
+    parser.add_argument('--dead', type=int, default=1)
+    parser.add_argument('--telegram-limit', type=int, default=30)
+    args = parser.parse_args()
+    serve(
+        {'instances': args.instances, 'latency': args.latency, 'failure_rate': args.failure_rate, 'dead': args.dead},
+        {'rate_limit': args.telegram_limit},
+        nitter_port=args.nitter_port, telegram_port=args.telegram_port
+    )
+
+if __name__ == '__main__':
+    main()
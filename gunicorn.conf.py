@@ -0,0 +1,11 @@
+"""
+Configurazione di Gunicorn (letta automaticamente dalla directory di avvio).
+
+L'import di twitter_telegram_bot non avvia nulla: ogni worker avvia i servizi del proprio
+ruolo (BOT_ROLE) dopo aver caricato l'app. Tra i worker con ruolo "all" solo uno diventa
+leader ed esegue scraping, consegne e configurazione del webhook.
+"""
+
+def post_worker_init(worker):
+    import twitter_telegram_bot
+    twitter_telegram_bot.start()
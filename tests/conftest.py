@@ -0,0 +1,21 @@
+"""
+Configurazione comune dei test.
+
+Uso: python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '0:test')
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Ogni test lavora in una directory temporanea: i file del bot non finiscono nel repository"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
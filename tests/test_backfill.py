@@ -0,0 +1,118 @@
+"""
+Test del recupero dei tweet persi: i tweet mancanti vengono accodati dal più vecchio
+e, se le pagine HTML non sono raggiungibili, i tweet della timeline vengono comunque
+pubblicati senza ritentare il recupero a ogni controllo.
+
+Uso: python -m pytest tests
+"""
+
+import time
+
+import pytest
+
+import twitter_telegram_bot as bot_module
+
+TWEET_TIME = 'Sat, 17 Oct 2026 10:00:00 GMT'
+
+def tweet(status_id):
+    return {
+        'account': 'acc',
+        'id': str(status_id),
+        'text': f"Tweet numero {status_id} con un testo che non somiglia agli altri {status_id * 7919}",
+        'time': TWEET_TIME,
+        'images': [],
+        'link': f"https://x.com/acc/status/{status_id}"
+    }
+
+def timeline(*status_ids):
+    return bot_module.Timeline([tweet(status_id) for status_id in status_ids], set(status_ids))
+
+class Bot:
+    """Stato del bot sostituito per il test: archivi temporanei e invii registrati"""
+
+    def __init__(self, tmp_path, monkeypatch):
+        self.posted = bot_module.PostedTweetsStore(str(tmp_path / 'posted_tweets.db'))
+        self.backfill = bot_module.TimelineBackfill(rate=1000)
+        self.page = timeline()
+        self.html_pages = []  # Pagine restituite dal recupero (None: HTML non raggiungibile)
+        self.html_requests = 0
+        self.sent = []
+        self.reschedules = []
+        monkeypatch.setattr(bot_module, 'posted_tweets', self.posted)
+        monkeypatch.setattr(bot_module, 'message_index', bot_module.MessageIndex(str(tmp_path / 'message_index.db')))
+        monkeypatch.setattr(bot_module, 'timeline_backfill', self.backfill)
+        monkeypatch.setattr(bot_module, 'scrape_twitter_nitter', lambda account: self.page)
+        monkeypatch.setattr(bot_module, 'send_tweet_to_all_channels', self.send)
+        monkeypatch.setattr(bot_module.poll_scheduler, 'reschedule', lambda account, interval: self.reschedules.append(interval))
+        monkeypatch.setattr(self.backfill, 'fetch_page', self.fetch_page)
+
+    def send(self, tweet):
+        self.sent.append(tweet['id'])
+        return True
+
+    def fetch_page(self, account, cursor):
+        self.html_requests += 1
+        return self.html_pages.pop(0) if self.html_pages else None
+
+    def poll(self):
+        bot_module.poll_account('acc')
+        deadline = time.monotonic() + 5
+        while self.backfill.active('acc') and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    bot = Bot(tmp_path, monkeypatch)
+    bot.posted.add(tweet(200))  # Ultimo tweet pubblicato prima dell'interruzione
+    return bot
+
+def test_no_gap(bot):
+    bot.page = timeline(302, 301, 200)
+    bot.poll()
+    assert bot.sent == ['301', '302']
+    assert bot.html_requests == 0
+
+def test_gap_backfilled_in_order(bot):
+    bot.page = timeline(305, 304, 303, 302, 301)
+    bot.html_pages = [(list(timeline(305, 304, 303, 302, 301, 250, 200)), None)]
+    bot.poll()
+    assert bot.sent == ['250', '301', '302', '303', '304', '305']
+    assert 'acc' not in bot.backfill.failures
+    bot.poll()
+    assert bot.sent == ['250', '301', '302', '303', '304', '305']
+
+def test_html_unavailable(bot):
+    bot.page = timeline(305, 304, 303, 302, 301)
+    bot.poll()
+    # Recupero fallito: nessun tweet recuperato, un solo nuovo controllo ravvicinato
+    assert bot.sent == []
+    assert bot.reschedules == [1]
+    assert bot.backfill.failures['acc'][0] == 1
+    
+    # Il controllo successivo pubblica i tweet della timeline invece di ritentare il recupero
+    bot.poll()
+    assert bot.sent == ['301', '302', '303', '304', '305']
+    assert bot.html_requests == 1
+    assert bot.reschedules == [1]
+    
+    bot.poll()
+    assert bot.sent == ['301', '302', '303', '304', '305']
+    assert bot.html_requests == 1
+
+def test_retry_backoff(bot):
+    bot.backfill.record_result('acc', False)
+    first = bot.backfill.failures['acc'][1] - time.time()
+    bot.backfill.record_result('acc', False)
+    second = bot.backfill.failures['acc'][1] - time.time()
+    assert bot.backfill.failures['acc'][0] == 2
+    assert first == pytest.approx(bot_module.BACKFILL_RETRY_BASE, abs=1)
+    assert second == pytest.approx(2 * bot_module.BACKFILL_RETRY_BASE, abs=1)
+    
+    # A backoff scaduto il buco fa ripartire il recupero
+    page = timeline(305, 304)
+    assert not bot.backfill.gap_detected('acc', page)
+    bot.backfill.failures['acc'] = (2, time.time() - 1)
+    assert bot.backfill.gap_detected('acc', page)
+    
+    bot.backfill.record_result('acc', True)
+    assert 'acc' not in bot.backfill.failures
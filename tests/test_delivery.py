@@ -0,0 +1,87 @@
+"""
+Test della coda delle consegne: i 429 di Telegram non consumano i tentativi del job,
+gli altri errori temporanei sì.
+
+Uso: python -m pytest tests
+"""
+
+import re
+
+import pytest
+
+import twitter_telegram_bot as bot_module
+
+CHAT_ID = -1001
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = bot_module.DeliveryQueue(str(tmp_path / 'delivery_queue.db'))
+    monkeypatch.setattr(bot_module, 'delivery_queue', queue)
+    monkeypatch.setattr(bot_module, 'registry', bot_module.ChannelRegistry(str(tmp_path / 'channels.json')))
+    # Nessuna attesa tra i tentativi: ogni giro ritrova il job pronto
+    monkeypatch.setattr(bot_module, 'delivery_backoff', lambda attempts, retry_after=None: 0)
+    queue.enqueue({'account': 'acc', 'id': '1847000000000000001', 'text': 'Tweet da consegnare'}, [CHAT_ID])
+    return queue
+
+def deliver_with(monkeypatch, retry_after):
+    error = RuntimeError('Too Many Requests' if retry_after is not None else 'Timeout')
+    monkeypatch.setattr(bot_module, 'deliver', lambda job: (bot_module.SEND_RETRY, retry_after, error))
+
+def test_rate_limit_not_counted(queue, monkeypatch):
+    deliver_with(monkeypatch, retry_after=0)
+    for _ in range(bot_module.DELIVERY_MAX_ATTEMPTS * 2):
+        assert bot_module.process_delivery_batch() == 1
+    jobs = queue.chat_jobs(CHAT_ID, 10)
+    assert len(jobs) == 1
+    assert jobs[0]['attempts'] == 0
+
+def test_errors_counted(queue, monkeypatch):
+    deliver_with(monkeypatch, retry_after=None)
+    for _ in range(bot_module.DELIVERY_MAX_ATTEMPTS):
+        bot_module.process_delivery_batch()
+    assert queue.chat_jobs(CHAT_ID, 10) == []
+
+class FlakyBot:
+    """Bot API finta: la chiamata numero fail_at fallisce una sola volta"""
+
+    def __init__(self, fail_at):
+        self.fail_at = fail_at
+        self.calls = 0
+        self.texts = []
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise RuntimeError('Timeout')
+        self.texts.append(text)
+        return type('Message', (), {'message_id': 100 + self.calls})()
+
+def digest_tweet(number):
+    return {
+        'account': 'acc',
+        'id': f'18470000000000000{number:02d}',
+        'text': f"Tweet-{number} " + 'testo lungo ' * 250,
+        'time': 'Sat, 17 Oct 2026 10:00:00 GMT',
+        'images': [],
+        'link': f'https://x.com/acc/status/18470000000000000{number:02d}'
+    }
+
+@pytest.mark.parametrize('mode', ['send', 'edit'])
+def test_digest_resumes_from_first_unsent_group(tmp_path, monkeypatch, mode):
+    monkeypatch.setattr(bot_module, 'message_index', bot_module.MessageIndex(str(tmp_path / 'message_index.db')))
+    monkeypatch.setattr(bot_module, 'throttle', lambda chat_id, messages=1: None)
+    flaky = FlakyBot(fail_at=2)
+    monkeypatch.setattr(bot_module, 'bot', flaky)
+    tweets = [digest_tweet(number) for number in range(3)]
+    digest = {'mode': mode, 'window': 3600}
+    assert len(bot_module.pack_digest([entry for tweet in tweets for entry in bot_module.digest_entries(tweet)])) == 3
+    
+    sent = []
+    with pytest.raises(RuntimeError):
+        bot_module.send_digest(CHAT_ID, tweets, digest, sent)
+    assert [message[0] for message in sent] == [101]
+    
+    bot_module.send_digest(CHAT_ID, tweets, digest, sent)
+    assert [message[0] for message in sent] == [101, 103, 104]
+    # Ogni tweet inviato una sola volta, nell'ordine
+    assert [re.search(r'Tweet-(\d)', text).group(1) for text in flaky.texts] == ['0', '1', '2']
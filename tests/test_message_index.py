@@ -0,0 +1,149 @@
+"""
+Test dell'indice dei messaggi: lo stesso status letto via RSS e via HTML non deve
+risultare modificato, e un tweet scartato dal parser non deve risultare eliminato.
+
+Uso: python -m pytest tests
+"""
+
+import pytest
+
+import twitter_telegram_bot as bot_module
+
+INSTANCE = 'https://nitter.test'
+
+RSS_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/">
+  <channel>
+    <item>
+      <title>{title}</title>
+      <dc:creator>@acc</dc:creator>
+      <description><![CDATA[<p>{html}</p>]]></description>
+      <pubDate>Sat, 17 Oct 2026 10:00:00 GMT</pubDate>
+      <guid>{instance}/acc/status/{status_id}#m</guid>
+      <link>{instance}/acc/status/{status_id}#m</link>
+    </item>
+  </channel>
+</rss>
+"""
+
+HTML_PAGE_TEMPLATE = """<html><body><div class="timeline">
+{items}
+</div></body></html>
+"""
+
+HTML_ITEM_TEMPLATE = """<div class="timeline-item " data-username="acc">
+<a class="tweet-link" href="/acc/status/{status_id}#m"></a>
+<div class="tweet-body">
+{pinned}
+<span class="tweet-date"><a href="/acc/status/{status_id}#m" title="17 ott">17 ott</a></span>
+<div class="tweet-content media-body" dir="auto">{html}</div>
+</div>
+</div>
+"""
+
+def rss_tweet(title, html, status_id):
+    """Tweet estratto da un feed RSS con un solo elemento"""
+    content = RSS_TEMPLATE.format(title=title, html=html, instance=INSTANCE, status_id=status_id)
+    tweets = bot_module.parse_rss_items(content.encode(), 'acc')
+    assert len(tweets) == 1
+    return tweets[0]
+
+def html_item(html, status_id, pinned=False):
+    return HTML_ITEM_TEMPLATE.format(
+        html=html,
+        status_id=status_id,
+        pinned='<div class="pinned"><span>Pinned Tweet</span></div>' if pinned else ''
+    )
+
+def html_timeline(*items):
+    """Tweet estratti da una pagina HTML: items sono coppie (testo HTML, status ID)"""
+    content = HTML_PAGE_TEMPLATE.format(items=''.join(html_item(html, status_id) for html, status_id in items))
+    return bot_module.parse_html_timeline(content, INSTANCE, 'acc')
+
+def html_tweet(html, status_id, pinned=False):
+    """Tweet estratto da una pagina HTML con un solo tweet"""
+    content = HTML_PAGE_TEMPLATE.format(items=html_item(html, status_id, pinned))
+    tweets = bot_module.parse_html_timeline(content, INSTANCE, 'acc')
+    assert len(tweets) == 1
+    return tweets[0]
+
+@pytest.fixture
+def index(tmp_path):
+    return bot_module.MessageIndex(str(tmp_path / 'message_index.db'))
+
+# Le differenze di formato tra RSS e HTML non sono modifiche del tweet
+
+def assert_same_status(index, rss, html):
+    assert bot_module.tweet_key(rss) == bot_module.tweet_key(html)
+    index.track(rss)
+    assert not index.text_changed(html)
+    index.update_text(html)
+    assert not index.text_changed(rss)
+
+def test_link(index):
+    rss = rss_tweet(
+        'Leggete qui https://www.bbc.co.uk/news/uk-12345678 #news',
+        'Leggete qui <a href="https://www.bbc.co.uk/news/uk-12345678">bbc.co.uk/news/uk-12345678</a> #news',
+        '1847000000000000001'
+    )
+    html = html_tweet(
+        'Leggete qui <a href="https://www.bbc.co.uk/news/uk-12345678">bbc.co.uk/news/uk-12345678</a> '
+        '<a href="/search?q=%23news">#news</a>',
+        '1847000000000000001'
+    )
+    assert_same_status(index, rss, html)
+
+def test_pinned(index):
+    rss = rss_tweet('Pinned: Il tweet fissato in cima', 'Il tweet fissato in cima', '1847000000000000002')
+    html = html_tweet('Il tweet fissato in cima', '1847000000000000002', pinned=True)
+    assert_same_status(index, rss, html)
+
+def test_reply(index):
+    rss = rss_tweet(
+        'R to @altro: Risposta con link example.com/pagina',
+        'Risposta con link <a href="https://example.com/pagina">example.com/pagina</a>',
+        '1847000000000000003'
+    )
+    html = html_tweet(
+        'Risposta con link <a href="https://example.com/pagina">example.com/pagina</a>',
+        '1847000000000000003'
+    )
+    assert_same_status(index, rss, html)
+
+def test_edit_detected(index):
+    rss = rss_tweet('Testo originale del tweet', 'Testo originale del tweet', '1847000000000000004')
+    html = html_tweet('Testo corretto del tweet', '1847000000000000004')
+    index.track(rss)
+    assert index.text_changed(html)
+
+# Solo i tweet assenti dalla pagina risultano eliminati, non quelli scartati dal parser
+
+PAGE_ITEMS = [
+    ('Il tweet più recente della pagina', '1847000000000000030'),
+    ('ok', '1847000000000000020'),  # Troppo corto: scartato dal parser
+    ('Un tweet con del testo', '1847000000000000015'),
+    ('Il tweet più vecchio della pagina', '1847000000000000010'),
+]
+
+@pytest.fixture
+def tracked_index(index):
+    for html, status_id in PAGE_ITEMS:
+        index.track({'account': 'acc', 'id': status_id, 'text': html})
+    return index
+
+def check_deleted(index, timeline):
+    return [index.deleted('acc', timeline) for _ in range(bot_module.DELETE_CONFIRMATIONS)][-1]
+
+def test_skipped_tweet_not_deleted(tracked_index):
+    timeline = html_timeline(*PAGE_ITEMS)
+    assert len(timeline) == 3
+    assert check_deleted(tracked_index, timeline) == []
+
+def test_missing_tweet_deleted(tracked_index):
+    timeline = html_timeline(*(item for item in PAGE_ITEMS if item[1] != '1847000000000000015'))
+    assert check_deleted(tracked_index, timeline) == ['acc/1847000000000000015']
+
+def test_unknown_statuses(tracked_index):
+    # Una lista senza gli status della pagina non basta per eliminare
+    timeline = list(html_timeline(*PAGE_ITEMS[:2]))
+    assert check_deleted(tracked_index, timeline) == []
@@ -0,0 +1,128 @@
+"""
+Test dell'identità dei tweet (status ID, hash del testo, quasi-duplicati) e
+dell'archivio dei tweet pubblicati: la pulizia elimina firme e bande degli stessi
+tweet e le bande non vengono duplicate.
+
+Uso: python -m pytest tests
+"""
+
+import sqlite3
+import time
+
+import pytest
+
+import twitter_telegram_bot as bot_module
+
+def posted_tweet(status_id, text):
+    return {'account': 'acc', 'id': status_id, 'text': text}
+
+def table_ids(store, table):
+    return {row[0] for row in store.conn.execute(f"SELECT DISTINCT id FROM {table}")}
+
+def band_rows(store):
+    return store.conn.execute("SELECT COUNT(*) FROM tweet_bands").fetchone()[0]
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'posted_tweets.db')
+
+def test_status_id_from_link():
+    links = [
+        'https://nitter.uno/acc/status/1847000000000000001#m',
+        'https://altra.istanza/acc/status/1847000000000000001',
+        'https://x.com/acc/status/1847000000000000001?s=20',
+    ]
+    assert {bot_module.get_tweet_id('Testo qualsiasi', link) for link in links} == {'1847000000000000001'}
+    assert bot_module.status_id({'id': '1847000000000000001'}) == 1847000000000000001
+
+def test_text_hash_fallback():
+    tweet_id = bot_module.get_tweet_id('Un tweet senza link https://t.co/abc')
+    assert bot_module.get_tweet_id('  UN TWEET   senza link https://t.co/xyz') == tweet_id
+    assert bot_module.get_tweet_id('RT @altro: Un tweet senza link') == tweet_id
+    assert bot_module.get_tweet_id('Un altro tweet senza link') != tweet_id
+    assert bot_module.status_id({'id': tweet_id}) is None
+
+def test_same_status_on_two_accounts(db_path):
+    store = bot_module.PostedTweetsStore(db_path)
+    store.add(posted_tweet('1847000000000000001', 'Tweet originale'))
+    assert store.is_posted(posted_tweet('1847000000000000001', 'Tweet originale'))
+    # Lo stesso status ritwittato da un altro account è un tweet diverso per quell'account
+    assert not store.is_posted({'account': 'altro', 'id': '1847000000000000001', 'text': 'Tweet originale'})
+
+def test_legacy_id_recognized(db_path):
+    store = bot_module.PostedTweetsStore(db_path)
+    legacy_id = bot_module.legacy_tweet_id('Tweet pubblicato prima', 'Sat, 17 Oct 2026 10:00:00 GMT')
+    store.conn.execute("INSERT INTO posted_tweets (id, posted_at) VALUES (?, ?)", (legacy_id, time.time()))
+    tweet = dict(posted_tweet('1847000000000000001', 'Tweet pubblicato prima'), legacy_id=legacy_id)
+    assert store.is_posted(tweet)
+
+NEAR_DUPLICATE_TEXT = (
+    "Oggi alle 18 in diretta presentiamo il nuovo programma della stagione con tutti gli ospiti "
+    "e le novità annunciate durante la conferenza stampa di questa mattina"
+)
+
+def test_near_duplicate_found(db_path):
+    store = bot_module.PostedTweetsStore(db_path)
+    store.add(posted_tweet('1847000000000000001', NEAR_DUPLICATE_TEXT))
+    # Stesso testo ripubblicato con un link diverso e maiuscole diverse
+    repost = posted_tweet('1847000000000000002', NEAR_DUPLICATE_TEXT.upper() + ' https://t.co/nuovo')
+    assert store.find_near_duplicate(repost) == 'acc/1847000000000000001'
+
+def test_near_duplicate_not_found(db_path):
+    store = bot_module.PostedTweetsStore(db_path)
+    store.add(posted_tweet('1847000000000000001', NEAR_DUPLICATE_TEXT))
+    different = posted_tweet('1847000000000000002', "Domani niente diretta: il programma riprende lunedì con una puntata speciale")
+    assert store.find_near_duplicate(different) is None
+    # Lo stesso testo su un altro account non è un duplicato
+    assert store.find_near_duplicate({'account': 'altro', 'id': '1847000000000000003', 'text': NEAR_DUPLICATE_TEXT}) is None
+
+def test_prune_size_cap_removes_signatures(db_path):
+    store = bot_module.PostedTweetsStore(db_path, max_entries=2)
+    for number in range(4):
+        store.add(posted_tweet(f'18470000000000000{number}0', f'Tweet numero {number} con un testo diverso dagli altri'))
+    # Tempi di pubblicazione distinti e crescenti per il limite di dimensione
+    now = time.time()
+    for number in range(4):
+        store.conn.execute(
+            "UPDATE posted_tweets SET posted_at = ? WHERE id = ?", (now - 10 + number, f'acc/18470000000000000{number}0')
+        )
+    store.conn.commit()
+
+    assert store.prune() == 2
+    kept = {'acc/1847000000000000020', 'acc/1847000000000000030'}
+    assert table_ids(store, 'posted_tweets') == kept
+    assert table_ids(store, 'tweet_signatures') == kept
+    assert table_ids(store, 'tweet_bands') == kept
+
+def test_prune_retention_removes_signatures(db_path):
+    store = bot_module.PostedTweetsStore(db_path, retention_days=1)
+    store.add(posted_tweet('1847000000000000010', 'Un tweet pubblicato molto tempo fa'))
+    store.add(posted_tweet('1847000000000000020', 'Un tweet pubblicato poco fa'))
+    store.conn.execute("UPDATE posted_tweets SET posted_at = 0 WHERE id = 'acc/1847000000000000010'")
+    store.conn.commit()
+
+    assert store.prune() == 1
+    assert table_ids(store, 'tweet_signatures') == {'acc/1847000000000000020'}
+    assert table_ids(store, 'tweet_bands') == {'acc/1847000000000000020'}
+
+def test_bands_not_duplicated(db_path):
+    store = bot_module.PostedTweetsStore(db_path)
+    tweet = posted_tweet('1847000000000000010', 'Lo stesso tweet registrato due volte')
+    store.add(tweet)
+    rows = band_rows(store)
+    store.add(tweet)
+    assert band_rows(store) == rows
+
+def test_legacy_duplicate_bands_removed(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        "CREATE TABLE tweet_bands (band TEXT NOT NULL, id TEXT NOT NULL, posted_at REAL NOT NULL);"
+        "CREATE INDEX idx_bands_band ON tweet_bands(band);"
+        "INSERT INTO tweet_bands VALUES ('b1', 'acc/1', 1), ('b1', 'acc/1', 2), ('b2', 'acc/1', 1);"
+    )
+    conn.close()
+
+    store = bot_module.PostedTweetsStore(db_path)
+    assert band_rows(store) == 2
+    with pytest.raises(sqlite3.IntegrityError):
+        store.conn.execute("INSERT INTO tweet_bands VALUES ('b1', 'acc/1', 3)")
@@ -0,0 +1,83 @@
+"""
+Test della lettura in streaming del feed RSS: la lettura si ferma al primo tweet già
+pubblicato, ma non sul tweet fissato né sui retweet.
+
+Uso: python -m pytest tests
+"""
+
+import pytest
+
+import twitter_telegram_bot as bot_module
+
+INSTANCE = 'https://nitter.test'
+
+FEED_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel>
+{items}
+</channel></rss>
+"""
+
+ITEM_TEMPLATE = """<item>
+  <title>{title}</title>
+  <description><![CDATA[<p>{title}</p>]]></description>
+  <pubDate>Sat, 17 Oct 2026 10:00:00 GMT</pubDate>
+  <link>{instance}/acc/status/{status_id}#m</link>
+</item>
+"""
+
+def feed(*items):
+    """Feed RSS: items sono coppie (titolo, status ID) dalla più recente"""
+    return FEED_TEMPLATE.format(items=''.join(
+        ITEM_TEMPLATE.format(title=title, instance=INSTANCE, status_id=status_id) for title, status_id in items
+    )).encode()
+
+def parse(content, known=()):
+    return bot_module.parse_rss_items(content, 'acc', is_known=lambda tweet: tweet['id'] in known)
+
+def ids(tweets):
+    return [tweet['id'] for tweet in tweets]
+
+def test_stops_at_first_known():
+    content = feed(('Tweet 300', '300'), ('Tweet 299', '299'), ('Tweet 200', '200'), ('Tweet 100', '100'))
+    assert ids(parse(content, known={'200', '100'})) == ['300', '299', '200']
+
+def test_pinned_known_does_not_stop():
+    content = feed(('Pinned: Tweet fissato', '100'), ('Tweet 300', '300'), ('Tweet 299', '299'), ('Tweet 200', '200'))
+    tweets = parse(content, known={'100', '200'})
+    assert ids(tweets) == ['100', '300', '299', '200']
+    assert tweets[0]['pinned']
+    assert not any(tweet.get('pinned') for tweet in tweets[1:])
+
+def test_retweet_known_does_not_stop():
+    content = feed(('RT by @acc: Tweet di un altro', '50'), ('Tweet 300', '300'), ('Tweet 200', '200'))
+    tweets = parse(content, known={'50', '200'})
+    assert ids(tweets) == ['50', '300', '200']
+    assert tweets[0]['retweet']
+
+def test_nothing_known_keeps_latest():
+    content = feed(*((f'Tweet {n}', str(n)) for n in range(300, 280, -1)))
+    tweets = parse(content)
+    assert ids(tweets) == [str(n) for n in range(300, 300 - bot_module.MAX_TWEETS_PER_FETCH, -1)]
+    assert tweets.statuses == set(range(281, 301))
+
+def test_max_items(monkeypatch):
+    monkeypatch.setattr(bot_module, 'MAX_RSS_ITEMS', 3)
+    content = feed(*((f'Tweet {n}', str(n)) for n in range(300, 290, -1)))
+    assert parse(content, known={'291'}).statuses == {300, 299, 298}
+
+@pytest.fixture
+def posted(tmp_path, monkeypatch):
+    store = bot_module.PostedTweetsStore(str(tmp_path / 'posted_tweets.db'))
+    monkeypatch.setattr(bot_module, 'posted_tweets', store)
+    return store
+
+def test_pinned_does_not_reach_mark(posted):
+    posted.add({'account': 'acc', 'id': '100', 'text': 'Tweet fissato'})
+    posted.add({'account': 'acc', 'id': '200', 'text': 'Ultimo tweet pubblicato'})
+    # Interruzione: il feed ha solo il tweet fissato (già pubblicato) e tweet successivi al 200
+    content = feed(('Pinned: Tweet fissato', '100'), ('Tweet 400', '400'), ('Tweet 399', '399'))
+    tweets = bot_module.parse_rss_items(content, 'acc', is_known=posted.is_posted)
+    assert bot_module.timeline_backfill.gap_detected('acc', tweets)
+    content = feed(('Pinned: Tweet fissato', '100'), ('Tweet 300', '300'), ('Tweet 200', '200'))
+    tweets = bot_module.parse_rss_items(content, 'acc', is_known=posted.is_posted)
+    assert not bot_module.timeline_backfill.gap_detected('acc', tweets)
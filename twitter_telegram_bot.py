@@ -1,24 +1,133 @@
 import os
+import sys
 import time
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from xml.etree import ElementTree as ET
 import telebot
 from datetime import datetime
+import io
+import html
 import json
+import sqlite3
 import hashlib
+import hmac
+import unicodedata
+import re
+import heapq
+import random
+import statistics
+from email.utils import parsedate_to_datetime
+from collections import OrderedDict
+from urllib.parse import urljoin, urlsplit, parse_qs
 import threading
-from flask import Flask, request
+import multiprocessing
+import queue
+import atexit
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from itertools import islice
+from flask import Flask, request, Response
 import logging
+import logging.handlers
+import contextvars
+import uuid
+from contextlib import contextmanager
 import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Lock su file per eleggere il processo leader (non disponibile su Windows)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Usa lxml se installato (parsing HTML più veloce), altrimenti il parser della libreria standard
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
 
 # Disabilita gli avvisi SSL
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Configurazione - SICUREZZA: Token viene da variabile d'ambiente
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-TWITTER_USERNAME = "fabrizioromano"  # Username Twitter (senza @)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL')  # Bot API alternativa (es. server locale), formato ".../bot{0}/{1}"
+TWITTER_USERNAME = "fabrizioromano"  # Account seguito di default dai nuovi canali (senza @)
 WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # URL del webhook per Render
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')  # Token degli endpoint /admin (disattivati se non impostato)
 PORT = int(os.getenv('PORT', 5000))  # Porta per Render
+POLL_INTERVAL = 600  # Secondi tra due controlli dello stesso account (senza dati sulla frequenza)
+MIN_POLL_INTERVAL = int(os.getenv('MIN_POLL_INTERVAL', 120))  # Intervallo minimo (account molto attivo)
+MAX_POLL_INTERVAL = int(os.getenv('MAX_POLL_INTERVAL', 1800))  # Intervallo massimo (account silenzioso)
+POLL_JITTER = 0.1  # Variazione casuale dell'intervallo (±10%)
+
+# Limiti di invio Telegram (~30 msg/s per bot, ~1 msg/s per singola chat)
+GLOBAL_SEND_RATE = float(os.getenv('GLOBAL_SEND_RATE', 30))
+PER_CHAT_SEND_RATE = float(os.getenv('PER_CHAT_SEND_RATE', 1))
+FLOOD_WINDOW = 10  # Secondi in cui vengono contati i 429 ricevuti da chat diverse
+FLOOD_CHATS = 3  # Chat diverse con un 429 nella finestra oltre le quali rallenta l'intero bot
+SEND_WORKERS = int(os.getenv('SEND_WORKERS', 16))  # Thread paralleli per l'invio
+
+# Coda persistente delle consegne (un job per tweet e chat)
+DELIVERY_QUEUE_DB = "delivery_queue.db"
+DELIVERY_BATCH_SIZE = 500  # Job elaborati per ogni giro del worker
+DELIVERY_MAX_ATTEMPTS = 8  # Tentativi falliti prima di scartare un job (i 429 non contano)
+DELIVERY_BASE_BACKOFF = 5  # Secondi di attesa dopo il primo errore temporaneo
+DELIVERY_MAX_BACKOFF = 3600
+DELIVERY_SHARDS = int(os.getenv('DELIVERY_SHARDS', 1))  # Processi di consegna (1 = thread nel processo leader)
+DELIVERY_SHARD_CHECK_INTERVAL = 5  # Secondi tra due controlli dei processi di consegna
+
+# Modalità riepilogo per canale (/digest): i tweet ravvicinati diventano un solo messaggio
+DIGEST_MODES = ('off', 'merge', 'edit')  # Un messaggio per tweet / uno per finestra / uno aggiornato nella finestra
+DIGEST_WINDOW = int(os.getenv('DIGEST_WINDOW', 60))  # Finestra predefinita in secondi
+DIGEST_MAX_WINDOW = 3600
+DIGEST_MAX_TWEETS = int(os.getenv('DIGEST_MAX_TWEETS', 10))  # Tweet al massimo in un riepilogo
+DIGEST_EDIT_GRACE = 2  # Secondi di attesa in modalità edit, per unire i tweet rilevati nello stesso controllo
+
+# Immagini: scaricate una volta, caricate una volta, poi riusate tramite file_id
+MEDIA_CACHE_DIR = "media_cache"
+MEDIA_CACHE_MAX_BYTES = int(os.getenv('MEDIA_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+MEDIA_MAX_IMAGE_BYTES = 10 * 1024 * 1024  # Limite di Telegram per le foto
+MEDIA_MAX_GROUP = 10  # Limite di Telegram per i media group
+MEDIA_FILE_IDS_MAX = 5000  # file_id ricordati (LRU)
+
+# Scraping parallelo delle istanze Nitter
+SCRAPE_DEADLINE = float(os.getenv('SCRAPE_DEADLINE', 45))  # Secondi massimi per ciclo di scraping
+HEDGE_WIDTH = int(os.getenv('HEDGE_WIDTH', 3))  # Istanze interrogate subito in parallelo
+HEDGE_DELAY = float(os.getenv('HEDGE_DELAY', 2))  # Secondi prima di coinvolgere un'altra istanza
+RACE_WORKERS = int(os.getenv('RACE_WORKERS', 16))  # Thread condivisi dalle gare tra istanze
+
+# Salute delle istanze Nitter (circuit breaker con cool-down esponenziale)
+INSTANCE_HEALTH_FILE = "instance_health.json"
+CIRCUIT_FAILURE_THRESHOLD = 3  # Fallimenti consecutivi prima di escludere un'istanza
+CIRCUIT_BASE_COOLDOWN = 60  # Secondi di esclusione dopo il primo intervento
+CIRCUIT_MAX_COOLDOWN = 6 * 3600
+
+# Elaborazione degli update ricevuti dal webhook
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', 4))  # Thread che eseguono gli handler
+UPDATE_QUEUE_SIZE = 100  # Update in attesa per ogni worker prima di rifiutarne altri
+UPDATE_ENQUEUE_TIMEOUT = 1  # Secondi di attesa con la coda piena prima di rispondere 503
+UPDATE_RETRY_AFTER = 5  # Secondi suggeriti a Telegram prima di riprovare
+
+# Log: formato, campionamento degli eventi per singolo canale e tracce delle fasi
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # "text" (leggibile) o "json" (un evento JSON per riga)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 0.01))  # Frazione di eventi per canale registrati
+TRACE_FILE = os.getenv('TRACE_FILE')  # Se impostato, durata di scrape/parse/render/fan-out in JSON Lines
+
+# Ruoli del processo: "web" (solo webhook ed endpoint), "monitor" (scraping e consegne) o "all"
+BOT_ROLE = os.getenv('BOT_ROLE', 'all')
+LEADER_LOCK_FILE = os.getenv('LEADER_LOCK_FILE', 'monitor.lock')  # Un solo processo leader esegue scraping e consegne
+LEADER_RETRY_INTERVAL = 30  # Secondi tra due tentativi di diventare leader
+REGISTRY_REFRESH_INTERVAL = 15  # Secondi massimi prima che il monitor veda i canali aggiunti da altri processi
+
+# Sessioni HTTP riutilizzate per ogni istanza (keep-alive)
+HTTP_POOL_SIZE = 4  # Connessioni tenute aperte per istanza
+HTTP_RETRIES = 1  # Ritentativi automatici su errori di connessione/5xx
 
 # Verifica che il token sia configurato
 if not TELEGRAM_BOT_TOKEN:
@@ -29,74 +138,1087 @@ if not TELEGRAM_BOT_TOKEN:
 # Inizializza Flask app
 app = Flask(__name__)
 
-# Configura logging
-logging.basicConfig(level=logging.INFO)
+# Configura logging (sincrono fino a configure_logging(), chiamata all'avvio del ruolo)
+logging.basicConfig(level=LOG_LEVEL)
 logger = logging.getLogger(__name__)
+span_logger = logging.getLogger(f"{__name__}.spans")
+span_logger.propagate = False
+
+# Campi aggiunti a ogni evento di log (cycle_id, tweet_id, chat_id, ...) e span corrente
+log_context = contextvars.ContextVar('log_context', default={})
+current_span = contextvars.ContextVar('current_span', default=None)
+
+@contextmanager
+def log_fields(**fields):
+    """Aggiunge campi a tutti gli eventi di log emessi nel blocco"""
+    token = log_context.set({**log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        log_context.reset(token)
+
+def log_sampled(level, message, rate=None, **fields):
+    """Evento ad alto volume (uno per canale): ne viene registrata solo una frazione"""
+    rate = LOG_SAMPLE_RATE if rate is None else rate
+    if random.random() < rate:
+        logger.log(level, message, extra={'fields': {**fields, 'sample_rate': rate}})
+
+@contextmanager
+def span(name, **fields):
+    """Misura la durata di una fase e la esporta su TRACE_FILE (nessun costo se non impostato)"""
+    if not TRACE_FILE:
+        yield
+        return
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = current_span.get()
+    token = current_span.set(span_id)
+    started = time.time()
+    started_perf = time.perf_counter()
+    try:
+        yield
+    finally:
+        current_span.reset(token)
+        span_logger.info(name, extra={'fields': {
+            'span': name, 'span_id': span_id, 'parent_id': parent_id, 'start': started,
+            'duration_ms': round((time.perf_counter() - started_perf) * 1000, 3), **fields
+        }})
+
+class ContextFilter(logging.Filter):
+    """Copia i campi del contesto nel record prima che passi alla coda (nel thread che lo emette)"""
+
+    def filter(self, record):
+        record.context = log_context.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """Un evento JSON per riga, con i campi del contesto"""
+
+    def format(self, record):
+        event = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName
+        }
+        event.update(getattr(record, 'context', {}))
+        event.update(getattr(record, 'fields', {}))
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Formato di basicConfig, con i campi del contesto in coda alla riga"""
+
+    def __init__(self):
+        super().__init__(logging.BASIC_FORMAT)
+
+    def format(self, record):
+        line = super().format(record)
+        fields = {**getattr(record, 'context', {}), **getattr(record, 'fields', {})}
+        if fields:
+            line += ' [' + ' '.join(f"{key}={value}" for key, value in fields.items() if value is not None) + ']'
+        return line
+
+log_listeners = []
+
+def queue_logging(target_logger, handler):
+    """Sostituisce gli handler del logger con una coda svuotata da un thread dedicato"""
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    target_logger.handlers = [queue_handler]
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    log_listeners.append(listener)
+
+def configure_logging():
+    """
+    Log non bloccanti: i thread accodano i record e un thread dedicato li scrive,
+    in formato LOG_FORMAT. Con TRACE_FILE gli span vengono scritti su quel file.
+    """
+    if log_listeners:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+    queue_logging(logging.getLogger(), handler)
+    
+    if TRACE_FILE:
+        trace_handler = logging.FileHandler(TRACE_FILE)
+        trace_handler.setFormatter(JsonFormatter())
+        queue_logging(span_logger, trace_handler)
+        span_logger.setLevel(logging.INFO)
+    
+    # Scrive i log ancora in coda all'uscita
+    atexit.register(lambda: [listener.stop() for listener in log_listeners])
+
+# Inizializza il bot (gli handler vengono eseguiti dai worker di UpdateDispatcher, non dal pool di telebot)
+if TELEGRAM_API_URL:
+    telebot.apihelper.API_URL = TELEGRAM_API_URL
+bot = telebot.TeleBot(TELEGRAM_BOT_TOKEN, threaded=False)
+
+# Bucket (secondi) degli istogrammi di latenza
+METRICS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 45, 120)
+METRICS_DIR = "metrics"  # Metriche pubblicate da ogni processo, sommate da /metrics
+METRICS_PUBLISH_INTERVAL = 15  # Secondi tra due pubblicazioni delle metriche di un processo
+
+class Metrics:
+    """
+    Contatori, istogrammi e gauge esposti su /metrics nel formato testuale di Prometheus.
+    Le etichette per chat non vengono usate per non far esplodere la cardinalità.
+    """
+
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.descriptions = {}  # nome -> (tipo, descrizione)
+        self.counters = {}  # (nome, etichette) -> valore
+        self.histograms = {}  # (nome, etichette) -> [conteggi per bucket, somma, totale]
+        self.gauges = {}  # nome -> funzione che restituisce il valore
+        self.sink = None  # Coda verso il processo leader (nei processi di consegna)
+
+    def describe(self, name, kind, description):
+        """Registra tipo e descrizione di una metrica"""
+        self.descriptions[name] = (kind, description)
+
+    def inc(self, name, value=1, **labels):
+        """Incrementa un contatore"""
+        if self.sink is not None:
+            self.sink.put(('inc', name, value, labels))
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Registra un'osservazione in un istogramma"""
+        if self.sink is not None:
+            self.sink.put(('observe', name, value, labels))
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def gauge(self, name, description, read):
+        """Registra una gauge letta al momento dell'esportazione"""
+        self.describe(name, 'gauge', description)
+        self.gauges[name] = read
+
+    @staticmethod
+    def format_labels(labels, extra=()):
+        """Etichette nel formato {chiave="valore",...} con l'escape richiesto da Prometheus"""
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+        return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in pairs) + '}'
+
+    def state(self):
+        """Contatori e istogrammi in forma serializzabile (pubblicati per gli altri processi)"""
+        with self.lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, *value] for (name, labels), value in self.histograms.items()]
+            }
+
+    def render(self, peers=()):
+        """
+        Esporta tutte le metriche nel formato testuale di Prometheus, sommando
+        a quelle del processo gli stati pubblicati dagli altri processi (peers).
+        """
+        lines = []
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: (list(value[0]), value[1], value[2]) for key, value in self.histograms.items()}
+        
+        for peer in peers:
+            for name, labels, value in peer['counters']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, counts, total, count in peer['histograms']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                own_counts, own_total, own_count = histograms.get(key, ([0] * len(self.buckets), 0.0, 0))
+                histograms[key] = ([a + b for a, b in zip(own_counts, counts)], own_total + total, own_count + count)
+        
+        def header(name):
+            kind, description = self.descriptions.get(name, ('untyped', ''))
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+        
+        for name in sorted({name for name, _ in counters}):
+            header(name)
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{self.format_labels(labels)} {value}")
+        
+        for name in sorted({name for name, _ in histograms}):
+            header(name)
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{name}_bucket{self.format_labels(labels, [('le', bound)])} {bucket_count}")
+                lines.append(f"{name}_bucket{self.format_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{self.format_labels(labels)} {total}")
+                lines.append(f"{name}_count{self.format_labels(labels)} {count}")
+        
+        for name, read in sorted(self.gauges.items()):
+            header(name)
+            try:
+                lines.append(f"{name} {read()}")
+            except Exception as e:
+                logger.error(f"Errore nella lettura della metrica {name}: {e}")
+        
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+def metrics_file(pid):
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+def publish_metrics():
+    """
+    Pubblica periodicamente le metriche del processo in METRICS_DIR: così /metrics,
+    servito da qualunque worker, espone anche quelle del monitor e degli altri worker.
+    """
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = metrics_file(os.getpid())
+    while True:
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(metrics.state(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Errore nella pubblicazione delle metriche: {e}")
+        time.sleep(METRICS_PUBLISH_INTERVAL)
 
-# Inizializza il bot
-bot = telebot.TeleBot(TELEGRAM_BOT_TOKEN)
+def peer_metrics():
+    """
+    Stati pubblicati dagli altri processi. Un file non aggiornato da più di tre
+    intervalli appartiene a un processo terminato e viene rimosso.
+    """
+    peers = []
+    try:
+        names = os.listdir(METRICS_DIR)
+    except OSError:
+        return peers
+    own = os.path.basename(metrics_file(os.getpid()))
+    for name in names:
+        if name == own or not name.endswith('.json'):
+            continue
+        path = os.path.join(METRICS_DIR, name)
+        try:
+            if time.time() - os.path.getmtime(path) > 3 * METRICS_PUBLISH_INTERVAL:
+                os.remove(path)
+                continue
+            with open(path, 'r') as f:
+                peers.append(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Metriche non leggibili in {path}: {e}")
+    return peers
+metrics.describe('nitter_fetch_seconds', 'histogram', "Durata del fetch di una timeline per istanza, tipo ed esito")
+metrics.describe('nitter_parse_seconds', 'histogram', "Durata del parsing di una timeline (rss/html)")
+metrics.describe('tweets_detected_total', 'counter', "Nuovi tweet rilevati per account")
+metrics.describe('tweets_duplicate_total', 'counter', "Tweet quasi identici a uno già pubblicato (non inviati)")
+metrics.describe('tweets_backfilled_total', 'counter', "Tweet persi durante un'interruzione e recuperati, per account")
+metrics.describe('deliveries_total', 'counter', "Esiti dei tentativi di consegna (sent/retry/dropped/removed)")
+metrics.describe('tweet_updates_total', 'counter', "Modifiche ed eliminazioni di tweet propagate ai canali, per azione (edit/delete)")
+metrics.describe('digest_tweets_total', 'counter', "Tweet consegnati all'interno di un riepilogo, per modalità (merge/edit)")
+metrics.describe('telegram_send_seconds', 'histogram', "Durata di un invio a una chat (inclusa l'attesa del rate limit)")
+metrics.describe('telegram_rate_limited_total', 'counter', "Risposte 429 ricevute da Telegram")
+metrics.describe('monitor_cycle_seconds', 'histogram', "Durata del controllo di un account (scraping e accodamento)")
+metrics.describe('updates_received_total', 'counter', "Update ricevuti dal webhook (queued/rejected)")
+metrics.describe('update_processing_seconds', 'histogram', "Durata dell'elaborazione di un update (handler inclusi)")
 
 # File per tracciare i canali registrati e i tweet pubblicati
 CHANNELS_FILE = "registered_channels.json"
-POSTED_TWEETS_FILE = "posted_tweets.json"
+POSTED_TWEETS_FILE = "posted_tweets.json"  # Formato legacy, migrato nel database
+POSTED_TWEETS_DB = "posted_tweets.db"
+POSTED_TWEETS_RETENTION_DAYS = int(os.getenv('POSTED_TWEETS_RETENTION_DAYS', 90))
+POSTED_TWEETS_MAX = int(os.getenv('POSTED_TWEETS_MAX', 500000))
 
-def load_registered_channels():
-    """Carica la lista dei canali registrati"""
-    if os.path.exists(CHANNELS_FILE):
-        with open(CHANNELS_FILE, 'r') as f:
-            return json.load(f)
-    return []
+CHANNELS_SAVE_DELAY = 2  # Secondi di attesa per raggruppare le scritture su file
 
-def save_registered_channels(channels):
-    """Salva la lista dei canali registrati"""
-    with open(CHANNELS_FILE, 'w') as f:
-        json.dump(channels, f, indent=2)
+# Indice dei quasi-duplicati (tweet modificati, ripubblicati o retweet dello stesso testo)
+NEAR_DUPLICATE_THRESHOLD = 0.8  # Somiglianza stimata (Jaccard) oltre la quale un tweet è un duplicato
+SHINGLE_SIZE = 3  # Parole per shingle
+MINHASH_PERMUTATIONS = 32  # Valori della firma MinHash
+MINHASH_BANDS = 8  # Bande LSH (MINHASH_PERMUTATIONS / MINHASH_BANDS valori per banda)
 
-def load_posted_tweets():
-    """Carica la lista dei tweet già pubblicati"""
-    if os.path.exists(POSTED_TWEETS_FILE):
-        with open(POSTED_TWEETS_FILE, 'r') as f:
-            return json.load(f)
-    return []
+# Recupero dei tweet persi durante un'interruzione (pagine successive della timeline HTML)
+BACKFILL_MAX_PAGES = int(os.getenv('BACKFILL_MAX_PAGES', 20))  # Pagine lette al massimo per ogni recupero
+BACKFILL_PAGE_TWEETS = 100  # Tweet estratti al massimo da ogni pagina
+BACKFILL_TWEET_RATE = float(os.getenv('BACKFILL_TWEET_RATE', 0.5))  # Tweet recuperati accodati al secondo
+BACKFILL_MAX_AGE = int(os.getenv('BACKFILL_MAX_AGE_HOURS', 48)) * 3600  # Tweet più vecchi non vengono recuperati
+BACKFILL_RETRY_BASE = 60  # Secondi prima di ritentare un recupero fallito (raddoppiano a ogni fallimento)
+BACKFILL_RETRY_MAX = 3600
+
+# Indice tweet -> chat -> messaggi inviati, per propagare modifiche ed eliminazioni dei tweet
+MESSAGE_INDEX_DB = "message_index.db"
+MESSAGE_INDEX_RETENTION = int(os.getenv('MESSAGE_INDEX_RETENTION_HOURS', 72)) * 3600  # Oltre, le copie non vengono più aggiornate
+MESSAGE_INDEX_MAX = int(os.getenv('MESSAGE_INDEX_MAX', 1000000))  # Messaggi indicizzati al massimo
+TWEET_EDIT_WINDOW = 3600  # Twitter consente di modificare un tweet entro un'ora (la modifica ha un nuovo status ID)
+DELETE_CONFIRMATIONS = 2  # Controlli consecutivi in cui un tweet deve mancare prima di eliminarne le copie
+
+class ChannelRegistry:
+    """
+    Registro in memoria dei canali, indicizzato per chat_id e per account seguito.
+    Il file viene letto all'avvio e le modifiche vengono salvate
+    in modo atomico (file temporaneo + rename) dopo un breve debounce.
+    Con più processi (worker web, monitor, consegne) refresh() ricarica il file
+    quando viene riscritto da un altro processo; i salvataggi sono serializzati
+    da un lock su file e applicano solo i canali modificati localmente alla
+    versione più recente del file, così le modifiche concorrenti non si perdono.
+    """
+
+    def __init__(self, path, save_delay=CHANNELS_SAVE_DELAY):
+        self.path = path
+        self.save_delay = save_delay
+        self.lock = threading.RLock()
+        self.channels = {}
+        self.followers = {}  # account -> set di chat_id
+        self.save_timer = None
+        self.dirty = set()  # chat_id modificati localmente e non ancora salvati
+        self.file_version = None  # (mtime, dimensione) del file letto o scritto per ultimo
+        self.load()
+
+    def file_stat(self):
+        """Versione attuale del file (None se non esiste)"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def read_file(self):
+        """Canali salvati su file (lista vuota se il file non esiste)"""
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def load(self):
+        """Carica i canali dal file"""
+        with self.lock:
+            self.file_version = self.file_stat()
+            self.index(self.read_file() if self.file_version is not None else [])
+
+    def index(self, channels):
+        """Sostituisce i canali in memoria e ricostruisce l'indice per account (chiamare con il lock acquisito)"""
+        self.channels = {}
+        self.followers = {}
+        for ch in channels:
+            # I canali registrati prima del multi-account seguono l'account di default
+            ch.setdefault('accounts', [TWITTER_USERNAME])
+            self.channels[ch['chat_id']] = ch
+            for account in ch['accounts']:
+                self.followers.setdefault(account, set()).add(ch['chat_id'])
+
+    def refresh(self):
+        """
+        Ricarica il file se è stato modificato da un altro processo.
+        Se ci sono modifiche locali ancora da salvare prevalgono quelle.
+        """
+        with self.lock:
+            if self.save_timer is not None or self.file_stat() == self.file_version:
+                return False
+            self.load()
+            return True
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __contains__(self, chat_id):
+        return chat_id in self.channels
+
+    def all(self):
+        """Restituisce una copia della lista dei canali"""
+        with self.lock:
+            return [dict(ch) for ch in self.channels.values()]
+
+    def get(self, chat_id):
+        """Restituisce una copia del canale (None se non registrato)"""
+        with self.lock:
+            channel = self.channels.get(chat_id)
+            return dict(channel) if channel else None
+
+    def add(self, chat_id, chat_title):
+        """Registra un canale, ritorna False se era già registrato"""
+        with self.lock:
+            if chat_id in self.channels:
+                return False
+            self.channels[chat_id] = {
+                'chat_id': chat_id,
+                'chat_title': chat_title,
+                'added_date': datetime.now().isoformat(),
+                'accounts': [TWITTER_USERNAME]
+            }
+            self.followers.setdefault(TWITTER_USERNAME, set()).add(chat_id)
+            self.changed(chat_id)
+            return True
+
+    def follow(self, chat_id, account):
+        """Iscrive un canale registrato a un account, ritorna False se lo seguiva già"""
+        with self.lock:
+            channel = self.channels[chat_id]
+            if account in channel['accounts']:
+                return False
+            channel['accounts'] = channel['accounts'] + [account]
+            self.followers.setdefault(account, set()).add(chat_id)
+            self.changed(chat_id)
+            return True
+
+    def unfollow(self, chat_id, account):
+        """Disiscrive un canale da un account, ritorna False se non lo seguiva"""
+        with self.lock:
+            channel = self.channels[chat_id]
+            if account not in channel['accounts']:
+                return False
+            channel['accounts'] = [a for a in channel['accounts'] if a != account]
+            self.discard_follower(account, chat_id)
+            self.changed(chat_id)
+            return True
+
+    def set_digest(self, chat_id, mode, window=DIGEST_WINDOW):
+        """Imposta la modalità riepilogo di un canale ("off" la disattiva)"""
+        with self.lock:
+            channel = self.channels[chat_id]
+            if mode == 'off':
+                channel.pop('digest', None)
+            else:
+                channel['digest'] = {'mode': mode, 'window': window}
+            self.changed(chat_id)
+
+    def discard_follower(self, account, chat_id):
+        """Aggiorna l'indice account -> canali (chiamare con il lock acquisito)"""
+        chat_ids = self.followers.get(account)
+        if chat_ids is not None:
+            chat_ids.discard(chat_id)
+            if not chat_ids:
+                del self.followers[account]
+
+    def accounts(self):
+        """Account seguiti da almeno un canale"""
+        with self.lock:
+            return sorted(self.followers)
+
+    def subscribers(self, account):
+        """Copia dei canali che seguono un account"""
+        with self.lock:
+            return [dict(self.channels[chat_id]) for chat_id in self.followers.get(account, ())]
+
+    def remove(self, chat_id):
+        """Rimuove un canale, ritorna False se non era registrato"""
+        return self.remove_many([chat_id]) > 0
+
+    def remove_many(self, chat_ids):
+        """Rimuove più canali con un solo salvataggio"""
+        with self.lock:
+            removed = []
+            for chat_id in chat_ids:
+                channel = self.channels.pop(chat_id, None)
+                if channel is None:
+                    continue
+                for account in channel['accounts']:
+                    self.discard_follower(account, chat_id)
+                removed.append(chat_id)
+            if removed:
+                self.changed(*removed)
+            return len(removed)
+
+    def import_channels(self, channels):
+        """Registra o sostituisce più canali con un solo salvataggio, ritorna (aggiunti, aggiornati)"""
+        added = updated = 0
+        with self.lock:
+            for channel in channels:
+                chat_id = channel['chat_id']
+                previous = self.channels.get(chat_id)
+                if previous is None:
+                    added += 1
+                else:
+                    for account in previous['accounts']:
+                        self.discard_follower(account, chat_id)
+                    updated += 1
+                self.channels[chat_id] = dict(channel, added_date=channel.get('added_date') or datetime.now().isoformat())
+                for account in channel['accounts']:
+                    self.followers.setdefault(account, set()).add(chat_id)
+                self.dirty.add(chat_id)
+            if channels:
+                self.flush()
+        return added, updated
+
+    def changed(self, *chat_ids):
+        """Segna i canali modificati e pianifica il salvataggio (chiamare con il lock acquisito)"""
+        self.dirty.update(chat_ids)
+        self.schedule_save()
+
+    def schedule_save(self):
+        """Pianifica il salvataggio raggruppando le modifiche ravvicinate"""
+        with self.lock:
+            if self.save_timer is None:
+                self.save_timer = threading.Timer(self.save_delay, self.flush)
+                self.save_timer.daemon = True
+                self.save_timer.start()
+
+    @contextmanager
+    def file_lock(self):
+        """Lock esclusivo su file che serializza i salvataggi dei processi (nessun lock senza fcntl)"""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def flush(self):
+        """Scrive subito su file le modifiche in sospeso, in un unico salvataggio"""
+        with self.lock:
+            if self.save_timer is not None:
+                self.save_timer.cancel()
+                self.save_timer = None
+            if not self.dirty:
+                return
+            with self.file_lock():
+                # File riscritto da un altro processo: si riparte dalla sua versione con le sole modifiche locali
+                if self.file_stat() != self.file_version:
+                    merged = {ch['chat_id']: ch for ch in self.read_file()}
+                    for chat_id in self.dirty:
+                        if chat_id in self.channels:
+                            merged[chat_id] = self.channels[chat_id]
+                        else:
+                            merged.pop(chat_id, None)
+                    self.index(list(merged.values()))
+                
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(list(self.channels.values()), f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                self.file_version = self.file_stat()
+                self.dirty.clear()
+
+registry = None  # Aperto da open_stores() all'avvio: l'import del modulo non legge né scrive file
+
+RETWEET_PREFIX_PATTERN = re.compile(r'^rt( by)? @\w{1,15}:\s*')
+TEXT_URL_PATTERN = re.compile(r'(https?://|pic\.twitter\.com/)\S+')
+WORD_PATTERN = re.compile(r'\w+')
+RSS_TITLE_PREFIX_PATTERN = re.compile(r'^(?:(?:pinned|r to @\w{1,15}):\s*)+')
+RSS_PINNED_PREFIX_PATTERN = re.compile(r'^pinned:\s*')
+DISPLAY_URL_PATTERN = re.compile(r'(?<!\S)(?:[\w-]+\.)+[a-z]{2,}\S*')
+MINHASH_PRIME = (1 << 61) - 1
+# Seme fisso: le firme salvate restano confrontabili dopo un riavvio
+minhash_random = random.Random(20240105)
+MINHASH_COEFFICIENTS = [
+    (minhash_random.randrange(1, MINHASH_PRIME), minhash_random.randrange(MINHASH_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+def tweet_key(tweet):
+    """Chiave di un tweet per account: lo stesso status può comparire su più account (retweet)"""
+    return f"{tweet['account']}/{tweet['id']}"
+
+def status_id(tweet):
+    """Status ID numerico del tweet (None se l'ID è un hash del testo)"""
+    return int(tweet['id']) if str(tweet['id']).isdigit() else None
+
+def normalize_tweet_text(text):
+    """Testo confrontabile tra istanze: senza prefisso di retweet e link, minuscolo, spazi compattati"""
+    text = unicodedata.normalize('NFKC', text or '').lower().strip()
+    text = RETWEET_PREFIX_PATTERN.sub('', text)
+    text = TEXT_URL_PATTERN.sub('', text)
+    return ' '.join(text.split())
+
+def canonical_tweet_text(text):
+    """
+    Testo confrontabile tra RSS e HTML: oltre a normalize_tweet_text toglie i prefissi dei
+    titoli RSS (Pinned:, R to @utente:) e i link senza schema mostrati nell'HTML (bbc.co.uk/…),
+    che nel titolo RSS sono URL completi
+    """
+    text = RSS_TITLE_PREFIX_PATTERN.sub('', normalize_tweet_text(text))
+    return ' '.join(DISPLAY_URL_PATTERN.sub('', text).split())
+
+def minhash_signature(text):
+    """Firma MinHash degli shingle di parole del testo (lista vuota se non ci sono parole)"""
+    words = WORD_PATTERN.findall(normalize_tweet_text(text))
+    if not words:
+        return []
+    shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big') for shingle in shingles]
+    return [min((a * h + b) % MINHASH_PRIME for h in hashes) for a, b in MINHASH_COEFFICIENTS]
+
+def signature_bands(account, signature):
+    """Chiavi LSH della firma: due testi simili condividono con alta probabilità almeno una banda"""
+    rows = len(signature) // MINHASH_BANDS
+    return [
+        f"{account}:{band}:" + hashlib.blake2b(repr(signature[band * rows:(band + 1) * rows]).encode(), digest_size=8).hexdigest()
+        for band in range(MINHASH_BANDS)
+    ]
+
+class PostedTweetsStore:
+    """
+    Archivio persistente degli ID dei tweet già pubblicati (SQLite in modalità WAL).
+    Ricerca in tempo costante sulla chiave primaria e scritture incrementali.
+    Per ogni tweet pubblicato conserva anche la firma MinHash del testo, indicizzata
+    per bande (LSH), per riconoscere i quasi-duplicati dello stesso account, e per ogni
+    account lo status più recente pubblicato (punto di arrivo del recupero dopo un'interruzione).
+    """
 
-def save_posted_tweets(posted_tweets):
-    """Salva la lista dei tweet pubblicati"""
-    with open(POSTED_TWEETS_FILE, 'w') as f:
-        json.dump(posted_tweets, f)
+    def __init__(self, path, retention_days=POSTED_TWEETS_RETENTION_DAYS, max_entries=POSTED_TWEETS_MAX):
+        self.retention_days = retention_days
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS posted_tweets ("
+            "id TEXT PRIMARY KEY, posted_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_posted_at ON posted_tweets(posted_at)")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS tweet_signatures ("
+            "  id TEXT PRIMARY KEY, signature TEXT NOT NULL, posted_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_signatures_posted_at ON tweet_signatures(posted_at);"
+            "CREATE TABLE IF NOT EXISTS tweet_bands ("
+            "  band TEXT NOT NULL, id TEXT NOT NULL, posted_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_bands_posted_at ON tweet_bands(posted_at);"
+            "CREATE TABLE IF NOT EXISTS high_water_marks ("
+            "  account TEXT PRIMARY KEY, status_id INTEGER NOT NULL, updated_at REAL NOT NULL);"
+        )
+        has_unique_bands = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_bands_band_id'"
+        ).fetchone()
+        if not has_unique_bands:
+            # Archivi della versione precedente: righe duplicate per le bande dei tweet ripubblicati
+            self.conn.executescript(
+                "DELETE FROM tweet_bands WHERE rowid NOT IN ("
+                "  SELECT MIN(rowid) FROM tweet_bands GROUP BY band, id);"
+                "DROP INDEX IF EXISTS idx_bands_band;"
+                "CREATE UNIQUE INDEX idx_bands_band_id ON tweet_bands(band, id);"
+            )
+        self.conn.commit()
+
+    def migrate_legacy_file(self, legacy_path):
+        """
+        Importa gli ID dal vecchio posted_tweets.json (una sola volta). Eseguita solo dal
+        leader: più processi che spostano lo stesso file andrebbero in conflitto.
+        """
+        if not os.path.exists(legacy_path):
+            return
+        with open(legacy_path, 'r') as f:
+            tweet_ids = json.load(f)
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO posted_tweets (id, posted_at) VALUES (?, ?)",
+                [(tweet_id, now) for tweet_id in tweet_ids]
+            )
+            self.conn.commit()
+        os.replace(legacy_path, f"{legacy_path}.migrated")
+        logger.info(f"📦 Migrati {len(tweet_ids)} tweet pubblicati da {legacy_path}")
+
+    def __contains__(self, tweet_id):
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM posted_tweets WHERE id = ?", (tweet_id,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM posted_tweets").fetchone()[0]
+
+    def is_posted(self, tweet):
+        """True se il tweet è già stato pubblicato per il suo account (anche con l'ID del vecchio formato)"""
+        keys = [tweet_key(tweet)] + ([tweet['legacy_id']] if tweet.get('legacy_id') else [])
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT 1 FROM posted_tweets WHERE id IN ({','.join('?' * len(keys))})", keys
+            ).fetchone()
+        return row is not None
+
+    def add(self, tweet):
+        """Registra un tweet come pubblicato, con la firma per la ricerca dei quasi-duplicati"""
+        key = tweet_key(tweet)
+        now = time.time()
+        signature = minhash_signature(tweet['text'])
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO posted_tweets (id, posted_at) VALUES (?, ?)",
+                (key, now)
+            )
+            if signature:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO tweet_signatures (id, signature, posted_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(signature), now)
+                )
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO tweet_bands (band, id, posted_at) VALUES (?, ?, ?)",
+                    [(band, key, now) for band in signature_bands(tweet['account'], signature)]
+                )
+            # I retweet hanno lo status ID del tweet originale: non indicano fin dove è arrivato l'account
+            if status_id(tweet) is not None and not tweet.get('retweet'):
+                self.conn.execute(
+                    "INSERT INTO high_water_marks (account, status_id, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(account) DO UPDATE SET status_id = MAX(status_id, excluded.status_id), "
+                    "updated_at = excluded.updated_at",
+                    (tweet['account'], status_id(tweet), now)
+                )
+            self.conn.commit()
+
+    def high_water_mark(self, account):
+        """Status ID più recente pubblicato per l'account (None se non ancora noto)"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT status_id FROM high_water_marks WHERE account = ?", (account,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def find_near_duplicate(self, tweet):
+        """Chiave di un tweet già pubblicato dallo stesso account con testo quasi identico (None se assente)"""
+        signature = minhash_signature(tweet['text'])
+        if not signature:
+            return None
+        bands = signature_bands(tweet['account'], signature)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT s.id, s.signature FROM tweet_bands b JOIN tweet_signatures s ON s.id = b.id "
+                f"WHERE b.band IN ({','.join('?' * len(bands))})",
+                bands
+            ).fetchall()
+        
+        for key, stored in rows:
+            stored = json.loads(stored)
+            similarity = sum(a == b for a, b in zip(signature, stored)) / len(signature)
+            if similarity >= NEAR_DUPLICATE_THRESHOLD:
+                return key
+        return None
+
+    def prune(self):
+        """
+        Elimina gli ID più vecchi della retention o oltre la dimensione massima,
+        insieme alle firme e alle bande degli stessi tweet.
+        """
+        cutoff = time.time() - self.retention_days * 86400
+        with self.lock:
+            removed = self.conn.execute("DELETE FROM posted_tweets WHERE posted_at < ?", (cutoff,)).rowcount
+            removed += self.conn.execute(
+                "DELETE FROM posted_tweets WHERE id IN ("
+                "SELECT id FROM posted_tweets ORDER BY posted_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            self.conn.execute("DELETE FROM tweet_signatures WHERE id NOT IN (SELECT id FROM posted_tweets)")
+            self.conn.execute("DELETE FROM tweet_bands WHERE id NOT IN (SELECT id FROM posted_tweets)")
+            self.conn.commit()
+        return removed
+
+posted_tweets = None  # Aperto da open_stores()
+
+def status_time(status):
+    """Istante (secondi) in cui è stato creato uno status, ricavato dallo status ID (snowflake)"""
+    return ((status >> 22) + 1288834974657) / 1000
+
+class MessageIndex:
+    """
+    Indice persistente (SQLite in modalità WAL) dei messaggi inviati per ogni tweet:
+    tweet -> chat -> message_id, con l'hash del testo pubblicato. Un tweet modificato
+    diventa una modifica dei messaggi già inviati e un tweet eliminato la loro
+    eliminazione, senza un nuovo invio a tutti i canali. Il testo viene confrontato tramite
+    l'hash del testo canonico, uguale per lo stesso status letto via RSS o HTML. Dei
+    riepiloghi viene salvato anche il contenuto (digest_contents), per riscriverli senza
+    il tweet eliminato o con il nuovo testo. Le voci scadono dopo la retention.
+    """
+
+    HASH_VERSION = 'v2-'  # Gli hash senza prefisso (versione precedente) non sono confrontabili
+
+    def __init__(self, path, retention=MESSAGE_INDEX_RETENTION, max_entries=MESSAGE_INDEX_MAX):
+        self.retention = retention
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.missing = {}  # account -> {chiave del tweet: controlli consecutivi in cui è mancato}
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS indexed_tweets ("
+            "  tweet_id TEXT PRIMARY KEY, account TEXT NOT NULL, status_id INTEGER,"
+            "  text_hash TEXT NOT NULL, indexed_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_indexed_account ON indexed_tweets(account, status_id);"
+            "CREATE INDEX IF NOT EXISTS idx_indexed_at ON indexed_tweets(indexed_at);"
+            "CREATE TABLE IF NOT EXISTS tweet_messages ("
+            "  tweet_id TEXT NOT NULL, chat_id INTEGER NOT NULL, part INTEGER NOT NULL,"
+            "  message_id INTEGER NOT NULL, kind TEXT NOT NULL, sent_at REAL NOT NULL,"
+            "  PRIMARY KEY (tweet_id, chat_id, part)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS idx_messages_sent_at ON tweet_messages(sent_at);"
+            "CREATE TABLE IF NOT EXISTS digest_contents ("
+            "  chat_id INTEGER NOT NULL, message_id INTEGER NOT NULL, entries TEXT NOT NULL,"
+            "  sent_at REAL NOT NULL, PRIMARY KEY (chat_id, message_id)) WITHOUT ROWID;"
+        )
+        self.conn.commit()
+
+    @classmethod
+    def text_hash(cls, tweet):
+        """Hash del testo canonico (le differenze di link, prefissi o spazi tra RSS e HTML non contano)"""
+        return cls.HASH_VERSION + hashlib.blake2b(canonical_tweet_text(tweet['text']).encode(), digest_size=8).hexdigest()
+
+    def track(self, tweet):
+        """Registra un tweet pubblicato (i retweet non partecipano al rilevamento delle eliminazioni)"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO indexed_tweets (tweet_id, account, status_id, text_hash, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (tweet_key(tweet), tweet['account'], None if tweet.get('retweet') else status_id(tweet),
+                 self.text_hash(tweet), time.time())
+            )
+            self.conn.commit()
+
+    def text_changed(self, tweet, key=None):
+        """True se il tweet indicizzato con la chiave indicata (default: la sua) aveva un testo diverso"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT text_hash FROM indexed_tweets WHERE tweet_id = ?", (key or tweet_key(tweet),)
+            ).fetchone()
+        return row is not None and row[0].startswith(self.HASH_VERSION) and row[0] != self.text_hash(tweet)
+
+    def update_text(self, tweet, previous=None):
+        """Registra il nuovo testo del tweet; con previous le copie di quel tweet passano a questo"""
+        key = tweet_key(tweet)
+        with self.lock:
+            if previous and previous != key:
+                self.conn.execute("UPDATE OR IGNORE tweet_messages SET tweet_id = ? WHERE tweet_id = ?", (key, previous))
+                self.conn.execute(
+                    "UPDATE digest_contents SET entries = replace(entries, ?, ?) WHERE instr(entries, ?) > 0",
+                    (json.dumps(previous), json.dumps(key), json.dumps(previous))
+                )
+                self.conn.execute("DELETE FROM indexed_tweets WHERE tweet_id = ?", (previous,))
+            self.conn.execute(
+                "INSERT INTO indexed_tweets (tweet_id, account, status_id, text_hash, indexed_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(tweet_id) DO UPDATE SET text_hash = excluded.text_hash",
+                (key, tweet['account'], None if tweet.get('retweet') else status_id(tweet), self.text_hash(tweet), time.time())
+            )
+            self.conn.commit()
+
+    def record(self, tweet, chat_id, messages):
+        """Registra i messaggi inviati a una chat per il tweet: lista di (message_id, tipo)"""
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO tweet_messages (tweet_id, chat_id, part, message_id, kind, sent_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(tweet_key(tweet), chat_id, part, message_id, kind, now) for part, (message_id, kind) in enumerate(messages)]
+            )
+            self.conn.commit()
+
+    def record_digest(self, chat_id, message_id, entries):
+        """
+        Registra il contenuto di un messaggio di riepilogo (lista di (chiave del tweet, parte))
+        e lo indicizza per ogni tweet che contiene
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM tweet_messages WHERE chat_id = ? AND message_id = ? AND kind = 'digest'",
+                (chat_id, message_id)
+            )
+            if not entries:
+                self.conn.execute("DELETE FROM digest_contents WHERE chat_id = ? AND message_id = ?", (chat_id, message_id))
+                self.conn.commit()
+                return
+            self.conn.execute(
+                "INSERT OR REPLACE INTO digest_contents (chat_id, message_id, entries, sent_at) VALUES (?, ?, ?, ?)",
+                (chat_id, message_id, json.dumps(entries), now)
+            )
+            # Un tweet può proseguire nel riepilogo successivo: la parte è il message_id, unico e crescente nella chat
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO tweet_messages (tweet_id, chat_id, part, message_id, kind, sent_at) "
+                "VALUES (?, ?, ?, ?, 'digest', ?)",
+                [(key, chat_id, message_id, message_id, now) for key in dict.fromkeys(key for key, _ in entries)]
+            )
+            self.conn.commit()
+
+    def digest_entries(self, chat_id, message_id):
+        """Contenuto di un messaggio di riepilogo (None se non più ricordato)"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT entries FROM digest_contents WHERE chat_id = ? AND message_id = ?", (chat_id, message_id)
+            ).fetchone()
+        return None if row is None else [tuple(entry) for entry in json.loads(row[0])]
+
+    def messages(self, key, chat_id):
+        """Messaggi inviati a una chat per il tweet, in ordine: lista di (message_id, tipo)"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT message_id, kind FROM tweet_messages WHERE tweet_id = ? AND chat_id = ? ORDER BY part",
+                (key, chat_id)
+            ).fetchall()
+
+    def chats(self, key):
+        """Chat che hanno ricevuto una copia del tweet"""
+        with self.lock:
+            rows = self.conn.execute("SELECT DISTINCT chat_id FROM tweet_messages WHERE tweet_id = ?", (key,)).fetchall()
+        return [chat_id for chat_id, in rows]
 
-def get_tweet_id(tweet_text, tweet_time):
-    """Genera un ID unico per il tweet basato su contenuto e timestamp"""
+    def forget(self, key, chat_id=None):
+        """Dimentica le copie del tweet in una chat, oppure il tweet (le copie restano fino alla loro eliminazione)"""
+        with self.lock:
+            if chat_id is None:
+                self.conn.execute("DELETE FROM indexed_tweets WHERE tweet_id = ?", (key,))
+            else:
+                self.conn.execute("DELETE FROM tweet_messages WHERE tweet_id = ? AND chat_id = ?", (key, chat_id))
+            self.conn.commit()
+
+    def deleted(self, account, tweets):
+        """
+        Tweet indicizzati dell'account che mancano dalla timeline scaricata pur essendo compresi
+        tra il suo status più vecchio e il più recente. Conta solo una Timeline che riporta gli
+        status di tutti i tweet della pagina, anche quelli scartati dal parser. Sono considerati
+        eliminati dopo DELETE_CONFIRMATIONS controlli consecutivi (una risposta parziale non basta).
+        """
+        present = getattr(tweets, 'statuses', None)
+        if present is None:
+            return []
+        statuses = [
+            status_id(tweet) for tweet in tweets
+            if status_id(tweet) is not None and not tweet.get('retweet') and not tweet.get('pinned')
+        ]
+        if len(statuses) < 2:
+            return []
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT tweet_id, status_id FROM indexed_tweets WHERE account = ? AND status_id > ? AND status_id < ?",
+                (account, min(statuses), max(statuses))
+            ).fetchall()
+            previous = self.missing.get(account, {})
+            missing = {key: previous.get(key, 0) + 1 for key, status in rows if status not in present}
+            self.missing[account] = {key: count for key, count in missing.items() if count < DELETE_CONFIRMATIONS}
+        return [key for key, count in missing.items() if count >= DELETE_CONFIRMATIONS]
+
+    def prune(self):
+        """Elimina le voci più vecchie della retention o oltre la dimensione massima"""
+        cutoff = time.time() - self.retention
+        with self.lock:
+            removed = self.conn.execute("DELETE FROM tweet_messages WHERE sent_at < ?", (cutoff,)).rowcount
+            removed += self.conn.execute(
+                "DELETE FROM tweet_messages WHERE sent_at < ("
+                "SELECT sent_at FROM tweet_messages ORDER BY sent_at DESC LIMIT 1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            self.conn.execute("DELETE FROM indexed_tweets WHERE indexed_at < ?", (cutoff,))
+            self.conn.execute("DELETE FROM digest_contents WHERE sent_at < ?", (cutoff,))
+            self.conn.commit()
+        return removed
+
+message_index = None  # Aperto da open_stores()
+
+def get_tweet_id(tweet_text, link=None):
+    """
+    ID stabile del tweet: lo status ID di Twitter ricavato dal link (uguale su tutte le
+    istanze, via RSS o HTML), altrimenti l'hash del testo normalizzato.
+    """
+    match = STATUS_PATH_PATTERN.search(urlsplit(link).path) if link else None
+    if match:
+        return match.group(2)
+    return hashlib.md5(normalize_tweet_text(tweet_text).encode()).hexdigest()
+
+def legacy_tweet_id(tweet_text, tweet_time):
+    """ID nel formato precedente (hash di testo e data), per riconoscere i tweet già pubblicati prima dell'aggiornamento"""
     content = f"{tweet_text}_{tweet_time}"
     return hashlib.md5(content.encode()).hexdigest()
 
+USERNAME_PATTERN = re.compile(r'^[A-Za-z0-9_]{1,15}$')
+
+def normalize_account(text):
+    """Normalizza un username Twitter (senza @, minuscolo), None se non valido"""
+    account = (text or '').strip().lstrip('@').lower()
+    return account if USERNAME_PATTERN.match(account) else None
+
+def escape_markdown(text):
+    """Escape dei caratteri speciali del Markdown di Telegram"""
+    return re.sub(r'([_*`\[])', r'\\\1', str(text))
+
+def format_accounts(accounts):
+    """Elenco di account come testo Markdown"""
+    return ", ".join(f"@{escape_markdown(account)}" for account in accounts) or "nessuno"
+
+BOT_IDENTITY_TTL = 3600  # Secondi di validità dell'identità del bot (getMe) in cache
+
+class BotIdentity:
+    """
+    Identità del bot (getMe) letta all'avvio e aggiornata solo alla scadenza del TTL.
+    Se Telegram non risponde durante l'aggiornamento si continua a usare quella in cache.
+    """
+
+    def __init__(self, ttl=BOT_IDENTITY_TTL):
+        self.ttl = ttl
+        self.user = None
+        self.fetched_at = 0.0
+        self.lock = threading.Lock()
+
+    def get(self, refresh=False):
+        """Utente Telegram del bot (chiamata a getMe solo se la cache è vuota o scaduta)"""
+        if not refresh and self.user is not None and time.time() - self.fetched_at < self.ttl:
+            return self.user
+        
+        # Un solo aggiornamento alla volta, gli altri thread riusano il risultato
+        with self.lock:
+            if not refresh and self.user is not None and time.time() - self.fetched_at < self.ttl:
+                return self.user
+            try:
+                self.user = bot.get_me()
+                self.fetched_at = time.time()
+            except Exception as e:
+                if self.user is None:
+                    raise
+                logger.warning(f"⚠️ getMe non riuscito, uso l'identità in cache: {e}")
+            return self.user
+
+    def is_me(self, user):
+        """Confronto locale: True se l'utente è il bot stesso"""
+        return user.id == self.get().id
+
+    def warm_up(self):
+        """Legge l'identità all'avvio (da eseguire in thread separato)"""
+        try:
+            me = self.get()
+            logger.info(f"🤖 Identità del bot: @{me.username} (ID: {me.id})")
+        except Exception as e:
+            logger.error(f"❌ Impossibile leggere l'identità del bot: {e}")
+
+bot_identity = BotIdentity()
+
 # Handler per quando il bot viene aggiunto a un gruppo/canale
 @bot.message_handler(content_types=['new_chat_members'])
 def handle_new_member(message):
     """Gestisce quando il bot viene aggiunto a un nuovo canale/gruppo"""
     for new_member in message.new_chat_members:
-        if new_member.username == bot.get_me().username:
+        if new_member.is_bot and bot_identity.is_me(new_member):
             chat_id = message.chat.id
             chat_title = message.chat.title or "Chat Privata"
             
-            # Registra il canale
-            channels = load_registered_channels()
-            
-            # Controlla se il canale è già registrato
-            if not any(ch['chat_id'] == chat_id for ch in channels):
-                channels.append({
-                    'chat_id': chat_id,
-                    'chat_title': chat_title,
-                    'added_date': datetime.now().isoformat()
-                })
-                save_registered_channels(channels)
-                
+            # Registra il canale (se non è già registrato)
+            if registry.add(chat_id, chat_title):
                 bot.send_message(
                     chat_id,
                     f"🎉 **Bot attivato!**\n\n"
-                    f"Ciao! Sono il bot che ripubblica i tweet di @{TWITTER_USERNAME}.\n"
+                    f"Ciao! Sono il bot che ripubblica i tweet di @{escape_markdown(TWITTER_USERNAME)}.\n"
                     f"📢 Da ora in poi riceverete automaticamente tutti i suoi nuovi tweet!\n\n"
                     f"**Comandi disponibili:**\n"
                     f"/start - Informazioni sul bot\n"
+                    f"/follow <account> - Segui un altro account\n"
+                    f"/unfollow <account> - Smetti di seguire un account\n"
+                    f"/digest <off|merge|edit> - Unisci i tweet ravvicinati in un solo messaggio\n"
                     f"/stop - Disattiva il bot per questo canale\n"
                     f"/status - Stato del bot",
                     parse_mode='Markdown'
@@ -112,22 +1234,15 @@ def handle_start(message):
         chat_id = message.chat.id
         chat_title = message.chat.title or "Chat Senza Nome"
         
-        channels = load_registered_channels()
-        
-        # Controlla se il canale è già registrato
-        if not any(ch['chat_id'] == chat_id for ch in channels):
-            channels.append({
-                'chat_id': chat_id,
-                'chat_title': chat_title,
-                'added_date': datetime.now().isoformat()
-            })
-            save_registered_channels(channels)
+        # Registra il canale (se non è già registrato)
+        if registry.add(chat_id, chat_title):
             logger.info(f"✅ Canale registrato via /start: {chat_title} (ID: {chat_id})")
     
     bot.reply_to(
         message,
-        f"🤖 **Bot Tweet @{TWITTER_USERNAME}**\n\n"
-        f"Questo bot ripubblica automaticamente tutti i tweet di @{TWITTER_USERNAME}.\n\n"
+        f"🤖 **Bot Tweet @{escape_markdown(TWITTER_USERNAME)}**\n\n"
+        f"Questo bot ripubblica automaticamente tutti i tweet di @{escape_markdown(TWITTER_USERNAME)} "
+        f"e degli altri account che scegli di seguire.\n\n"
         f"**Per usarlo:**\n"
         f"1️⃣ Aggiungimi al tuo canale/gruppo\n"
         f"2️⃣ Dammi i permessi per scrivere messaggi\n"
@@ -135,6 +1250,9 @@ def handle_start(message):
         f"**Comandi:**\n"
         f"/start - Mostra queste informazioni\n"
         f"/register - Registra questo canale\n"
+        f"/follow <account> - Segui un altro account\n"
+        f"/unfollow <account> - Smetti di seguire un account\n"
+        f"/digest <off|merge|edit> - Unisci i tweet ravvicinati in un solo messaggio\n"
         f"/stop - Disattiva per questo canale\n"
         f"/status - Stato del servizio",
         parse_mode='Markdown'
@@ -147,10 +1265,8 @@ def handle_register(message):
     chat_id = message.chat.id
     chat_title = message.chat.title or f"Chat {chat_id}"
     
-    channels = load_registered_channels()
-    
     # Controlla se il canale è già registrato
-    if any(ch['chat_id'] == chat_id for ch in channels):
+    if chat_id in registry:
         bot.reply_to(
             message,
             "✅ **Canale già registrato!**\n\n"
@@ -160,34 +1276,115 @@ def handle_register(message):
         return
     
     # Registra il canale
-    channels.append({
-        'chat_id': chat_id,
-        'chat_title': chat_title,
-        'added_date': datetime.now().isoformat()
-    })
-    save_registered_channels(channels)
+    registry.add(chat_id, chat_title)
     
     bot.reply_to(
         message,
         f"🎉 **Canale registrato con successo!**\n\n"
         f"📢 **Canale:** {chat_title}\n"
-        f"🐦 **Monitoraggio:** @{TWITTER_USERNAME}\n"
-        f"⏰ **Controllo:** Ogni 10 minuti\n\n"
-        f"Da ora riceverai automaticamente tutti i nuovi tweet!",
+        f"🐦 **Monitoraggio:** @{escape_markdown(TWITTER_USERNAME)}\n"
+        f"⏰ **Controllo:** {describe_poll_interval()}\n\n"
+        f"Da ora riceverai automaticamente tutti i nuovi tweet!\n"
+        f"Usa /follow <account> per seguire altri account.",
         parse_mode='Markdown'
     )
     logger.info(f"✅ Canale registrato manualmente: {chat_title} (ID: {chat_id})")
 
+# Handler per il comando /follow
+@bot.message_handler(commands=['follow'])
+def handle_follow(message):
+    """Iscrive il canale corrente a un account Twitter"""
+    chat_id = message.chat.id
+    account = normalize_account(telebot.util.extract_arguments(message.text))
+    
+    if account is None:
+        bot.reply_to(message, "ℹ️ Uso: /follow <account> (es. /follow fabrizioromano)")
+        return
+    
+    if chat_id not in registry:
+        bot.reply_to(message, "❌ Canale non registrato. Usa /register prima di seguire un account.")
+        return
+    
+    if not registry.follow(chat_id, account):
+        bot.reply_to(message, f"✅ Questo canale segue già @{escape_markdown(account)}.", parse_mode='Markdown')
+        return
+    
+    poll_scheduler.sync(registry.accounts())
+    bot.reply_to(
+        message,
+        f"🐦 **Ora segui @{escape_markdown(account)}**\n\n"
+        f"Riceverai automaticamente i suoi nuovi tweet.",
+        parse_mode='Markdown'
+    )
+    logger.info(f"➕ {message.chat.title} (ID: {chat_id}) segue @{account}")
+
+# Handler per il comando /unfollow
+@bot.message_handler(commands=['unfollow'])
+def handle_unfollow(message):
+    """Disiscrive il canale corrente da un account Twitter"""
+    chat_id = message.chat.id
+    account = normalize_account(telebot.util.extract_arguments(message.text))
+    
+    if account is None:
+        bot.reply_to(message, "ℹ️ Uso: /unfollow <account> (es. /unfollow fabrizioromano)")
+        return
+    
+    if chat_id not in registry or not registry.unfollow(chat_id, account):
+        bot.reply_to(message, f"❌ Questo canale non segue @{escape_markdown(account)}.", parse_mode='Markdown')
+        return
+    
+    poll_scheduler.sync(registry.accounts())
+    bot.reply_to(
+        message,
+        f"👋 Non riceverai più i tweet di @{escape_markdown(account)}.",
+        parse_mode='Markdown'
+    )
+    logger.info(f"➖ {message.chat.title} (ID: {chat_id}) non segue più @{account}")
+
+# Handler per il comando /digest
+@bot.message_handler(commands=['digest'])
+def handle_digest(message):
+    """Imposta la modalità riepilogo del canale corrente"""
+    chat_id = message.chat.id
+    args = (telebot.util.extract_arguments(message.text) or '').lower().split()
+    
+    if chat_id not in registry:
+        bot.reply_to(message, "❌ Canale non registrato. Usa /register prima di impostare il riepilogo.")
+        return
+    
+    if not args:
+        digest = registry.get(chat_id).get('digest')
+        current = f"{digest['mode']} ({digest['window']}s)" if digest else 'off'
+        bot.reply_to(
+            message,
+            f"🗞️ Modalità riepilogo: {current}\n\n"
+            f"ℹ️ Uso: /digest <off|merge|edit> [secondi]\n"
+            f"• merge: i tweet arrivati nella finestra vengono inviati insieme in un solo messaggio\n"
+            f"• edit: il primo tweet arriva subito, i successivi nella finestra vengono aggiunti allo stesso messaggio"
+        )
+        return
+    
+    mode = args[0]
+    window = args[1] if len(args) > 1 else str(DIGEST_WINDOW)
+    if mode not in DIGEST_MODES or not window.isdigit() or not 1 <= int(window) <= DIGEST_MAX_WINDOW:
+        bot.reply_to(message, f"ℹ️ Uso: /digest <off|merge|edit> [secondi, da 1 a {DIGEST_MAX_WINDOW}]")
+        return
+    
+    registry.set_digest(chat_id, mode, int(window))
+    if mode == 'off':
+        bot.reply_to(message, "📨 Riepilogo disattivato: ogni tweet verrà inviato in un messaggio separato.")
+    else:
+        bot.reply_to(message, f"🗞️ Riepilogo attivo ({mode}): i tweet arrivati entro {window} secondi verranno uniti.")
+    logger.info(f"🗞️ {message.chat.title} (ID: {chat_id}) riepilogo: {mode} ({window}s)")
+
 # Handler per il comando /stop
 @bot.message_handler(commands=['stop'])
 def handle_stop(message):
     """Disattiva il bot per il canale corrente"""
     chat_id = message.chat.id
-    channels = load_registered_channels()
     
     # Rimuovi il canale dalla lista
-    channels = [ch for ch in channels if ch['chat_id'] != chat_id]
-    save_registered_channels(channels)
+    registry.remove(chat_id)
     
     bot.reply_to(
         message,
@@ -198,341 +1395,2371 @@ def handle_stop(message):
     )
     logger.info(f"❌ Canale rimosso: {message.chat.title} (ID: {chat_id})")
 
-# Handler per il comando /status
-@bot.message_handler(commands=['status'])
-def handle_status(message):
-    """Mostra lo stato del bot"""
-    channels = load_registered_channels()
-    total_channels = len(channels)
-    
-    is_registered = any(ch['chat_id'] == message.chat.id for ch in channels)
-    status_emoji = "✅" if is_registered else "❌"
-    status_text = "Attivo" if is_registered else "Non attivo"
-    
-    bot.reply_to(
-        message,
-        f"📊 **Status Bot**\n\n"
-        f"{status_emoji} **Stato in questo canale:** {status_text}\n"
-        f"📢 **Canali totali attivi:** {total_channels}\n"
-        f"🐦 **Account monitorato:** @{TWITTER_USERNAME}\n"
-        f"⏰ **Ultimo controllo:** In corso...\n\n"
-        f"Il bot controlla nuovi tweet ogni 10 minuti.",
-        parse_mode='Markdown'
-    )
+def describe_poll_interval():
+    """Descrizione dell'intervallo di controllo adattivo degli account"""
+    return (
+        f"adattivo, da {MIN_POLL_INTERVAL / 60:g} a {MAX_POLL_INTERVAL / 60:g} minuti "
+        f"(più frequente quando l'account pubblica di più)"
+    )
+
+# Handler per il comando /status
+@bot.message_handler(commands=['status'])
+def handle_status(message):
+    """Mostra lo stato del bot"""
+    total_channels = len(registry)
+    
+    channel = registry.get(message.chat.id)
+    is_registered = channel is not None
+    status_emoji = "✅" if is_registered else "❌"
+    status_text = "Attivo" if is_registered else "Non attivo"
+    accounts = channel['accounts'] if is_registered else []
+    digest = channel.get('digest') if is_registered else None
+    
+    bot.reply_to(
+        message,
+        f"📊 **Status Bot**\n\n"
+        f"{status_emoji} **Stato in questo canale:** {status_text}\n"
+        f"📢 **Canali totali attivi:** {total_channels}\n"
+        f"🐦 **Account seguiti:** {format_accounts(accounts)}\n"
+        f"🗞️ **Riepilogo:** {digest['mode'] + ' (' + str(digest['window']) + 's)' if digest else 'off'}\n"
+        f"🌐 **Account monitorati in totale:** {len(registry.accounts())}\n"
+        f"⏰ **Ultimo controllo:** In corso...\n\n"
+        f"Il bot controlla i nuovi tweet di ogni account con un intervallo {describe_poll_interval()}.",
+        parse_mode='Markdown'
+    )
+
+# Istanze Nitter con RSS
+RSS_INSTANCES = [
+    "https://nitter.cz",
+    "https://nitter.poast.org",
+    "https://nitter.privacydev.net",
+    "https://nitter.net"
+]
+
+# Lista aggiornata di istanze Nitter funzionanti (scraping HTML)
+NITTER_INSTANCES = [
+    "https://nitter.cz",
+    "https://nitter.poast.org",
+    "https://nitter.privacydev.net", 
+    "https://nitter.net",
+    "https://nitter.it",
+    "https://nitter.fdn.fr",
+    "https://nitter.1d4.us",
+    "https://nitter.kavin.rocks",
+    "https://nitter.unixfox.eu",
+    "https://nitter.domain.glass",
+    "https://nitter.eu",
+    "https://nitter.namazso.eu",
+    "https://bird.trom.tf",
+    "https://nitter.moomoo.me",
+    "https://nitter.fly.dev"
+]
+
+RSS_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (compatible; RSS Reader)'
+}
+
+MAX_TWEETS_PER_FETCH = 5  # Tweet estratti da ogni timeline HTML (e dal feed RSS al primo controllo)
+MAX_RSS_ITEMS = 100  # Limite di sicurezza per gli elementi letti da un feed RSS
+
+# Strategie per individuare i contenitori dei tweet (la struttura HTML cambia tra istanze):
+# tag, attributi e pattern del tag di apertura usato per ritagliare la pagina
+HTML_CONTAINER_STRATEGIES = [
+    ('div', {'class': 'timeline-item'}, re.compile(rb'<div\b[^>]*\bclass="(?:[^"]*\s)?timeline-item[\s"]')),
+    ('div', {'class': 'tweet'}, re.compile(rb'<div\b[^>]*\bclass="(?:[^"]*\s)?tweet[\s"]')),
+    ('article', {}, re.compile(rb'<article\b')),
+    ('div', {'data-tweet-id': True}, re.compile(rb'<div\b[^>]*\bdata-tweet-id=')),
+]
+
+# Strategia che ha funzionato l'ultima volta per ogni istanza
+html_strategy_cache = {}
+
+HTML_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+def request_timeout(default, deadline=None):
+    """Timeout di una singola richiesta, limitato dal tempo rimasto prima della deadline"""
+    if deadline is None:
+        return default
+    return max(1, min(default, deadline - time.monotonic()))
+
+http_sessions = {}
+http_sessions_lock = threading.Lock()
+
+# Validatori (ETag/Last-Modified) e tweet già estratti per ogni URL, per i GET condizionali
+feed_cache = {}
+feed_cache_lock = threading.Lock()
+
+def get_session(instance):
+    """Restituisce la sessione HTTP condivisa per un'istanza (connessioni keep-alive)"""
+    with http_sessions_lock:
+        session = http_sessions.get(instance)
+        if session is None:
+            session = requests.Session()
+            retries = Retry(
+                total=HTTP_RETRIES,
+                backoff_factor=0.3,
+                status_forcelist=[502, 503, 504],
+                allowed_methods=['GET']
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retries)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            http_sessions[instance] = session
+        return session
+
+class RaceCancelled(Exception):
+    """Richiesta abbandonata: un'altra istanza ha già vinto la gara"""
+
+class InstanceRace:
+    """
+    Risposte in corso di una gara tra istanze: trovato il vincitore, le risposte delle
+    istanze sconfitte vengono chiuse, interrompendo il download e liberando il socket.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.responses = set()
+        self.cancelled = False
+
+    def track(self, response):
+        """Registra una risposta in corso, False (e la chiude) se la gara è già finita"""
+        with self.lock:
+            if not self.cancelled:
+                self.responses.add(response)
+                return True
+        response.close()
+        return False
+
+    def release(self, response):
+        with self.lock:
+            self.responses.discard(response)
+
+    def cancel(self):
+        """Chiude le risposte ancora in corso"""
+        with self.lock:
+            self.cancelled = True
+            responses = list(self.responses)
+            self.responses.clear()
+        for response in responses:
+            response.close()
+
+current_race = contextvars.ContextVar('current_race', default=None)
+
+def conditional_get(instance, url, headers, timeout, verify=True):
+    """
+    GET con If-None-Match/If-Modified-Since se la risorsa è già stata scaricata.
+    Dentro una gara il corpo viene scaricato in streaming, così la gara può interromperlo.
+    """
+    headers = dict(headers)
+    with feed_cache_lock:
+        cached = feed_cache.get(url)
+    if cached:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+    
+    race = current_race.get()
+    if race is None:
+        return get_session(instance).get(url, headers=headers, timeout=timeout, verify=verify)
+    
+    response = get_session(instance).get(url, headers=headers, timeout=timeout, verify=verify, stream=True)
+    if not race.track(response):
+        raise RaceCancelled()
+    try:
+        response.content  # Scarica il corpo (interrotto se la gara chiude la risposta)
+    finally:
+        race.release(response)
+    if race.cancelled:
+        raise RaceCancelled()
+    return response
+
+class Timeline(list):
+    """
+    Tweet estratti da una pagina, con gli status ID di tutti i tweet presenti (anche quelli
+    scartati dal parser, es. testo troppo corto o solo immagini). statuses è None se lo
+    status di qualche tweet non è noto: la pagina non basta a dire quali tweet mancano.
+    """
+
+    def __init__(self, tweets=(), statuses=None):
+        super().__init__(tweets)
+        self.statuses = statuses
+
+def status_from_link(link):
+    """Status ID dal link a un tweet (None se assente)"""
+    match = STATUS_PATH_PATTERN.search(urlsplit(link).path) if link else None
+    return int(match.group(2)) if match else None
+
+def cached_tweets(url):
+    """Tweet estratti l'ultima volta da un URL (per le risposte 304)"""
+    with feed_cache_lock:
+        cached = feed_cache.get(url)
+    return Timeline(cached['tweets'], getattr(cached['tweets'], 'statuses', None)) if cached else []
+
+def remember_feed(url, response, tweets):
+    """Memorizza i validatori della risposta e i tweet estratti"""
+    etag = response.headers.get('ETag')
+    last_modified = response.headers.get('Last-Modified')
+    if not tweets or not (etag or last_modified):
+        return
+    with feed_cache_lock:
+        feed_cache[url] = {'etag': etag, 'last_modified': last_modified, 'tweets': tweets}
+
+RSS_IMAGE_PATTERN = re.compile(r'<img[^>]+src="([^"]+)"')
+STATUS_PATH_PATTERN = re.compile(r'/(\w{1,15})/status/(\d+)')
+
+def canonical_tweet_link(url):
+    """Link al tweet su x.com a partire dal link di un'istanza Nitter (None se assente)"""
+    if not url:
+        return None
+    match = STATUS_PATH_PATTERN.search(urlsplit(url).path)
+    return f"https://x.com/{match.group(1)}/status/{match.group(2)}" if match else url
+
+def parse_rss_items(content, username, is_known=lambda tweet: False):
+    """
+    Legge il feed RSS in streaming (iterparse) dal più recente al più vecchio e si ferma
+    al primo tweet già pubblicato, che viene incluso come riferimento. Il tweet fissato
+    (primo elemento, "Pinned:") e i retweet non sono in ordine cronologico e non fermano
+    la lettura anche se già pubblicati. Se nessun tweet è
+    già noto (primo controllo o interruzione più lunga del feed) vengono tenuti solo
+    gli ultimi MAX_TWEETS_PER_FETCH.
+    """
+    tweets = []
+    statuses = set()
+    reached_known = False
+    
+    for _, item in ET.iterparse(io.BytesIO(content), events=('end',)):
+        if item.tag != 'item':
+            continue
+        
+        title = item.findtext('title')
+        pub_date = item.findtext('pubDate')
+        description = item.findtext('description') or ''
+        link = item.findtext('link') or item.findtext('guid')
+        item.clear()
+        
+        status = status_from_link(link)
+        if status is None:
+            statuses = None
+        elif statuses is not None:
+            statuses.add(status)
+        if not title:
+            continue
+        
+        tweet_text = title.strip()
+        tweet_time = pub_date if pub_date is not None else "Data sconosciuta"
+        tweet = {
+            'account': username,
+            'text': tweet_text,
+            'time': tweet_time,
+            'images': RSS_IMAGE_PATTERN.findall(description),
+            'link': canonical_tweet_link(link),
+            'id': get_tweet_id(tweet_text, link),
+            'legacy_id': legacy_tweet_id(tweet_text, tweet_time)
+        }
+        if RETWEET_PREFIX_PATTERN.match(tweet_text.lower()):
+            tweet['retweet'] = True
+        if RSS_PINNED_PREFIX_PATTERN.match(tweet_text.lower()):
+            tweet['pinned'] = True
+        tweets.append(tweet)
+        
+        if not tweet.get('pinned') and not tweet.get('retweet') and is_known(tweet):
+            reached_known = True
+            break
+        if len(tweets) >= MAX_RSS_ITEMS:
+            break
+    
+    if not reached_known:
+        tweets = tweets[:MAX_TWEETS_PER_FETCH]
+    return Timeline(tweets, statuses)
+
+def fetch_rss_timeline(instance, username, deadline=None):
+    """Scarica e interpreta il feed RSS di una singola istanza Nitter"""
+    rss_url = f"{instance}/{username}/rss"
+    logger.debug(f"Tentativo RSS con {instance}...")
+    
+    response = conditional_get(instance, rss_url, RSS_HEADERS, request_timeout(15, deadline), verify=False)
+    if response.status_code == 304:
+        logger.debug(f"📭 Feed RSS invariato su {instance}")
+        return cached_tweets(rss_url)
+    if response.status_code != 200:
+        return []
+    
+    try:
+        parse_started = time.monotonic()
+        with span('parse', kind='rss', instance=instance):
+            tweets = parse_rss_items(response.content, username, is_known=posted_tweets.is_posted)
+        metrics.observe('nitter_parse_seconds', time.monotonic() - parse_started, kind='rss')
+    except ET.ParseError as e:
+        logger.error(f"Errore parsing RSS da {instance}: {e}")
+        return []
+    
+    if tweets:
+        logger.debug(f"✅ Trovati {len(tweets)} tweet via RSS da {instance}")
+    remember_feed(rss_url, response, tweets)
+    return tweets
+
+def fetch_html_timeline(instance, username, deadline=None):
+    """Scarica e interpreta la pagina HTML di una singola istanza Nitter"""
+    url = f"{instance}/{username}"
+    logger.debug(f"Tentativo con {instance}...")
+    
+    # Prova prima con SSL, poi senza se fallisce
+    try:
+        response = conditional_get(instance, url, HTML_HEADERS, request_timeout(20, deadline))
+    except requests.exceptions.SSLError:
+        response = conditional_get(instance, url, HTML_HEADERS, request_timeout(20, deadline), verify=False)
+    
+    if response.status_code == 304:
+        logger.debug(f"📭 Pagina invariata su {instance}")
+        return cached_tweets(url)
+    if response.status_code != 200:
+        return []
+    
+    parse_started = time.monotonic()
+    with span('parse', kind='html', instance=instance):
+        tweets = parse_html_timeline(response.content, instance, username)
+    metrics.observe('nitter_parse_seconds', time.monotonic() - parse_started, kind='html')
+    
+    if tweets:
+        logger.debug(f"✅ Trovati {len(tweets)} tweet con {instance}")
+    else:
+        logger.warning(f"Nessun tweet valido estratto da {instance}")
+    remember_feed(url, response, tweets)
+    return tweets
+
+SHOW_MORE_PATTERN = re.compile(rb'class="show-more"[^>]*>\s*<a href="([^"]*cursor=[^"]*)"')
+
+def next_page_cursor(content):
+    """Cursore della pagina successiva dal link "Load more" di Nitter (None all'ultima pagina)"""
+    matches = SHOW_MORE_PATTERN.findall(content)
+    if not matches:
+        return None
+    query = urlsplit(html.unescape(matches[-1].decode('utf-8', 'replace'))).query
+    return parse_qs(query).get('cursor', [None])[0]
+
+def fetch_timeline_page(instance, username, cursor=None, deadline=None):
+    """Una pagina della timeline HTML (per il recupero): tweet e cursore della pagina successiva"""
+    url = f"{instance}/{username}"
+    response = get_session(instance).get(
+        url, params={'cursor': cursor} if cursor else None, headers=HTML_HEADERS,
+        timeout=request_timeout(20, deadline), verify=False
+    )
+    if response.status_code != 200:
+        return [], None
+    with span('parse', kind='html', instance=instance, cursor=bool(cursor)):
+        tweets = parse_html_timeline(response.content, instance, username, limit=BACKFILL_PAGE_TWEETS)
+    return tweets, next_page_cursor(response.content)
+
+def container_strainer(name, attrs):
+    """
+    SoupStrainer per una strategia. Durante il parsing la classe arriva come stringa
+    grezza (es. "timeline-item "), quindi il confronto avviene sulle singole classi.
+    """
+    def class_matcher(expected):
+        def match(value):
+            if value is None:
+                return False
+            values = value.split() if isinstance(value, str) else value
+            return expected in values
+        return match
+    
+    strainer_attrs = {
+        key: class_matcher(value) if key == 'class' else value
+        for key, value in attrs.items()
+    }
+    return SoupStrainer(name, attrs=strainer_attrs)
+
+def find_tweet_containers(content, instance, limit):
+    """
+    Trova i contenitori dei tweet. Se per l'istanza è nota una strategia funzionante,
+    ritaglia la pagina dal primo al (limit+1)-esimo contenitore e costruisce solo quei
+    sottoalberi (SoupStrainer); altrimenti analizza tutta la pagina provando le strategie
+    in ordine e memorizza quella valida.
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    
+    cached = html_strategy_cache.get(instance)
+    if cached is not None:
+        name, attrs, pattern = HTML_CONTAINER_STRATEGIES[cached]
+        starts = [match.start() for match in islice(pattern.finditer(content), limit + 1)]
+        if starts:
+            end = starts[limit] if len(starts) > limit else len(content)
+            fragment = content[starts[0]:end]
+            soup = BeautifulSoup(fragment, HTML_PARSER, parse_only=container_strainer(name, attrs), from_encoding='utf-8')
+            containers = soup.find_all(name, attrs=attrs, limit=limit)
+            if containers:
+                return containers
+        html_strategy_cache.pop(instance, None)
+    
+    soup = BeautifulSoup(content, HTML_PARSER)
+    for index, (name, attrs, _) in enumerate(HTML_CONTAINER_STRATEGIES):
+        containers = soup.find_all(name, attrs=attrs, limit=limit)
+        if containers:
+            html_strategy_cache[instance] = index
+            return containers
+    return []
+
+def parse_html_timeline(content, instance, username, limit=MAX_TWEETS_PER_FETCH):
+    """
+    Estrae i tweet da una pagina HTML di Nitter. La Timeline ritornata riporta anche gli
+    status dei tweet scartati, per non scambiarli per tweet eliminati.
+    """
+    tweets = []
+    statuses = set()
+    tweet_containers = find_tweet_containers(content, instance, limit)
+    
+    if not tweet_containers:
+        logger.warning(f"Nessun contenuto tweet trovato su {instance}")
+        return []
+    
+    for container in tweet_containers:
+        tweet_link = container.find('a', class_='tweet-link')
+        status = status_from_link(tweet_link.get('href')) if tweet_link else None
+        if status is None:
+            statuses = None
+        elif statuses is not None:
+            statuses.add(status)
+        
+        try:
+            # Prova diversi selettori per il contenuto del tweet
+            tweet_content = (
+                container.find('div', class_='tweet-content') or
+                container.find('div', class_='tweet-text') or
+                container.find('p') or
+                container.find('div', class_='content')
+            )
+            
+            if tweet_content:
+                tweet_text = tweet_content.get_text().strip()
+                
+                if not tweet_text or len(tweet_text) < 10:
+                    continue
+                
+                # Prova diversi selettori per il timestamp
+                time_element = (
+                    container.find('span', class_='tweet-date') or
+                    container.find('time') or
+                    container.find('span', class_='date') or
+                    container.find('a', class_='tweet-link')
+                )
+                
+                if time_element:
+                    tweet_time = time_element.get_text().strip() or time_element.get('datetime', 'Data sconosciuta')
+                else:
+                    tweet_time = "Data sconosciuta"
+                
+                # Estrai eventuali link alle immagini (versione originale se disponibile)
+                images = []
+                for link in container.select('.attachments .still-image'):
+                    if link.get('href'):
+                        images.append(urljoin(instance, link['href']))
+                if not images:
+                    for img in container.find_all('img'):
+                        if img.get('src') and ('pic.twitter.com' in img.get('src', '') or 'attachment' in img.get('class', [])):
+                            images.append(urljoin(instance, img['src']))
+                
+                # Link al tweet originale
+                link = urljoin(instance, tweet_link.get('href', '')) if tweet_link else None
+                
+                tweet = {
+                    'account': username,
+                    'text': tweet_text,
+                    'time': tweet_time,
+                    'images': images,
+                    'link': canonical_tweet_link(link),
+                    'id': get_tweet_id(tweet_text, link),
+                    'legacy_id': legacy_tweet_id(tweet_text, tweet_time)
+                }
+                # Tweet fissato in cima (più vecchio degli altri) e retweet (status ID dell'originale)
+                if container.find(class_='pinned'):
+                    tweet['pinned'] = True
+                if container.find(class_='retweet-header'):
+                    tweet['retweet'] = True
+                tweets.append(tweet)
+        
+        except Exception as e:
+            logger.error(f"Errore nell'estrazione del tweet: {e}")
+            continue
+    
+    return Timeline(tweets, statuses)
+
+class InstanceHealth:
+    """
+    Statistiche di salute per ogni istanza Nitter (latenza, successi, tweet estratti,
+    ultimo errore) usate per ordinare le istanze e per escludere temporaneamente
+    quelle che falliscono ripetutamente.
+    """
+
+    SMOOTHING = 0.3  # Peso delle nuove osservazioni nelle medie mobili
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.file_mtime = None
+        self.reload()
+
+    def reload(self):
+        """
+        Ricarica le statistiche se il file è cambiato: il leader lo salva dopo ogni
+        gara, gli altri processi lo rileggono per servire /instances.
+        """
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self.file_mtime:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                stats = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Errore nel caricamento di {self.path}: {e}")
+            return
+        with self.lock:
+            self.stats = stats
+            self.file_mtime = mtime
+
+    def get(self, key):
+        """Restituisce (creandole se necessario) le statistiche di un'istanza"""
+        entry = self.stats.get(key)
+        if entry is None:
+            entry = self.stats[key] = {
+                'latency': 5.0,
+                'success_rate': 0.5,
+                'yield': 0.0,
+                'requests': 0,
+                'failures': 0,
+                'consecutive_failures': 0,
+                'last_failure': None,
+                'last_error': None,
+                'cooldown_until': 0
+            }
+        return entry
+
+    def record_success(self, key, latency, tweet_count):
+        """Registra una risposta valida"""
+        with self.lock:
+            entry = self.get(key)
+            entry['requests'] += 1
+            entry['latency'] += self.SMOOTHING * (latency - entry['latency'])
+            entry['success_rate'] += self.SMOOTHING * (1 - entry['success_rate'])
+            entry['yield'] += self.SMOOTHING * (tweet_count - entry['yield'])
+            entry['consecutive_failures'] = 0
+            entry['cooldown_until'] = 0
+
+    def record_failure(self, key, latency, error):
+        """Registra un fallimento e, oltre la soglia, apre il circuito"""
+        with self.lock:
+            entry = self.get(key)
+            entry['requests'] += 1
+            entry['failures'] += 1
+            entry['consecutive_failures'] += 1
+            entry['latency'] += self.SMOOTHING * (latency - entry['latency'])
+            entry['success_rate'] -= self.SMOOTHING * entry['success_rate']
+            entry['yield'] -= self.SMOOTHING * entry['yield']
+            entry['last_failure'] = datetime.now().isoformat()
+            entry['last_error'] = str(error)[:200]
+            
+            excess = entry['consecutive_failures'] - CIRCUIT_FAILURE_THRESHOLD
+            if excess >= 0:
+                cooldown = min(CIRCUIT_MAX_COOLDOWN, CIRCUIT_BASE_COOLDOWN * 2 ** excess)
+                entry['cooldown_until'] = time.time() + cooldown
+
+    def is_available(self, key):
+        """False se l'istanza è in cool-down (circuito aperto)"""
+        with self.lock:
+            return self.stats.get(key, {}).get('cooldown_until', 0) <= time.time()
+
+    def score(self, key):
+        """Punteggio più alto = istanza da provare prima"""
+        with self.lock:
+            entry = self.get(key)
+            return entry['success_rate'] * min(1.0, 0.5 + entry['yield'] / 10) / (1 + entry['latency'])
+
+    def is_healthy(self, key):
+        """True se l'istanza risponde in modo affidabile"""
+        with self.lock:
+            entry = self.stats.get(key)
+            return entry is not None and entry['success_rate'] >= 0.9 and entry['consecutive_failures'] == 0
+
+    def order(self, candidates):
+        """
+        Ordina i candidati per punteggio. Le istanze in cool-down finiscono in coda,
+        così vengono provate solo se tutte le altre falliscono.
+        """
+        available = [c for c in candidates if self.is_available(c[0])]
+        cooling = [c for c in candidates if not self.is_available(c[0])]
+        available.sort(key=lambda c: self.score(c[0]), reverse=True)
+        cooling.sort(key=lambda c: self.stats[c[0]]['cooldown_until'])
+        return available + cooling
+
+    def snapshot(self):
+        """Copia delle statistiche (per l'endpoint /instances)"""
+        with self.lock:
+            return {key: dict(entry) for key, entry in self.stats.items()}
+
+    def save(self):
+        """Salva le statistiche su file in modo atomico"""
+        snapshot = self.snapshot()
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Errore nel salvataggio di {self.path}: {e}")
+
+instance_health = None  # Caricato da open_stores()
+
+race_executor = ThreadPoolExecutor(max_workers=RACE_WORKERS, thread_name_prefix='race')
+
+def run_candidate(key, instance, fetch, deadline, race):
+    """Esegue il fetch di un'istanza registrandone latenza ed esito"""
+    kind = 'rss' if key.endswith('/rss') else 'html'
+    current_race.set(race)
+    started = time.monotonic()
+    try:
+        tweets = fetch(instance, deadline=deadline)
+    except Exception as e:
+        if race.cancelled:
+            # Richiesta abbandonata perché un'altra istanza ha vinto: non conta per la salute
+            return []
+        elapsed = time.monotonic() - started
+        instance_health.record_failure(key, elapsed, e)
+        metrics.observe('nitter_fetch_seconds', elapsed, instance=instance, kind=kind, outcome='error')
+        raise
+    elapsed = time.monotonic() - started
+    if tweets:
+        instance_health.record_success(key, elapsed, len(tweets))
+    else:
+        instance_health.record_failure(key, elapsed, "Nessun tweet estratto")
+    metrics.observe('nitter_fetch_seconds', elapsed, instance=instance, kind=kind, outcome='success' if tweets else 'empty')
+    return tweets
+
+def race_instances(candidates, deadline):
+    """
+    Interroga le istanze in parallelo con richieste "hedged", in ordine di salute.
+    Se la prima istanza è affidabile parte da sola, altrimenti con HEDGE_WIDTH istanze;
+    un'altra viene aggiunta ogni HEDGE_DELAY secondi o a ogni fallimento.
+    Ritorna la prima timeline valida; le richieste più lente vengono interrotte
+    (quelle non ancora partite annullate, quelle in corso chiuse).
+    candidates: lista di (chiave, istanza, funzione(istanza, deadline) -> tweets)
+    """
+    if not candidates:
+        return []
+    
+    pending = instance_health.order(candidates)
+    width = 1 if instance_health.is_healthy(pending[0][0]) else HEDGE_WIDTH
+    running = {}
+    race = InstanceRace()
+    
+    def launch():
+        key, instance, fetch = pending.pop(0)
+        # Il contesto (cycle_id, span) segue la richiesta nel thread del pool
+        future = race_executor.submit(contextvars.copy_context().run, run_candidate, key, instance, fetch, deadline, race)
+        running[future] = instance
+    
+    try:
+        while pending and len(running) < width:
+            launch()
+        
+        while running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning("⏱️ Deadline di scraping superata")
+                break
+            
+            done, _ = wait(running, timeout=min(HEDGE_DELAY, remaining), return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                instance = running.pop(future)
+                try:
+                    tweets = future.result()
+                except Exception as e:
+                    logger.error(f"Errore con {instance}: {e}")
+                    tweets = []
+                if tweets:
+                    return tweets
+            
+            # Rimpiazza le istanze fallite e, se nessuna ha risposto in tempo, aggiungine un'altra
+            while pending and len(running) < width:
+                launch()
+            if not done and pending:
+                launch()
+        
+        return []
+    finally:
+        race.cancel()
+        for future in running:
+            future.cancel()
+        instance_health.save()
+
+def rss_candidates(username):
+    """Candidati RSS per race_instances"""
+    fetch = partial(fetch_rss_timeline, username=username)
+    return [(f"{instance}/rss", instance, fetch) for instance in RSS_INSTANCES]
+
+def html_candidates(username):
+    """Candidati HTML per race_instances"""
+    fetch = partial(fetch_html_timeline, username=username)
+    return [(instance, instance, fetch) for instance in NITTER_INSTANCES]
+
+def scrape_twitter_rss(username, deadline=None):
+    """
+    Metodo alternativo: usa RSS feed di Nitter
+    """
+    if deadline is None:
+        deadline = time.monotonic() + SCRAPE_DEADLINE
+    return race_instances(rss_candidates(username), deadline)
+
+def scrape_twitter_nitter(username):
+    """
+    Scraping dei tweet usando Nitter (frontend alternativo a Twitter).
+    RSS e HTML vengono interrogati in un'unica gara, con l'RSS (più affidabile) in testa.
+    """
+    deadline = time.monotonic() + SCRAPE_DEADLINE
+    candidates = rss_candidates(username) + html_candidates(username)
+    
+    tweets = race_instances(candidates, deadline)
+    if tweets:
+        return tweets
+    
+    # Se nessuna istanza Nitter funziona, crea un tweet di test per verificare che il sistema funzioni
+    logger.warning("⚠️ Nessuna istanza Nitter disponibile - creazione tweet di test")
+    test_tweet = {
+        'account': username,
+        'is_test': True,
+        'text': f"🔧 Test del bot - Monitoraggio di @{username} attivo ma istanze Nitter temporaneamente non disponibili. Il servizio riprenderà automaticamente quando le istanze torneranno online.",
+        'time': datetime.now().strftime("%Y-%m-%d %H:%M"),
+        'images': [],
+        'id': legacy_tweet_id("test_tweet", str(datetime.now()))
+    }
+    return [test_tweet]
+
+# Limiti di lunghezza di Telegram (testo visibile, in unità UTF-16)
+TELEGRAM_TEXT_LIMIT = 4096
+TELEGRAM_CAPTION_LIMIT = 1024
+RENDERED_PAYLOADS_MAX = 1000  # Messaggi già formattati tenuti in memoria
+
+# URL e menzioni da rendere cliccabili nel testo del tweet
+TWEET_LINK_PATTERN = re.compile(r'https?://[^\s<>"]*[^\s<>".,;:!?)\]]|(?<![\w@])@\w{1,15}')
+
+rendered_payloads = OrderedDict()
+rendered_payloads_lock = threading.Lock()
+
+def telegram_length(text):
+    """Lunghezza del testo come la conta Telegram (unità UTF-16)"""
+    return len(text.encode('utf-16-le')) // 2
+
+def linkify(text):
+    """Escape HTML del testo del tweet, con link cliccabili per URL e menzioni"""
+    parts = []
+    last = 0
+    for match in TWEET_LINK_PATTERN.finditer(text):
+        token = match.group(0)
+        href = f"https://x.com/{token[1:]}" if token.startswith('@') else token
+        parts.append(html.escape(text[last:match.start()], quote=False))
+        parts.append(f'<a href="{html.escape(href)}">{html.escape(token, quote=False)}</a>')
+        last = match.end()
+    parts.append(html.escape(text[last:], quote=False))
+    return ''.join(parts)
+
+def split_text(text, first_limit, limit):
+    """Divide il testo in parti, ai confini delle parole, entro i limiti di lunghezza"""
+    chunks = []
+    current_limit = first_limit
+    while telegram_length(text) > current_limit:
+        cut = len(text)
+        while telegram_length(text[:cut]) > current_limit:
+            cut = cut * current_limit // telegram_length(text[:cut]) or cut - 1
+        space = text.rfind(' ', 0, cut)
+        if space > cut // 2:
+            cut = space
+        chunks.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+        current_limit = limit
+    chunks.append(text)
+    return chunks
+
+def render_tweet(tweet, first_limit, limit=TELEGRAM_TEXT_LIMIT):
+    """Costruisce i messaggi HTML di un tweet: il primo entro first_limit, gli altri entro limit"""
+    header_text = f"🐦 Nuovo Tweet di @{tweet['account']}\n\n"
+    header = f"🐦 <b>Nuovo Tweet di @{html.escape(tweet['account'])}</b>\n\n"
+    footer_text = f"\n\n📅 {tweet['time']}"
+    footer = f"\n\n📅 {html.escape(tweet['time'], quote=False)}"
+    if tweet.get('link'):
+        footer_text += "\n🔗 Apri il tweet"
+        footer += f'\n🔗 <a href="{html.escape(tweet["link"])}">Apri il tweet</a>'
+    
+    reserved = telegram_length(footer_text)
+    chunks = split_text(
+        tweet['text'],
+        first_limit - telegram_length(header_text) - reserved,
+        limit - reserved
+    )
+    messages = [linkify(chunk) for chunk in chunks]
+    messages[0] = header + messages[0]
+    messages[-1] += footer
+    return messages
+
+def format_tweet_for_telegram(tweet, with_photo=False):
+    """
+    Formatta il tweet per Telegram (HTML), una sola volta per tweet e formato.
+    Con foto il primo messaggio è la didascalia (max 1024 caratteri), gli eventuali
+    seguiti sono messaggi di testo; senza foto i messaggi arrivano a 4096 caratteri.
+    """
+    key = (tweet_key(tweet), with_photo)
+    with rendered_payloads_lock:
+        messages = rendered_payloads.get(key)
+        if messages is not None:
+            rendered_payloads.move_to_end(key)
+            return messages
+    
+    first_limit = TELEGRAM_CAPTION_LIMIT if with_photo else TELEGRAM_TEXT_LIMIT
+    with span('render', tweet_id=tweet['id'], with_photo=with_photo):
+        messages = render_tweet(tweet, first_limit)
+    
+    with rendered_payloads_lock:
+        rendered_payloads[key] = messages
+        while len(rendered_payloads) > RENDERED_PAYLOADS_MAX:
+            rendered_payloads.popitem(last=False)
+    return messages
+
+DIGEST_SEPARATOR = "\n\n➖➖➖\n\n"
+HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+
+def visible_length(message):
+    """Lunghezza di un messaggio HTML come la conta Telegram (senza tag ed entità)"""
+    return telegram_length(html.unescape(HTML_TAG_PATTERN.sub('', message)))
+
+def pack_digest(entries, limit=TELEGRAM_TEXT_LIMIT):
+    """
+    Raggruppa i messaggi di più tweet (lista di (chiave del tweet, messaggio)) nel minor
+    numero di messaggi entro limit (lista di gruppi)
+    """
+    separator = visible_length(DIGEST_SEPARATOR)
+    groups = []
+    length = 0
+    for entry in entries:
+        part_length = visible_length(entry[1])
+        if groups and length + separator + part_length <= limit:
+            groups[-1].append(entry)
+            length += separator + part_length
+        else:
+            groups.append([entry])
+            length = part_length
+    return groups
+
+def digest_text(entries):
+    """Testo di un messaggio di riepilogo"""
+    return DIGEST_SEPARATOR.join(part for _, part in entries)
+
+def digest_entries(tweet, key=None):
+    """
+    Messaggi del tweet in un riepilogo (solo testo): le immagini diventano link in fondo
+    all'ultimo messaggio. Ritorna una lista di (chiave del tweet, messaggio).
+    """
+    parts = list(format_tweet_for_telegram(tweet))
+    images = tweet['images'][:MEDIA_MAX_GROUP]
+    if images:
+        links = "🖼 " + " · ".join(
+            f'<a href="{html.escape(url)}">Foto {index}</a>' for index, url in enumerate(images, 1)
+        )
+        if visible_length(f"{parts[-1]}\n{links}") <= TELEGRAM_TEXT_LIMIT:
+            parts[-1] = f"{parts[-1]}\n{links}"
+        else:
+            parts.append(links)
+    key = key or tweet_key(tweet)
+    return [(key, part) for part in parts]
+
+class TokenBucket:
+    """Token bucket thread-safe per limitare la frequenza degli invii"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self, count=1):
+        """
+        Attende finché non è disponibile un token e ne consuma count: oltre i token disponibili
+        il saldo va in negativo e ritarda le richieste successive
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.blocked_until:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= count
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = self.blocked_until - now
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Sospende l'emissione di token (es. dopo un 429 con retry_after)"""
+        with self.lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0
+            self.updated = self.blocked_until
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket con lo stato in memoria condivisa: un unico limite globale per
+    tutti i processi di consegna (time.monotonic è lo stesso orologio per tutti).
+    """
+
+    def __init__(self, rate, context, capacity=None):
+        self.state = context.Array('d', 3)  # token, ultimo aggiornamento, blocco fino a
+        super().__init__(rate, capacity)
+        self.lock = self.state.get_lock()
+
+    tokens = property(lambda self: self.state[0], lambda self, value: self.state.__setitem__(0, value))
+    updated = property(lambda self: self.state[1], lambda self, value: self.state.__setitem__(1, value))
+    blocked_until = property(lambda self: self.state[2], lambda self, value: self.state.__setitem__(2, value))
+
+global_send_bucket = TokenBucket(GLOBAL_SEND_RATE)
+chat_send_buckets = {}
+chat_send_buckets_lock = threading.Lock()
+
+def get_chat_bucket(chat_id):
+    """Restituisce il token bucket dedicato a una chat"""
+    with chat_send_buckets_lock:
+        bucket = chat_send_buckets.get(chat_id)
+        if bucket is None:
+            bucket = chat_send_buckets[chat_id] = TokenBucket(PER_CHAT_SEND_RATE, capacity=1)
+        return bucket
+
+def throttle(chat_id, messages=1):
+    """
+    Attende i token per una chiamata alla Bot API verso la chat: uno per chiamata dal limite
+    della chat, uno per messaggio dal limite globale (un media group conta quanto le foto)
+    """
+    get_chat_bucket(chat_id).acquire()
+    global_send_bucket.acquire(messages)
+
+class FloodDetector:
+    """
+    Chat che hanno ricevuto un 429 di recente. Un flood-wait su una sola chat (o gruppo)
+    rallenta solo quella chat; 429 da più chat nella stessa finestra indicano il
+    limite globale del bot.
+    """
+
+    def __init__(self, window=FLOOD_WINDOW, threshold=FLOOD_CHATS):
+        self.window = window
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.rate_limited = {}  # chat_id -> istante dell'ultimo 429
+
+    def record(self, chat_id):
+        """Registra un 429 della chat, ritorna True se va rallentato l'intero bot"""
+        now = time.monotonic()
+        with self.lock:
+            self.rate_limited[chat_id] = now
+            self.rate_limited = {
+                chat: limited_at for chat, limited_at in self.rate_limited.items()
+                if now - limited_at <= self.window
+            }
+            return len(self.rate_limited) >= self.threshold
+
+flood_detector = FloodDetector()
+
+def get_retry_after(error):
+    """Estrae retry_after da un errore 429 di Telegram (None se non è un 429)"""
+    if isinstance(error, telebot.apihelper.ApiTelegramException) and error.error_code == 429:
+        parameters = error.result_json.get('parameters') or {}
+        return parameters.get('retry_after', 1)
+    return None
+
+# Esiti di un invio
+SEND_OK = 'ok'  # Messaggio consegnato
+SEND_RETRY = 'retry'  # Errore temporaneo (429, rete, 5xx): riprovare più tardi
+SEND_DROP = 'drop'  # Messaggio rifiutato (es. formattazione): scartare il job
+SEND_REMOVE_CHANNEL = 'remove'  # Bot rimosso o chat inesistente: eliminare il canale
+
+# Errori 400 che indicano che la chat non è più raggiungibile
+PERMANENT_CHAT_ERRORS = (
+    'chat not found',
+    'bot was kicked',
+    'bot is not a member',
+    'have no rights to send',
+    'not enough rights',
+    'need administrator rights',
+    'chat_write_forbidden',
+    'group chat was deactivated',
+)
+
+def classify_send_error(error):
+    """Classifica un errore di invio, ritorna (esito, secondi prima di riprovare)"""
+    retry_after = get_retry_after(error)
+    if retry_after is not None:
+        return SEND_RETRY, retry_after
+    
+    if isinstance(error, telebot.apihelper.ApiTelegramException):
+        description = (error.description or '').lower()
+        if error.error_code == 403:
+            return SEND_REMOVE_CHANNEL, None
+        if error.error_code == 400:
+            if any(reason in description for reason in PERMANENT_CHAT_ERRORS):
+                return SEND_REMOVE_CHANNEL, None
+            return SEND_DROP, None
+    
+    # Timeout, errori di rete, 5xx ed errori imprevisti: riprova con backoff
+    return SEND_RETRY, None
+
+class MediaCache:
+    """
+    Cache su disco delle immagini dei tweet, con dimensione massima (LRU sulla data di
+    ultimo accesso), e file_id restituiti da Telegram dopo il primo caricamento.
+    """
+
+    def __init__(self, directory, max_bytes=MEDIA_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.file_ids = OrderedDict()  # url -> file_id
+        self.failed = OrderedDict()  # url non scaricabili, per non riprovarli a ogni canale
+        self.upload_locks = [threading.Lock() for _ in range(64)]
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, url):
+        """Percorso locale di un'immagine"""
+        extension = os.path.splitext(urlsplit(url).path)[1][:5] or '.jpg'
+        return os.path.join(self.directory, hashlib.sha1(url.encode()).hexdigest() + extension)
+
+    def fetch(self, url):
+        """Scarica l'immagine (se non già in cache), ritorna il percorso locale o None"""
+        path = self.path_for(url)
+        if os.path.exists(path):
+            os.utime(path)
+            return path
+        
+        parts = urlsplit(url)
+        try:
+            response = get_session(f"{parts.scheme}://{parts.netloc}").get(url, timeout=20, verify=False, stream=True)
+            with response:
+                if response.status_code != 200:
+                    logger.warning(f"Immagine non disponibile ({response.status_code}): {url}")
+                    return None
+                chunks = []
+                size = 0
+                for chunk in response.iter_content(64 * 1024):
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size > MEDIA_MAX_IMAGE_BYTES:
+                        logger.warning(f"Immagine troppo grande, ignorata: {url}")
+                        return None
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Errore nel download dell'immagine {url}: {e}")
+            return None
+        
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(chunks))
+        os.replace(tmp_path, path)
+        self.evict()
+        return path
+
+    def evict(self):
+        """Elimina le immagini usate meno di recente oltre la dimensione massima"""
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    continue
+
+    def get_file_id(self, url):
+        """file_id di Telegram per un'immagine già caricata (None se non ancora caricata)"""
+        with self.lock:
+            file_id = self.file_ids.get(url)
+            if file_id is not None:
+                self.file_ids.move_to_end(url)
+            return file_id
+
+    def set_file_id(self, url, file_id):
+        """Memorizza il file_id restituito da Telegram dopo il caricamento"""
+        with self.lock:
+            self.file_ids[url] = file_id
+            self.file_ids.move_to_end(url)
+            while len(self.file_ids) > MEDIA_FILE_IDS_MAX:
+                self.file_ids.popitem(last=False)
+
+    def mark_failed(self, url):
+        """Ricorda che un'immagine non è scaricabile"""
+        with self.lock:
+            self.failed[url] = True
+            while len(self.failed) > MEDIA_FILE_IDS_MAX:
+                self.failed.popitem(last=False)
+
+    def available(self, urls):
+        """Immagini non segnate come non scaricabili"""
+        with self.lock:
+            return [url for url in urls if url not in self.failed]
+
+    def upload_lock(self, url):
+        """Lock che garantisce un solo caricamento per immagine"""
+        return self.upload_locks[hash(url) % len(self.upload_locks)]
+
+media_cache = None  # Aperta da open_stores()
+
+def send_photos(chat_id, images, caption):
+    """
+    Invia una o più immagini con didascalia. Al primo invio le immagini vengono scaricate
+    e caricate su Telegram; gli invii successivi (altri canali) riusano i file_id.
+    Ritorna i messaggi inviati (lista vuota se nessuna immagine è disponibile).
+    """
+    def cached_media():
+        available = media_cache.available(images)[:MEDIA_MAX_GROUP]
+        return available, [media_cache.get_file_id(url) for url in available]
+    
+    available, file_ids = cached_media()
+    if available and not all(file_ids):
+        # Caricamento: un solo thread per tweet, gli altri attendono e riusano i file_id
+        with media_cache.upload_lock(images[0]):
+            available, file_ids = cached_media()
+            if available and not all(file_ids):
+                return upload_photos(chat_id, available, caption)
+    
+    if not available:
+        return []
+    return send_photo_media(chat_id, file_ids, caption)
+
+def upload_photos(chat_id, images, caption):
+    """Scarica e carica le immagini, memorizzando i file_id restituiti"""
+    uploads = []
+    for url in images:
+        file_id = media_cache.get_file_id(url)
+        path = None if file_id else media_cache.fetch(url)
+        if file_id or path:
+            uploads.append((url, file_id, path))
+        else:
+            media_cache.mark_failed(url)
+    
+    if not uploads:
+        return []
+    
+    files = [open(path, 'rb') if path else None for _, _, path in uploads]
+    try:
+        media = [file_id or f for (_, file_id, _), f in zip(uploads, files)]
+        messages = send_photo_media(chat_id, media, caption)
+    finally:
+        for f in files:
+            if f:
+                f.close()
+    
+    for (url, _, _), message in zip(uploads, messages):
+        if message.photo:
+            media_cache.set_file_id(url, message.photo[-1].file_id)
+    return messages
+
+def send_photo_media(chat_id, media, caption):
+    """Invia una foto singola o un media group, ritorna i messaggi inviati"""
+    throttle(chat_id, len(media))
+    if len(media) == 1:
+        return [bot.send_photo(chat_id=chat_id, photo=media[0], caption=caption, parse_mode='HTML')]
+    
+    group = [
+        telebot.types.InputMediaPhoto(
+            item,
+            caption=caption if index == 0 else None,
+            parse_mode='HTML' if index == 0 else None
+        )
+        for index, item in enumerate(media)
+    ]
+    return bot.send_media_group(chat_id=chat_id, media=group)
+
+def send_texts(chat_id, messages, sent):
+    """Invia uno o più messaggi di testo HTML, aggiungendo ognuno a sent appena inviato"""
+    for text in messages:
+        throttle(chat_id)
+        message = bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            parse_mode='HTML',
+            disable_web_page_preview=True
+        )
+        sent.append((message.message_id, 'text'))
+
+def send_tweet(chat_id, tweet, sent=None):
+    """
+    Invia il tweet; se ci sono immagini le invia con il testo come didascalia (solo testo se
+    non disponibili). I messaggi inviati vengono aggiunti a sent come (message_id, tipo):
+    se l'invio si interrompe, il tentativo successivo riparte dalla prima parte non inviata.
+    Ritorna sent.
+    """
+    sent = [] if sent is None else sent
+    if tweet['images'] and (not sent or sent[0][1] == 'caption'):
+        caption, *followups = format_tweet_for_telegram(tweet, with_photo=True)
+        if not sent:
+            photos = send_photos(chat_id, tweet['images'], caption)
+            sent.extend(
+                (message.message_id, 'caption' if index == 0 else 'media')
+                for index, message in enumerate(photos)
+            )
+        if sent:
+            texts = sum(1 for _, kind in sent if kind == 'text')
+            send_texts(chat_id, followups[texts:], sent)
+            return sent
+    
+    send_texts(chat_id, format_tweet_for_telegram(tweet)[len(sent):], sent)
+    return sent
+
+def send_indexed_tweet(chat_id, tweet, sent=None):
+    """
+    Invia il tweet e registra i messaggi nell'indice, per modifiche ed eliminazioni successive
+    (anche le parti già inviate se l'invio si interrompe)
+    """
+    sent = [] if sent is None else sent
+    try:
+        send_tweet(chat_id, tweet, sent)
+    finally:
+        if sent and not tweet.get('is_test'):
+            try:
+                message_index.record(tweet, chat_id, sent)
+            except sqlite3.Error as e:
+                # I messaggi sono stati consegnati: senza indice non verranno aggiornati, ma non vanno ritentati
+                logger.error(f"❌ Errore nell'indice dei messaggi: {e}")
+
+def apply_tweet_update(chat_id, update, sent=None):
+    """
+    Applica a una chat la modifica (edit) o l'eliminazione (delete) di un tweet già inviato.
+    I messaggi già aggiornati vengono aggiunti a sent e saltati ai tentativi successivi.
+    """
+    sent = [] if sent is None else sent
+    done = {message_id for message_id, _ in sent}
+    messages = message_index.messages(update['target'], chat_id)
+    digests = [message_id for message_id, kind in messages if kind == 'digest']
+    if digests:
+        if update['action'] == 'edit' and len(digests) > 1:
+            log_sampled(logging.WARNING, f"✏️ Modifica non applicabile alla chat {chat_id}: tweet diviso su {len(digests)} riepiloghi")
+            return
+        for message_id in digests:
+            if message_id not in done:
+                rewrite_digest(chat_id, message_id, update)
+                sent.append((message_id, 'digest'))
+        if update['action'] == 'delete':
+            message_index.forget(update['target'], chat_id)
+        return
+    
+    if update['action'] == 'delete':
+        for message_id, kind in messages:
+            if message_id in done:
+                continue
+            throttle(chat_id)
+            try:
+                bot.delete_message(chat_id, message_id)
+            except telebot.apihelper.ApiTelegramException as e:
+                # Messaggio già eliminato o non più eliminabile
+                if e.error_code != 400:
+                    raise
+            sent.append((message_id, kind))
+        message_index.forget(update['target'], chat_id)
+        return
+    
+    editable = [(message_id, kind) for message_id, kind in messages if kind != 'media']
+    parts = format_tweet_for_telegram(update, with_photo=bool(editable) and editable[0][1] == 'caption')
+    if len(parts) != len(editable):
+        # Il nuovo testo richiede un numero diverso di messaggi: la copia resta invariata
+        log_sampled(logging.WARNING, f"✏️ Modifica non applicabile alla chat {chat_id}: {len(parts)} parti invece di {len(editable)}")
+        return
+    for (message_id, kind), text in zip(editable, parts):
+        if message_id in done:
+            continue
+        throttle(chat_id)
+        try:
+            if kind == 'caption':
+                bot.edit_message_caption(text, chat_id=chat_id, message_id=message_id, parse_mode='HTML')
+            else:
+                bot.edit_message_text(
+                    text,
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    parse_mode='HTML',
+                    disable_web_page_preview=True
+                )
+        except telebot.apihelper.ApiTelegramException as e:
+            # Messaggio eliminato o testo invariato: nulla da modificare
+            if e.error_code != 400:
+                raise
+        sent.append((message_id, kind))
+
+class DigestMessages:
+    """
+    Ultimo riepilogo inviato a ogni chat in modalità edit: finché la finestra è aperta
+    i nuovi tweet vengono aggiunti modificando quel messaggio invece di inviarne altri.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = {}  # chat_id -> {'message_id', 'entries', 'tweets', 'sent_at'}
+
+    def open_digest(self, chat_id, window):
+        """Riepilogo ancora modificabile della chat (None se la finestra è chiusa)"""
+        with self.lock:
+            current = self.messages.get(chat_id)
+            if current is None or time.time() - current['sent_at'] > window:
+                self.messages.pop(chat_id, None)
+                return None
+            return dict(current)
+
+    def remember(self, chat_id, message_id, entries, tweets, sent_at=None):
+        """Registra il riepilogo modificabile della chat"""
+        with self.lock:
+            self.messages[chat_id] = {
+                'message_id': message_id, 'entries': entries, 'tweets': tweets, 'sent_at': sent_at or time.time()
+            }
+
+    def rewritten(self, chat_id, message_id, entries):
+        """Aggiorna il riepilogo aperto dopo la modifica o l'eliminazione di un suo tweet"""
+        with self.lock:
+            current = self.messages.get(chat_id)
+            if current is not None and current['message_id'] == message_id:
+                if entries:
+                    current['entries'] = entries
+                else:
+                    del self.messages[chat_id]
+
+    def forget(self, chat_id):
+        with self.lock:
+            self.messages.pop(chat_id, None)
+
+digest_messages = DigestMessages()
+
+def record_digest(chat_id, message_id, entries):
+    """Registra un messaggio di riepilogo nell'indice (un errore non fa ritentare l'invio)"""
+    try:
+        message_index.record_digest(chat_id, message_id, entries)
+    except sqlite3.Error as e:
+        logger.error(f"❌ Errore nell'indice dei messaggi: {e}")
+
+def rewrite_digest(chat_id, message_id, update):
+    """
+    Riscrive un messaggio di riepilogo senza il tweet eliminato o con il suo nuovo testo
+    (il messaggio viene eliminato se non contiene altri tweet)
+    """
+    entries = message_index.digest_entries(chat_id, message_id)
+    target = update['target']
+    keys = [key for key, _ in entries or []]
+    if target not in keys:
+        return
+    
+    others = [entry for entry in entries if entry[0] != target]
+    if update['action'] == 'delete':
+        rewritten = others
+    else:
+        position = keys.index(target)
+        rewritten = others[:position] + digest_entries(update, target) + others[position:]
+        if visible_length(digest_text(rewritten)) > TELEGRAM_TEXT_LIMIT:
+            log_sampled(logging.WARNING, f"✏️ Modifica non applicabile alla chat {chat_id}: il riepilogo supera il limite")
+            return
+    
+    throttle(chat_id)
+    try:
+        if rewritten:
+            bot.edit_message_text(
+                digest_text(rewritten),
+                chat_id=chat_id,
+                message_id=message_id,
+                parse_mode='HTML',
+                disable_web_page_preview=True
+            )
+        else:
+            bot.delete_message(chat_id, message_id)
+    except telebot.apihelper.ApiTelegramException as e:
+        # Messaggio eliminato o testo invariato: nulla da aggiornare
+        if e.error_code != 400:
+            raise
+    record_digest(chat_id, message_id, rewritten)
+    digest_messages.rewritten(chat_id, message_id, rewritten)
+
+def send_digest(chat_id, tweets, digest, sent=None):
+    """
+    Invia più tweet come riepilogo (solo testo, con il link a ogni tweet e alle sue immagini).
+    In modalità edit li aggiunge al riepilogo ancora aperto, se c'è spazio, modificandolo.
+    I messaggi vengono indicizzati per ogni tweet, per modifiche ed eliminazioni successive.
+    I riepiloghi inviati vengono aggiunti a sent come (message_id, 'digest', voci contenute):
+    un nuovo tentativo riparte dalla prima voce non ancora inviata.
+    """
+    sent = [] if sent is None else sent
+    entries = [entry for tweet in tweets for entry in digest_entries(tweet)]
+    
+    if digest['mode'] == 'edit' and not sent:
+        current = digest_messages.open_digest(chat_id, digest['window'])
+        if current is not None and current['tweets'] + len(tweets) <= DIGEST_MAX_TWEETS:
+            groups = pack_digest(current['entries'] + entries)
+            if len(groups) == 1:
+                throttle(chat_id)
+                try:
+                    bot.edit_message_text(
+                        digest_text(groups[0]),
+                        chat_id=chat_id,
+                        message_id=current['message_id'],
+                        parse_mode='HTML',
+                        disable_web_page_preview=True
+                    )
+                    digest_messages.remember(chat_id, current['message_id'], groups[0], current['tweets'] + len(tweets), current['sent_at'])
+                    record_digest(chat_id, current['message_id'], groups[0])
+                    return
+                except telebot.apihelper.ApiTelegramException as e:
+                    if e.error_code != 400:
+                        raise
+                    # Messaggio eliminato o non più modificabile: ne viene inviato uno nuovo
+                    digest_messages.forget(chat_id)
+    
+    resumed = bool(sent)
+    groups = pack_digest(entries[sum(message[2] for message in sent if message[1] == 'digest'):])
+    for group in groups:
+        throttle(chat_id)
+        message = bot.send_message(
+            chat_id=chat_id,
+            text=digest_text(group),
+            parse_mode='HTML',
+            disable_web_page_preview=True
+        )
+        sent.append((message.message_id, 'digest', len(group)))
+        record_digest(chat_id, message.message_id, group)
+    if digest['mode'] == 'edit' and groups:
+        # Solo l'ultimo messaggio resta modificabile
+        tweet_count = len(tweets) if len(groups) == 1 and not resumed else DIGEST_MAX_TWEETS
+        digest_messages.remember(chat_id, sent[-1][0], groups[-1], tweet_count)
+
+def send_to_channel(chat_id, send):
+    """
+    Esegue send() verso un singolo canale: send() chiama throttle() prima di ogni chiamata
+    alla Bot API, per rispettare i limiti di Telegram. Ritorna (esito, secondi prima di
+    riprovare, errore).
+    """
+    started = time.monotonic()
+    try:
+        send()
+        return SEND_OK, None, None
+    
+    except Exception as e:
+        outcome, retry_after = classify_send_error(e)
+        if retry_after is not None:
+            # 429: rallenta la chat, e l'intero bot solo se il limite colpisce più chat
+            log_sampled(logging.WARNING, f"⏳ Rate limit sulla chat {chat_id}, attendo {retry_after}s", retry_after=retry_after)
+            metrics.inc('telegram_rate_limited_total')
+            get_chat_bucket(chat_id).pause(retry_after)
+            if flood_detector.record(chat_id):
+                global_send_bucket.pause(retry_after)
+        return outcome, retry_after, e
+    
+    finally:
+        metrics.observe('telegram_send_seconds', time.monotonic() - started)
+
+def send_tweet_to_channel(chat_id, tweet, sent=None):
+    """
+    Invia il tweet a un singolo canale (sent: messaggi già inviati da un tentativo precedente),
+    ritorna (esito, secondi prima di riprovare, errore)
+    """
+    return send_to_channel(chat_id, partial(send_indexed_tweet, chat_id, tweet, sent))
+
+class DeliveryQueue:
+    """
+    Coda persistente (SQLite in modalità WAL) dei messaggi da consegnare, un job per
+    coppia (tweet, chat). I job sopravvivono ai riavvii e vengono ritentati con
+    backoff esponenziale; per i tweet in più parti il job ricorda i messaggi già inviati
+    (sent), così un nuovo tentativo riparte dalla prima parte non inviata. Per ogni chat
+    viene consegnato solo il job più vecchio,
+    così i tweet arrivano nell'ordine in cui sono stati pubblicati (i canali in
+    modalità riepilogo ricevono insieme tutti i job in coda, vedi chat_jobs).
+    
+    Il monitor pubblica ogni tweet una sola volta (publish); ogni shard di consegna
+    lo espande nei job delle proprie chat (abs(chat_id) % shard totali) e consegna
+    solo quelli, così più processi possono condividere la stessa coda.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.shard_wakeups = []  # Eventi dei processi di consegna (nel processo leader)
+        self.shard = 0
+        self.shards = 1
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS delivery_tweets ("
+            "  tweet_id TEXT PRIMARY KEY, tweet TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS delivery_jobs ("
+            "  seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            "  tweet_id TEXT NOT NULL,"
+            "  chat_id INTEGER NOT NULL,"
+            "  attempts INTEGER NOT NULL DEFAULT 0,"
+            "  next_attempt_at REAL NOT NULL,"
+            "  last_error TEXT,"
+            "  sent TEXT,"
+            "  UNIQUE (tweet_id, chat_id));"
+            "CREATE INDEX IF NOT EXISTS idx_jobs_chat ON delivery_jobs(chat_id, seq);"
+            "CREATE TABLE IF NOT EXISTS delivery_fanout ("
+            "  tweet_id TEXT NOT NULL, shard INTEGER NOT NULL, PRIMARY KEY (tweet_id, shard));"
+            "CREATE TABLE IF NOT EXISTS delivery_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(delivery_jobs)")]
+        if 'sent' not in columns:
+            # Code create da versioni precedenti
+            self.conn.execute("ALTER TABLE delivery_jobs ADD COLUMN sent TEXT")
+        self.conn.commit()
+
+    def configure_shard(self, shard, shards, wakeup):
+        """Limita questo processo alle chat di uno shard"""
+        self.shard = shard
+        self.shards = shards
+        self.wakeup = wakeup
+
+    def owns(self, chat_id):
+        """True se la chat appartiene allo shard di questo processo"""
+        return abs(chat_id) % self.shards == self.shard
+
+    def notify(self):
+        """Sveglia i worker di consegna (thread locale o processi degli shard)"""
+        for wakeup in self.shard_wakeups or [self.wakeup]:
+            wakeup.set()
+
+    def publish(self, tweet, shards):
+        """Pubblica un nuovo tweet: ognuno degli shard lo espanderà per le proprie chat"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO delivery_tweets (tweet_id, tweet) VALUES (?, ?)",
+                (tweet_key(tweet), json.dumps(tweet))
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO delivery_fanout (tweet_id, shard) VALUES (?, ?)",
+                [(tweet_key(tweet), shard) for shard in range(shards)]
+            )
+            self.conn.commit()
+        self.notify()
+
+    def reshard(self, shards):
+        """
+        Da chiamare all'avvio, prima dei worker: se il numero di shard è cambiato le chat
+        passano ad altri shard, quindi i tweet non ancora espansi da tutti vengono affidati
+        di nuovo a ogni shard attuale (le chat che li hanno già ricevuti vengono saltate,
+        vedi fan_out_pending). Ritorna il numero di tweet ridistribuiti.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM delivery_meta WHERE key = 'shards'").fetchone()
+            stale = self.conn.execute("SELECT 1 FROM delivery_fanout WHERE shard >= ? LIMIT 1", (shards,)).fetchone()
+            pending = []
+            if stale or (row is not None and int(row[0]) != shards):
+                pending = [tweet_id for tweet_id, in self.conn.execute("SELECT DISTINCT tweet_id FROM delivery_fanout")]
+                self.conn.execute("DELETE FROM delivery_fanout")
+                self.conn.executemany(
+                    "INSERT INTO delivery_fanout (tweet_id, shard) VALUES (?, ?)",
+                    [(tweet_id, shard) for tweet_id in pending for shard in range(shards)]
+                )
+            self.conn.execute("INSERT OR REPLACE INTO delivery_meta (key, value) VALUES ('shards', ?)", (str(shards),))
+            self.conn.commit()
+        return len(pending)
+
+    def pending_fanout(self):
+        """Tweet pubblicati non ancora espansi da questo shard, dal più vecchio"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT t.tweet FROM delivery_fanout f JOIN delivery_tweets t ON t.tweet_id = f.tweet_id "
+                "WHERE f.shard = ? ORDER BY f.rowid",
+                (self.shard,)
+            ).fetchall()
+        return [json.loads(tweet) for tweet, in rows]
+
+    def enqueue(self, tweet, chat_ids, delays=None):
+        """
+        Accoda il tweet per le chat indicate (delays: secondi di attesa per chat) e lo segna
+        come espanso per questo shard, nella stessa transazione. Ritorna i job creati.
+        """
+        now = time.time()
+        delays = delays or {}
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO delivery_tweets (tweet_id, tweet) VALUES (?, ?)",
+                (tweet_key(tweet), json.dumps(tweet))
+            )
+            created = self.conn.executemany(
+                "INSERT OR IGNORE INTO delivery_jobs (tweet_id, chat_id, next_attempt_at) VALUES (?, ?, ?)",
+                [(tweet_key(tweet), chat_id, now + delays.get(chat_id, 0)) for chat_id in chat_ids]
+            ).rowcount
+            self.conn.execute(
+                "DELETE FROM delivery_fanout WHERE tweet_id = ? AND shard = ?",
+                (tweet_key(tweet), self.shard)
+            )
+            self.conn.commit()
+        self.wakeup.set()
+        return created
+
+    def due_jobs(self, limit=DELIVERY_BATCH_SIZE):
+        """Job pronti: il più vecchio di ogni chat, se è giunto il momento di inviarlo"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT j.seq, j.chat_id, j.attempts, j.sent, t.tweet FROM delivery_jobs j "
+                "JOIN delivery_tweets t ON t.tweet_id = j.tweet_id "
+                "WHERE j.seq = (SELECT MIN(seq) FROM delivery_jobs WHERE chat_id = j.chat_id) "
+                "AND j.next_attempt_at <= ? AND abs(j.chat_id) % ? = ? ORDER BY j.seq LIMIT ?",
+                (time.time(), self.shards, self.shard, limit)
+            ).fetchall()
+        return self.jobs_from_rows(rows)
+
+    def chat_jobs(self, chat_id, limit):
+        """Job in coda per una chat, dal più vecchio (anche non ancora pronti)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT j.seq, j.chat_id, j.attempts, j.sent, t.tweet FROM delivery_jobs j "
+                "JOIN delivery_tweets t ON t.tweet_id = j.tweet_id "
+                "WHERE j.chat_id = ? ORDER BY j.seq LIMIT ?",
+                (chat_id, limit)
+            ).fetchall()
+        return self.jobs_from_rows(rows)
+
+    @staticmethod
+    def jobs_from_rows(rows):
+        return [
+            {
+                'seq': seq,
+                'chat_id': chat_id,
+                'attempts': attempts,
+                'sent': [tuple(message) for message in json.loads(sent)] if sent else [],
+                'tweet': json.loads(tweet)
+            }
+            for seq, chat_id, attempts, sent, tweet in rows
+        ]
+
+    def next_due_in(self):
+        """Secondi prima che un job diventi pronto (None se la coda è vuota)"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MIN(next_attempt_at) FROM delivery_jobs WHERE abs(chat_id) % ? = ?",
+                (self.shards, self.shard)
+            ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def complete(self, seqs):
+        """Rimuove i job conclusi (consegnati o scartati)"""
+        with self.lock:
+            self.conn.executemany("DELETE FROM delivery_jobs WHERE seq = ?", [(seq,) for seq in seqs])
+            self.conn.commit()
+
+    def retry(self, retries):
+        """
+        Ripianifica i job: retries è una lista di (seq, secondi di attesa, errore, messaggi
+        già inviati, True se il tentativo conta come fallito)
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE delivery_jobs SET attempts = attempts + ?, next_attempt_at = ?, last_error = ?, sent = ? WHERE seq = ?",
+                [
+                    (int(failed), now + delay, str(error)[:200], json.dumps(sent) if sent else None, seq)
+                    for seq, delay, error, sent, failed in retries
+                ]
+            )
+            self.conn.commit()
+
+    def drop_chats(self, chat_ids):
+        """Elimina tutti i job delle chat non più raggiungibili"""
+        with self.lock:
+            self.conn.executemany("DELETE FROM delivery_jobs WHERE chat_id = ?", [(chat_id,) for chat_id in chat_ids])
+            self.conn.commit()
+
+    def prune_tweets(self):
+        """Elimina i tweet che non hanno più job in coda né shard che devono ancora espanderli"""
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM delivery_tweets WHERE tweet_id NOT IN (SELECT DISTINCT tweet_id FROM delivery_jobs) "
+                "AND tweet_id NOT IN (SELECT tweet_id FROM delivery_fanout)"
+            )
+            self.conn.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM delivery_jobs").fetchone()[0]
 
-def scrape_twitter_rss(username):
+delivery_queue = None  # Aperta da open_stores()
+
+def delivery_backoff(attempts, retry_after=None):
+    """Attesa prima del prossimo tentativo (retry_after di Telegram se presente)"""
+    if retry_after is not None:
+        return retry_after
+    delay = min(DELIVERY_MAX_BACKOFF, DELIVERY_BASE_BACKOFF * 2 ** attempts)
+    return delay * random.uniform(0.8, 1.2)
+
+def send_tweet_to_all_channels(tweet):
     """
-    Metodo alternativo: usa RSS feed di Nitter
+    Pubblica il tweet nella coda: i worker di consegna lo accodano per i canali che seguono
+    l'account. Ritorna False se l'account non ha iscritti (il tweet non viene pubblicato).
     """
-    tweets = []
+    if not registry.subscribers(tweet['account']):
+        return False
+    # Il cycle_id viaggia con il tweet nella coda, per collegare le consegne al ciclo che lo ha rilevato
+    delivery_queue.publish(dict(tweet, cycle_id=log_context.get().get('cycle_id')), DELIVERY_SHARDS)
+    return True
+
+def fan_out_pending():
+    """Accoda i tweet pubblicati per i canali iscritti di questo shard, ritorna i tweet espansi"""
+    tweets = delivery_queue.pending_fanout()
+    for tweet in tweets:
+        if tweet.get('action'):
+            # Modifica o eliminazione: solo le chat che hanno ricevuto una copia del tweet
+            chat_ids = [chat_id for chat_id in message_index.chats(tweet['target']) if delivery_queue.owns(chat_id)]
+            delays = {}
+        else:
+            # Chat che hanno già ricevuto il tweet (espanso di nuovo dopo un cambio del numero di shard)
+            delivered = set(message_index.chats(tweet_key(tweet)))
+            channels = [
+                channel for channel in registry.subscribers(tweet['account'])
+                if delivery_queue.owns(channel['chat_id']) and channel['chat_id'] not in delivered
+            ]
+            chat_ids = [channel['chat_id'] for channel in channels]
+            # Canali in modalità riepilogo: il primo tweet attende la finestra (merge) per unirsi ai successivi
+            delays = {
+                channel['chat_id']: channel['digest']['window'] if channel['digest']['mode'] == 'merge' else DIGEST_EDIT_GRACE
+                for channel in channels if channel.get('digest')
+            }
+        with log_fields(cycle_id=tweet.get('cycle_id'), tweet_id=tweet['id']), span('fanout', tweet_id=tweet['id'], channels=len(chat_ids)):
+            queued = delivery_queue.enqueue(tweet, chat_ids, delays)
+            logger.info(f"📬 Tweet in coda per {queued} canali")
+    return len(tweets)
+
+def deliver(job):
+    """Esegue un job di consegna (eventi di log collegati al tweet e al ciclo che lo ha rilevato)"""
+    tweet = job['tweet']
+    with log_fields(cycle_id=tweet.get('cycle_id'), tweet_id=tweet['id'], chat_id=job['chat_id']):
+        if tweet.get('action'):
+            outcome, retry_after, error = send_to_channel(job['chat_id'], partial(apply_tweet_update, job['chat_id'], tweet, job['sent']))
+        elif 'batch' in job:
+            tweets = [batch_job['tweet'] for batch_job in job['batch']]
+            outcome, retry_after, error = send_to_channel(job['chat_id'], partial(send_digest, job['chat_id'], tweets, job['digest'], job['sent']))
+            if outcome == SEND_OK:
+                metrics.inc('digest_tweets_total', len(tweets), mode=job['digest']['mode'])
+        else:
+            outcome, retry_after, error = send_tweet_to_channel(job['chat_id'], tweet, job['sent'])
+        if outcome == SEND_OK:
+            log_sampled(logging.INFO, "📨 Tweet consegnato")
+        return outcome, retry_after, error
+
+def process_delivery_batch():
+    """Consegna in parallelo un gruppo di job pronti, ritorna il numero di job elaborati"""
+    jobs = delivery_queue.due_jobs()
+    if not jobs:
+        return 0
     
-    # Lista di istanze Nitter con RSS
-    rss_instances = [
-        "https://nitter.cz",
-        "https://nitter.poast.org",
-        "https://nitter.privacydev.net",
-        "https://nitter.net"
-    ]
+    # Canali in modalità riepilogo: il job più vecchio porta con sé gli altri tweet in coda per la chat
+    # (modifiche ed eliminazioni restano job separati)
+    for job in jobs:
+        digest = (registry.get(job['chat_id']) or {}).get('digest')
+        if digest and not job['tweet'].get('action'):
+            batch = [
+                batch_job for batch_job in delivery_queue.chat_jobs(job['chat_id'], DIGEST_MAX_TWEETS)
+                if not batch_job['tweet'].get('action')
+            ]
+            if len(batch) > 1 or digest['mode'] == 'edit':
+                job['batch'] = batch
+                job['digest'] = digest
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (compatible; RSS Reader)'
-    }
+    with span('delivery_batch', jobs=len(jobs)), ThreadPoolExecutor(max_workers=min(SEND_WORKERS, len(jobs))) as executor:
+        results = list(executor.map(deliver, jobs))
+    
+    completed = []
+    retries = []
+    removed_chats = []
+    dropped = 0
+    
+    for job, (outcome, retry_after, error) in zip(jobs, results):
+        seqs = [batch_job['seq'] for batch_job in job.get('batch', [job])]
+        if outcome == SEND_OK:
+            completed.extend(seqs)
+        elif outcome == SEND_REMOVE_CHANNEL:
+            logger.error(f"Canale {job['chat_id']} non raggiungibile: {error}", extra={'fields': {'tweet_id': job['tweet']['id'], 'chat_id': job['chat_id']}})
+            removed_chats.append(job['chat_id'])
+        elif outcome == SEND_RETRY and (retry_after is not None or job['attempts'] + 1 < DELIVERY_MAX_ATTEMPTS):
+            # Un 429 non è un fallimento: Telegram indica quando riprovare e il job non viene mai scartato
+            retries.append((job['seq'], delivery_backoff(job['attempts'], retry_after), error, job['sent'], retry_after is None))
+        else:
+            logger.error(f"Invio del tweet {job['tweet']['id']} alla chat {job['chat_id']} scartato: {error}", extra={'fields': {'tweet_id': job['tweet']['id'], 'chat_id': job['chat_id']}})
+            completed.extend(seqs)
+            dropped += len(seqs)
     
-    for instance in rss_instances:
+    delivery_queue.complete(completed)
+    if retries:
+        delivery_queue.retry(retries)
+    
+    metrics.inc('deliveries_total', len(completed) - dropped, outcome='sent')
+    metrics.inc('deliveries_total', len(retries), outcome='retry')
+    metrics.inc('deliveries_total', dropped, outcome='dropped')
+    metrics.inc('deliveries_total', len(removed_chats), outcome='removed')
+    
+    # Rimuovi i canali che hanno rimosso il bot o non esistono più
+    if removed_chats:
+        registry.remove_many(removed_chats)
+        delivery_queue.drop_chats(removed_chats)
+        logger.info(f"Rimossi {len(removed_chats)} canali non raggiungibili")
+    
+    logger.info(
+        f"📨 Consegne: {len(completed) - dropped} inviate, {len(retries)} da ritentare, "
+        f"{dropped} scartate, {len(removed_chats)} canali rimossi"
+    )
+    return len(jobs)
+
+def delivery_worker(parent_pid=None):
+    """Svuota la coda delle consegne (in un thread del leader o nel processo di uno shard)"""
+    logger.info(f"📮 Avvio worker consegne, shard {delivery_queue.shard + 1}/{delivery_queue.shards} ({len(delivery_queue)} job in coda)")
+    
+    while True:
+        # Processo di uno shard rimasto orfano (leader terminato): il nuovo leader ne avvia altri
+        if parent_pid is not None and os.getppid() != parent_pid:
+            logger.warning("👋 Leader terminato, chiusura del processo di consegna")
+            return
         try:
-            rss_url = f"{instance}/{username}/rss"
-            logger.info(f"Tentativo RSS con {instance}...")
-            
-            response = requests.get(rss_url, headers=headers, timeout=15, verify=False)
+            delivery_queue.wakeup.clear()
+            registry.refresh()
+            fan_out_pending()
+            if process_delivery_batch():
+                continue
+            delivery_queue.prune_tweets()
             
-            if response.status_code == 200:
-                from xml.etree import ElementTree as ET
-                
-                try:
-                    root = ET.fromstring(response.content)
-                    items = root.findall('.//item')
-                    
-                    for item in items[:5]:
-                        title = item.find('title')
-                        pub_date = item.find('pubDate')
-                        description = item.find('description')
-                        
-                        if title is not None and title.text:
-                            tweet_text = title.text.strip()
-                            tweet_time = pub_date.text if pub_date is not None else "Data sconosciuta"
-                            
-                            tweets.append({
-                                'text': tweet_text,
-                                'time': tweet_time,
-                                'images': [],
-                                'id': get_tweet_id(tweet_text, tweet_time)
-                            })
-                    
-                    if tweets:
-                        logger.info(f"✅ Trovati {len(tweets)} tweet via RSS da {instance}")
-                        return tweets
-                        
-                except ET.ParseError as e:
-                    logger.error(f"Errore parsing RSS da {instance}: {e}")
-                    continue
-                    
+            # Coda vuota o nessun job pronto: attendi il prossimo o un nuovo tweet
+            wait_for = delivery_queue.next_due_in()
+            timeout = 60 if parent_pid is None else DELIVERY_SHARD_CHECK_INTERVAL
+            delivery_queue.wakeup.wait(timeout if wait_for is None else min(timeout, wait_for))
         except Exception as e:
-            logger.error(f"Errore RSS con {instance}: {e}")
-            continue
-    
-    return []
+            logger.error(f"❌ Errore nel worker consegne: {e}")
+            time.sleep(5)
 
-def scrape_twitter_nitter(username):
+def run_delivery_shard(shard, shards, send_bucket, wakeup, metrics_queue, parent_pid):
+    """Processo di consegna di uno shard: limite globale condiviso, metriche inviate al leader"""
+    global global_send_bucket
+    global_send_bucket = send_bucket
+    metrics.sink = metrics_queue
+    open_stores()
+    delivery_queue.configure_shard(shard, shards, wakeup)
+    configure_logging()
+    delivery_worker(parent_pid)
+
+class DeliveryShards:
     """
-    Scraping dei tweet usando Nitter (frontend alternativo a Twitter)
+    Processi di consegna (uno per shard di chat) avviati dal leader. Condividono la coda
+    SQLite e un token bucket globale in memoria condivisa; le loro metriche arrivano al
+    leader tramite una coda. I processi terminati vengono riavviati.
     """
-    tweets = []
-    
-    # Prima prova con RSS (più affidabile)
-    tweets = scrape_twitter_rss(username)
-    if tweets:
-        return tweets
+
+    def __init__(self, shards):
+        # "spawn": il leader ha già dei thread attivi, un fork non sarebbe sicuro
+        self.context = multiprocessing.get_context('spawn')
+        self.shards = shards
+        self.send_bucket = SharedTokenBucket(GLOBAL_SEND_RATE, self.context)
+        self.wakeups = [self.context.Event() for _ in range(shards)]
+        self.metrics_queue = self.context.Queue()
+        self.processes = {}
+
+    def spawn(self, shard):
+        """Avvia il processo di uno shard"""
+        process = self.context.Process(
+            target=run_delivery_shard,
+            args=(shard, self.shards, self.send_bucket, self.wakeups[shard], self.metrics_queue, os.getpid()),
+            name=f"delivery-{shard}",
+            daemon=True
+        )
+        process.start()
+        self.processes[shard] = process
+
+    def start(self):
+        """Avvia i processi e i thread che ne raccolgono le metriche e li sorvegliano"""
+        delivery_queue.shard_wakeups = self.wakeups
+        for shard in range(self.shards):
+            self.spawn(shard)
+        threading.Thread(target=self.collect_metrics, daemon=True).start()
+        threading.Thread(target=self.supervise, daemon=True).start()
+        logger.info(f"📮 Avviati {self.shards} processi di consegna")
+
+    def collect_metrics(self):
+        """Applica alle metriche del leader quelle registrate dai processi di consegna"""
+        while True:
+            kind, name, value, labels = self.metrics_queue.get()
+            getattr(metrics, kind)(name, value, **labels)
+
+    def supervise(self):
+        """Riavvia i processi di consegna terminati"""
+        while True:
+            time.sleep(DELIVERY_SHARD_CHECK_INTERVAL)
+            for shard, process in list(self.processes.items()):
+                if not process.is_alive():
+                    logger.warning(f"⚠️ Processo di consegna {shard} terminato (codice {process.exitcode}), riavvio")
+                    self.spawn(shard)
+
+def start_delivery():
+    """Avvia le consegne: un thread nel leader o, con DELIVERY_SHARDS > 1, un processo per shard"""
+    resharded = delivery_queue.reshard(DELIVERY_SHARDS)
+    if resharded:
+        logger.info(f"📮 Numero di shard cambiato: {resharded} tweet in attesa ridistribuiti su {DELIVERY_SHARDS} shard")
+    if DELIVERY_SHARDS > 1:
+        DeliveryShards(DELIVERY_SHARDS).start()
+    else:
+        threading.Thread(target=delivery_worker, daemon=True).start()
+
+class PollScheduler:
+    """
+    Scheduler a priorità (min-heap sulla scadenza) dei controlli per account.
+    All'avvio i controlli vengono distribuiti sull'intervallo per non concentrarli;
+    gli account aggiunti in seguito vengono controllati subito.
+    """
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.heap = []
+        self.scheduled = {}  # account -> scadenza (None se il controllo è in corso)
+        self.condition = threading.Condition()
+
+    def schedule(self, account, due):
+        """Pianifica un account (chiamare con il lock acquisito)"""
+        self.scheduled[account] = due
+        heapq.heappush(self.heap, (due, account))
+
+    def sync(self, accounts):
+        """Allinea lo scheduler agli account seguiti dai canali"""
+        with self.condition:
+            now = time.time()
+            first_sync = not self.scheduled
+            new_accounts = [account for account in accounts if account not in self.scheduled]
+            for i, account in enumerate(new_accounts):
+                offset = i * self.interval / len(new_accounts) if first_sync else 0
+                self.schedule(account, now + offset)
+            for account in set(self.scheduled) - set(accounts):
+                del self.scheduled[account]
+            self.condition.notify_all()
+
+    def reschedule(self, account, interval=None):
+        """Ripianifica un account dopo il controllo"""
+        with self.condition:
+            if account in self.scheduled:
+                self.schedule(account, time.time() + (interval or self.interval))
+                self.condition.notify_all()
+
+    def next_due(self, max_wait):
+        """Attende il prossimo account da controllare (None se scade max_wait)"""
+        with self.condition:
+            wait_until = time.time() + max_wait
+            while True:
+                # Scarta le voci obsolete (account ripianificati o non più seguiti)
+                while self.heap and self.scheduled.get(self.heap[0][1]) != self.heap[0][0]:
+                    heapq.heappop(self.heap)
+                
+                now = time.time()
+                if self.heap and self.heap[0][0] <= now:
+                    _, account = heapq.heappop(self.heap)
+                    self.scheduled[account] = None
+                    return account
+                if now >= wait_until:
+                    return None
+                
+                next_wake = min(self.heap[0][0], wait_until) if self.heap else wait_until
+                self.condition.wait(next_wake - now)
+
+    def snapshot(self):
+        """Prossima scadenza per ogni account"""
+        with self.condition:
+            return dict(self.scheduled)
+
+RELATIVE_TIME_PATTERN = re.compile(r'^(\d+)\s*([smhd])$')
+RELATIVE_TIME_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def parse_tweet_time(tweet_time, now=None):
+    """Converte la data di un tweet (RSS, ISO, Nitter o relativa come "5m") in timestamp Unix"""
+    now = now or time.time()
+    tweet_time = (tweet_time or '').strip()
     
-    # Se RSS fallisce, usa scraping HTML
-    logger.info("RSS fallito, provo con scraping HTML...")
-    
-    # Lista aggiornata di istanze Nitter funzionanti
-    nitter_instances = [
-        "https://nitter.cz",
-        "https://nitter.poast.org",
-        "https://nitter.privacydev.net", 
-        "https://nitter.net",
-        "https://nitter.it",
-        "https://nitter.fdn.fr",
-        "https://nitter.1d4.us",
-        "https://nitter.kavin.rocks",
-        "https://nitter.unixfox.eu",
-        "https://nitter.domain.glass",
-        "https://nitter.eu",
-        "https://nitter.namazso.eu",
-        "https://bird.trom.tf",
-        "https://nitter.moomoo.me",
-        "https://nitter.fly.dev"
-    ]
+    match = RELATIVE_TIME_PATTERN.match(tweet_time)
+    if match:
+        return now - int(match.group(1)) * RELATIVE_TIME_UNITS[match.group(2)]
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Accept-Encoding': 'gzip, deflate',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1'
-    }
+    try:
+        return parsedate_to_datetime(tweet_time).timestamp()
+    except (TypeError, ValueError, IndexError):
+        pass
     
-    for instance in nitter_instances:
+    for parse in (
+        lambda value: datetime.fromisoformat(value.replace('Z', '+00:00')),
+        lambda value: datetime.strptime(value.replace(' UTC', ''), "%b %d, %Y · %I:%M %p"),
+    ):
         try:
-            url = f"{instance}/{username}"
-            logger.info(f"Tentativo con {instance}...")
+            return parse(tweet_time).timestamp()
+        except ValueError:
+            continue
+    return None
+
+class PostingCadence:
+    """
+    Stima la frequenza di pubblicazione di ogni account dai timestamp dei tweet recenti
+    e ne ricava l'intervallo di controllo: più breve durante le raffiche e nelle ore
+    in cui l'account è attivo, più lungo nelle ore di silenzio.
+    """
+
+    HISTORY = 200  # Timestamp memorizzati per account
+
+    def __init__(self, min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL, jitter=POLL_JITTER):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.lock = threading.Lock()
+        self.timestamps = {}  # account -> {tweet_id: timestamp}
+
+    def observe(self, account, tweets):
+        """Registra i timestamp dei tweet appena scaricati (una volta per tweet)"""
+        now = time.time()
+        with self.lock:
+            history = self.timestamps.setdefault(account, {})
+            for tweet in tweets:
+                if tweet.get('is_test') or tweet['id'] in history:
+                    continue
+                stamp = parse_tweet_time(tweet['time'], now)
+                if stamp is not None and stamp <= now:
+                    history[tweet['id']] = stamp
+            if len(history) > self.HISTORY:
+                newest = sorted(history.items(), key=lambda item: item[1])[-self.HISTORY:]
+                self.timestamps[account] = dict(newest)
+
+    def recent_timestamps(self, account):
+        """Timestamp noti dell'account, in ordine cronologico"""
+        with self.lock:
+            return sorted(self.timestamps.get(account, {}).values())
+
+    def next_interval(self, account):
+        """Intervallo in secondi prima del prossimo controllo dell'account"""
+        now = time.time()
+        stamps = self.recent_timestamps(account)
+        
+        if len(stamps) < 2:
+            interval = POLL_INTERVAL
+        else:
+            recent = stamps[-21:]
+            median_gap = statistics.median(b - a for a, b in zip(recent, recent[1:]))
+            # Due controlli per ogni intervallo medio tra un tweet e l'altro
+            interval = max(median_gap, 1) / 2
+            
+            # Raffica in corso: l'ultimo tweet è più recente dell'intervallo tipico
+            if now - stamps[-1] < median_gap:
+                interval /= 2
             
-            # Prova prima con SSL, poi senza se fallisce
+            # Peso dell'ora corrente nella giornata tipica dell'account
+            if len(stamps) >= 24:
+                hour = datetime.fromtimestamp(now).hour
+                share = sum(1 for stamp in stamps if datetime.fromtimestamp(stamp).hour == hour) / len(stamps)
+                interval *= min(2.0, max(0.5, (1 / 24) / share)) if share else 2.0
+        
+        interval *= 1 + random.uniform(-self.jitter, self.jitter)
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def snapshot(self):
+        """Numero di timestamp noti e ultimo tweet per ogni account"""
+        with self.lock:
+            return {
+                account: {'samples': len(history), 'last_tweet': max(history.values(), default=None)}
+                for account, history in self.timestamps.items()
+            }
+
+poll_scheduler = PollScheduler()
+posting_cadence = PostingCadence()
+
+def publish_tweet_update(tweet, action, target):
+    """Pubblica la modifica o l'eliminazione del tweet target per le chat che ne hanno una copia"""
+    suffix = f"edit-{MessageIndex.text_hash(tweet)}" if action == 'edit' else action
+    update = dict(tweet, id=f"{tweet['id']}#{suffix}", action=action, target=target, cycle_id=log_context.get().get('cycle_id'))
+    delivery_queue.publish(update, DELIVERY_SHARDS)
+    metrics.inc('tweet_updates_total', action=action)
+
+def propagate_edit(tweet, target):
+    """Aggiorna le copie già inviate del tweet target con il testo di tweet (stesso status o sua modifica)"""
+    logger.info(f"✏️ Tweet {target} modificato, aggiorno le copie inviate")
+    message_index.update_text(tweet, previous=target)
+    publish_tweet_update(tweet, 'edit', tweet_key(tweet))
+
+def propagate_delete(account, target):
+    """Elimina le copie già inviate di un tweet non più presente nella timeline"""
+    logger.info(f"🗑️ Tweet {target} eliminato, rimuovo le copie inviate")
+    message_index.forget(target)
+    publish_tweet_update({'account': account, 'id': target.split('/', 1)[1], 'text': ''}, 'delete', target)
+
+def is_tweet_edit(tweet, previous):
+    """
+    True se il tweet è la modifica del tweet indicizzato previous: su Twitter una modifica è
+    un nuovo status, creato entro TWEET_EDIT_WINDOW dall'originale, con testo diverso.
+    """
+    previous_id = previous.split('/', 1)[1]
+    if status_id(tweet) is None or not previous_id.isdigit() or tweet.get('retweet'):
+        return False
+    elapsed = status_time(status_id(tweet)) - status_time(int(previous_id))
+    return 0 < elapsed <= TWEET_EDIT_WINDOW and message_index.text_changed(tweet, previous)
+
+def process_new_tweet(tweet):
+    """Accoda un tweet non ancora pubblicato per i canali iscritti, ritorna False se è un quasi-duplicato"""
+    account = tweet['account']
+    with log_fields(tweet_id=tweet['id']):
+        # Tweet modificato o ripubblicato con lo stesso testo: registralo senza inviarlo di nuovo
+        duplicate_of = None if tweet.get('is_test') else posted_tweets.find_near_duplicate(tweet)
+        if duplicate_of:
+            if is_tweet_edit(tweet, duplicate_of):
+                propagate_edit(tweet, duplicate_of)
+            else:
+                logger.info(f"♻️ Tweet {tweet['id']} quasi identico a {duplicate_of}, non inviato")
+            posted_tweets.add(tweet)
+            metrics.inc('tweets_duplicate_total', account=account)
+            return False
+        
+        logger.info(f"📤 Nuovo tweet trovato: {tweet['text'][:50]}...")
+        
+        # Pubblica il tweet per tutti i canali iscritti (i worker consegne lo accoderanno e invieranno)
+        if send_tweet_to_all_channels(tweet) and not tweet.get('is_test'):
+            message_index.track(tweet)
+        posted_tweets.add(tweet)
+        metrics.inc('tweets_detected_total', account=account)
+        return True
+
+class TimelineBackfill:
+    """
+    Recupero dei tweet persi durante un'interruzione (riavvio o istanze non raggiungibili).
+    Se nessun tweet della timeline scaricata è già noto, un thread dedicato sfoglia le
+    pagine HTML successive (cursore di "Load more") fino all'ultimo status pubblicato
+    dell'account e accoda i tweet mancanti dal più vecchio, a velocità limitata.
+    Gli altri account continuano a essere controllati; i nuovi tweet dell'account
+    vengono accodati a recupero concluso, dopo quelli recuperati. Se il recupero non
+    raggiunge l'ultimo status pubblicato (es. pagine HTML non raggiungibili) viene
+    ritentato con backoff esponenziale e nel frattempo i controlli pubblicano i tweet
+    della timeline scaricata.
+    """
+
+    def __init__(self, max_pages=BACKFILL_MAX_PAGES, rate=BACKFILL_TWEET_RATE, max_age=BACKFILL_MAX_AGE):
+        self.max_pages = max_pages
+        self.max_age = max_age
+        self.bucket = TokenBucket(rate)
+        self.lock = threading.Lock()
+        self.running = set()
+        self.failures = {}  # account -> (recuperi falliti consecutivi, istante del prossimo tentativo)
+
+    def active(self, account):
+        """True se è in corso il recupero dell'account"""
+        with self.lock:
+            return account in self.running
+
+    @staticmethod
+    def reaches_mark(tweet, mark):
+        """True se il tweet è già stato pubblicato o non è più recente del punto di arrivo"""
+        if tweet.get('pinned'):
+            return False
+        if posted_tweets.is_posted(tweet):
+            return True
+        return mark is not None and not tweet.get('retweet') and status_id(tweet) is not None and status_id(tweet) <= mark
+
+    def gap_detected(self, account, tweets):
+        """True se tra la timeline scaricata e l'ultimo tweet pubblicato potrebbero mancare dei tweet"""
+        if any(tweet.get('is_test') for tweet in tweets):
+            return False
+        mark = posted_tweets.high_water_mark(account)
+        if mark is None or any(self.reaches_mark(tweet, mark) for tweet in tweets):
+            return False
+        with self.lock:
+            failure = self.failures.get(account)
+        if failure is not None and time.time() < failure[1]:
+            logger.warning(f"⚠️ Recupero di @{account} sospeso dopo {failure[0]} tentativi falliti, pubblico i tweet della timeline")
+            return False
+        return True
+
+    def record_result(self, account, reached):
+        """Azzera i fallimenti dell'account o pianifica il prossimo tentativo con backoff esponenziale"""
+        with self.lock:
+            if reached:
+                self.failures.pop(account, None)
+                return
+            count = self.failures.get(account, (0, 0))[0] + 1
+            delay = min(BACKFILL_RETRY_MAX, BACKFILL_RETRY_BASE * 2 ** (count - 1))
+            self.failures[account] = (count, time.time() + delay)
+        logger.warning(f"⚠️ Recupero di @{account}: ultimo tweet pubblicato non raggiunto, alcuni tweet potrebbero mancare "
+                       f"(nuovo tentativo tra {delay}s)")
+
+    def start(self, account):
+        """Avvia il recupero dell'account in un thread separato (False se già in corso)"""
+        with self.lock:
+            if account in self.running:
+                return False
+            self.running.add(account)
+        # Il thread eredita il contesto dei log (cycle_id del controllo che ha rilevato il buco)
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(self.run, account), daemon=True).start()
+        return True
+
+    def fetch_page(self, account, cursor):
+        """Scarica una pagina dalla prima istanza HTML che risponde (None se nessuna risponde)"""
+        for _, instance, _ in instance_health.order(html_candidates(account)):
             try:
-                response = requests.get(url, headers=headers, timeout=20)
-            except:
-                response = requests.get(url, headers=headers, timeout=20, verify=False)
+                tweets, next_cursor = fetch_timeline_page(instance, account, cursor)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Recupero di @{account}: errore con {instance}: {e}")
+                continue
+            if tweets:
+                return tweets, next_cursor
+        return None
+
+    def collect(self, account, mark):
+        """Tweet mancanti (dal più recente) e True se il punto di arrivo (o il limite di età) è stato raggiunto"""
+        oldest_allowed = time.time() - self.max_age
+        missing = []
+        seen = set()
+        cursor = None
+        for _ in range(self.max_pages):
+            page = self.fetch_page(account, cursor)
+            if page is None:
+                return missing, False
+            tweets, cursor = page
+            for tweet in tweets:
+                if self.reaches_mark(tweet, mark):
+                    return missing, True
+                published = None if tweet.get('pinned') or tweet.get('retweet') else parse_tweet_time(tweet['time'])
+                if published is not None and published < oldest_allowed:
+                    return missing, True
+                if not tweet.get('pinned') and tweet['id'] not in seen:
+                    seen.add(tweet['id'])
+                    missing.append(tweet)
+            if not cursor:
+                return missing, False
+        return missing, False
+
+    def run(self, account):
+        """Recupera i tweet mancanti dell'account e li accoda in ordine di pubblicazione"""
+        reached = False
+        try:
+            mark = posted_tweets.high_water_mark(account)
+            logger.info(f"⏪ Recupero dei tweet di @{account} successivi allo status {mark}...")
+            with span('backfill', account=account):
+                missing, reached = self.collect(account, mark)
             
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Prova diversi selettori per i tweet (le strutture cambiano)
-                tweet_containers = (
-                    soup.find_all('div', class_='timeline-item') or
-                    soup.find_all('div', class_='tweet') or
-                    soup.find_all('article') or
-                    soup.find_all('div', attrs={'data-tweet-id': True})
-                )
-                
-                if not tweet_containers:
-                    logger.warning(f"Nessun contenuto tweet trovato su {instance}")
+            recovered = 0
+            for tweet in reversed(missing):  # Dal più vecchio al più nuovo
+                if posted_tweets.is_posted(tweet):
                     continue
-                
-                for container in tweet_containers[:5]:  # Prendi solo gli ultimi 5 tweet
-                    try:
-                        # Prova diversi selettori per il contenuto del tweet
-                        tweet_content = (
-                            container.find('div', class_='tweet-content') or
-                            container.find('div', class_='tweet-text') or
-                            container.find('p') or
-                            container.find('div', class_='content')
-                        )
-                        
-                        if tweet_content:
-                            tweet_text = tweet_content.get_text().strip()
-                            
-                            if not tweet_text or len(tweet_text) < 10:
-                                continue
-                            
-                            # Prova diversi selettori per il timestamp
-                            time_element = (
-                                container.find('span', class_='tweet-date') or
-                                container.find('time') or
-                                container.find('span', class_='date') or
-                                container.find('a', class_='tweet-link')
-                            )
-                            
-                            if time_element:
-                                tweet_time = time_element.get_text().strip() or time_element.get('datetime', 'Data sconosciuta')
-                            else:
-                                tweet_time = "Data sconosciuta"
-                            
-                            # Estrai eventuali link alle immagini
-                            images = []
-                            img_elements = container.find_all('img')
-                            for img in img_elements:
-                                if img.get('src') and ('pic.twitter.com' in img.get('src', '') or 'attachment' in img.get('class', [])):
-                                    img_url = img['src']
-                                    if img_url.startswith('/'):
-                                        img_url = f"{instance}{img_url}"
-                                    images.append(img_url)
-                            
-                            tweets.append({
-                                'text': tweet_text,
-                                'time': tweet_time,
-                                'images': images,
-                                'id': get_tweet_id(tweet_text, tweet_time)
-                            })
-                    
-                    except Exception as e:
-                        logger.error(f"Errore nell'estrazione del tweet: {e}")
-                        continue
-                
-                if tweets:
-                    logger.info(f"✅ Trovati {len(tweets)} tweet con {instance}")
-                    return tweets
-                else:
-                    logger.warning(f"Nessun tweet valido estratto da {instance}")
-                    
+                self.bucket.acquire()
+                if process_new_tweet(tweet):
+                    recovered += 1
+                    metrics.inc('tweets_backfilled_total', account=account)
+            logger.info(f"⏪ Recupero di @{account} concluso: {recovered} tweet accodati")
         except Exception as e:
-            logger.error(f"Errore con {instance}: {e}")
-            continue
-    
-    # Se nessuna istanza Nitter funziona, crea un tweet di test per verificare che il sistema funzioni
-    logger.warning("⚠️ Nessuna istanza Nitter disponibile - creazione tweet di test")
-    test_tweet = {
-        'text': f"🔧 Test del bot - Monitoraggio di @{username} attivo ma istanze Nitter temporaneamente non disponibili. Il servizio riprenderà automaticamente quando le istanze torneranno online.",
-        'time': datetime.now().strftime("%Y-%m-%d %H:%M"),
-        'images': [],
-        'id': get_tweet_id("test_tweet", str(datetime.now()))
-    }
-    return [test_tweet]
+            logger.error(f"❌ Errore nel recupero di @{account}: {e}")
+        finally:
+            self.record_result(account, reached)
+            with self.lock:
+                self.running.discard(account)
+            # I tweet più recenti della timeline vengono accodati dal prossimo controllo
+            poll_scheduler.reschedule(account, 1)
 
-def format_tweet_for_telegram(tweet):
-    """Formatta il tweet per Telegram"""
-    message = f"🐦 **Nuovo Tweet di @{TWITTER_USERNAME}**\n\n"
-    message += f"{tweet['text']}\n\n"
-    message += f"📅 {tweet['time']}"
-    
-    return message
+timeline_backfill = TimelineBackfill()
 
-def send_tweet_to_all_channels(tweet):
-    """Invia il tweet a tutti i canali registrati"""
-    channels = load_registered_channels()
-    successful_sends = 0
-    failed_channels = []
+def poll_account(account):
+    """Controlla un account e invia i nuovi tweet ai canali che lo seguono"""
+    if timeline_backfill.active(account):
+        logger.info(f"⏪ Recupero in corso per @{account}, controllo rimandato")
+        return
     
-    message = format_tweet_for_telegram(tweet)
+    logger.info(f"🔍 Controllo nuovi tweet di @{account}...")
     
-    for channel in channels:
-        try:
-            chat_id = channel['chat_id']
-            
-            # Se ci sono immagini, invia la prima come foto con il testo
-            if tweet['images']:
-                bot.send_photo(
-                    chat_id=chat_id,
-                    photo=tweet['images'][0],
-                    caption=message,
-                    parse_mode='Markdown'
-                )
-            else:
-                bot.send_message(
-                    chat_id=chat_id,
-                    text=message,
-                    parse_mode='Markdown'
-                )
-            
-            successful_sends += 1
-            time.sleep(1)  # Pausa per evitare rate limiting
-            
-        except Exception as e:
-            logger.error(f"Errore nell'invio al canale {channel['chat_title']}: {e}")
-            failed_channels.append(channel['chat_id'])
+    # Ottieni i tweet più recenti (una sola volta per tutti i canali iscritti)
+    with span('scrape', account=account):
+        tweets = scrape_twitter_nitter(account)
+    
+    if not tweets:
+        logger.warning(f"❌ Nessun tweet trovato per @{account}")
+        return
     
-    # Rimuovi i canali che hanno dato errore (probabilmente bot rimosso)
-    if failed_channels:
-        channels = [ch for ch in channels if ch['chat_id'] not in failed_channels]
-        save_registered_channels(channels)
-        logger.info(f"Rimossi {len(failed_channels)} canali non raggiungibili")
+    posting_cadence.observe(account, tweets)
     
-    return successful_sends
+    # Nessun tweet già noto: l'interruzione è stata più lunga della pagina scaricata.
+    # Il recupero accoda prima i tweet mancanti, poi questi (per mantenere l'ordine)
+    if timeline_backfill.gap_detected(account, tweets):
+        logger.warning(f"🕳️ Possibili tweet persi per @{account}, avvio del recupero")
+        timeline_backfill.start(account)
+        return
+    
+    new_tweets_count = 0
+    
+    # Controlla ogni tweet
+    for tweet in reversed(tweets):  # Dal più vecchio al più nuovo
+        if posted_tweets.is_posted(tweet):
+            # Stesso status con un testo diverso da quello inviato: aggiorna le copie
+            if message_index.text_changed(tweet):
+                propagate_edit(tweet, tweet_key(tweet))
+            continue
+        if process_new_tweet(tweet):
+            new_tweets_count += 1
+    
+    for key in message_index.deleted(account, tweets):
+        propagate_delete(account, key)
+    
+    if new_tweets_count > 0:
+        logger.info(f"💾 Processati {new_tweets_count} nuovi tweet di @{account}")
+    else:
+        logger.info(f"📝 Nessun nuovo tweet da pubblicare per @{account}")
 
 def tweet_monitor():
     """Funzione che monitora i tweet (da eseguire in thread separato)"""
-    logger.info(f"🚀 Avvio monitoraggio tweet per @{TWITTER_USERNAME}")
-    
-    # Carica i tweet già pubblicati
-    posted_tweets = load_posted_tweets()
+    logger.info(f"🚀 Avvio monitoraggio tweet per {len(registry.accounts())} account")
     
     while True:
-        try:
-            logger.info("🔍 Controllo nuovi tweet...")
-            
-            # Ottieni i tweet più recenti
-            tweets = scrape_twitter_nitter(TWITTER_USERNAME)
-            
-            if not tweets:
-                logger.warning("❌ Nessun tweet trovato")
-                time.sleep(600)  # Aspetta 10 minuti
-                continue
-            
-            new_tweets_count = 0
-            channels = load_registered_channels()
-            
-            if not channels:
-                logger.info("📭 Nessun canale registrato, salto l'invio")
-                time.sleep(600)
-                continue
-            
-            # Controlla ogni tweet
-            for tweet in reversed(tweets):  # Dal più vecchio al più nuovo
-                if tweet['id'] not in posted_tweets:
-                    logger.info(f"📤 Nuovo tweet trovato: {tweet['text'][:50]}...")
-                    
-                    # Invia il tweet a tutti i canali
-                    successful_sends = send_tweet_to_all_channels(tweet)
-                    
-                    if successful_sends > 0:
-                        posted_tweets.append(tweet['id'])
-                        new_tweets_count += 1
-                        logger.info(f"✅ Tweet inviato a {successful_sends} canali")
-                        
-                        # Pausa tra i tweet
-                        time.sleep(10)
-                    else:
-                        logger.error("❌ Errore nell'invio del tweet")
-            
-            # Salva la lista aggiornata
-            if new_tweets_count > 0:
-                save_posted_tweets(posted_tweets)
-                logger.info(f"💾 Processati {new_tweets_count} nuovi tweet")
-            else:
-                logger.info("📝 Nessun nuovo tweet da pubblicare")
-            
-            # Mantieni solo gli ultimi 200 ID per evitare file troppo grandi
-            if len(posted_tweets) > 200:
-                posted_tweets = posted_tweets[-200:]
-                save_posted_tweets(posted_tweets)
-            
-        except Exception as e:
-            logger.error(f"❌ Errore nel monitoraggio: {e}")
+        # I comandi possono arrivare ad altri processi (worker web): rileggi i canali
+        registry.refresh()
+        poll_scheduler.sync(registry.accounts())
+        account = poll_scheduler.next_due(max_wait=REGISTRY_REFRESH_INTERVAL)
+        
+        if account is None:
+            if not registry:
+                logger.info("📭 Nessun canale registrato, in attesa...")
+            continue
+        
+        cycle_started = time.monotonic()
+        with log_fields(cycle_id=uuid.uuid4().hex[:12], account=account), span('poll_cycle', account=account):
+            try:
+                poll_account(account)
+                
+                # Applica la retention sugli ID pubblicati e sull'indice dei messaggi
+                posted_tweets.prune()
+                message_index.prune()
+                
+            except Exception as e:
+                logger.error(f"❌ Errore nel monitoraggio di @{account}: {e}")
+        metrics.observe('monitor_cycle_seconds', time.monotonic() - cycle_started)
         
-        # Aspetta 10 minuti prima del prossimo controllo
-        logger.info(f"⏰ Prossimo controllo tra 10 minuti... ({len(load_registered_channels())} canali attivi)")
-        time.sleep(600)
+        interval = posting_cadence.next_interval(account)
+        poll_scheduler.reschedule(account, interval)
+        logger.info(f"⏰ Prossimo controllo di @{account} tra {interval / 60:.1f} minuti... ({len(registry)} canali attivi)")
+
+metrics.gauge('delivery_queue_depth', "Job di consegna in coda", lambda: len(delivery_queue))
+metrics.gauge('registered_channels', "Canali registrati", lambda: len(registry))
+metrics.gauge('monitored_accounts', "Account seguiti da almeno un canale", lambda: len(registry.accounts()))
 
 # Flask routes per Render
 @app.route('/')
@@ -541,7 +3768,11 @@ def index():
     return {
         "status": "Bot attivo",
         "bot_username": f"@{TWITTER_USERNAME}",
-        "canali_attivi": len(load_registered_channels()),
+        "account_monitorati": registry.accounts(),
+        "consegne_in_coda": len(delivery_queue),
+        "ruolo": started_role,
+        "leader": leader_lock.held,
+        "canali_attivi": len(registry),
         "timestamp": datetime.now().isoformat()
     }
 
@@ -550,6 +3781,148 @@ def health():
     """Health check per Render"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Metriche in formato Prometheus: quelle del processo più quelle pubblicate dagli altri"""
+    return Response(metrics.render(peer_metrics()), mimetype='text/plain; version=0.0.4')
+
+def admin_authorized():
+    """True se la richiesta porta il token di amministrazione (Authorization: Bearer <token>)"""
+    if not ADMIN_TOKEN:
+        return False
+    expected = f"Bearer {ADMIN_TOKEN}".encode()
+    return hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected)
+
+def parse_channel_line(line):
+    """Canale da una riga JSON dell'import, nel formato dell'export (None se non valida)"""
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or type(data.get('chat_id')) is not int:
+        return None
+    
+    accounts = data.get('accounts', [TWITTER_USERNAME])
+    if not isinstance(accounts, list):
+        return None
+    accounts = [normalize_account(account) if isinstance(account, str) else None for account in accounts]
+    if None in accounts:
+        return None
+    
+    channel = {
+        'chat_id': data['chat_id'],
+        'chat_title': str(data.get('chat_title') or ''),
+        'added_date': str(data.get('added_date') or ''),
+        'accounts': list(dict.fromkeys(accounts))
+    }
+    digest = data.get('digest')
+    if digest is not None:
+        if not isinstance(digest, dict):
+            return None
+        window = digest.get('window', DIGEST_WINDOW)
+        if digest.get('mode') not in DIGEST_MODES[1:] or type(window) is not int or not 1 <= window <= DIGEST_MAX_WINDOW:
+            return None
+        channel['digest'] = {'mode': digest['mode'], 'window': window}
+    return channel
+
+def json_lines(items):
+    """Risposta in streaming JSON Lines (un oggetto per riga)"""
+    return Response((json.dumps(item, ensure_ascii=False) + "\n" for item in items), mimetype='application/x-ndjson')
+
+@app.route('/admin/channels', methods=['GET'])
+def admin_export_channels():
+    """Esporta i canali registrati in JSON Lines (?account= per quelli che seguono un account)"""
+    if not admin_authorized():
+        return {"errore": "Non autorizzato"}, 401
+    registry.refresh()
+    account = normalize_account(request.args.get('account'))
+    return json_lines(registry.subscribers(account) if account else registry.all())
+
+@app.route('/admin/channels', methods=['POST'])
+def admin_import_channels():
+    """
+    Importa canali da un corpo JSON Lines nel formato dell'export: i canali nuovi vengono
+    registrati, quelli esistenti sostituiti, tutti con un solo salvataggio del registro.
+    """
+    if not admin_authorized():
+        return {"errore": "Non autorizzato"}, 401
+    
+    channels = []
+    invalid = []
+    for number, line in enumerate(request.stream, 1):
+        if not line.strip():
+            continue
+        channel = parse_channel_line(line)
+        if channel is None:
+            invalid.append(number)
+        else:
+            channels.append(channel)
+    
+    registry.refresh()
+    added, updated = registry.import_channels(channels)
+    poll_scheduler.sync(registry.accounts())
+    logger.info(f"📥 Import canali: {added} aggiunti, {updated} aggiornati, {len(invalid)} righe non valide")
+    return {"aggiunti": added, "aggiornati": updated, "righe_non_valide": invalid}
+
+@app.route('/admin/channels/prune', methods=['POST'])
+def admin_prune_channels():
+    """
+    Rimuove canali in blocco e restituisce in JSON Lines quelli rimossi. Criteri (anche insieme):
+    chat_id nel corpo (una riga per chat, numero o {"chat_id": ...}), ?account= per i canali
+    che seguono un account, ?orphaned=1 per quelli che non seguono nessun account.
+    Con ?dry_run=1 restituisce i canali senza rimuoverli.
+    """
+    if not admin_authorized():
+        return {"errore": "Non autorizzato"}, 401
+    
+    chat_ids = set()
+    for line in request.stream:
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            return {"errore": f"Riga non valida: {line[:100]!r}"}, 400
+        chat_id = data.get('chat_id') if isinstance(data, dict) else data
+        if type(chat_id) is not int:
+            return {"errore": f"chat_id non valido: {line[:100]!r}"}, 400
+        chat_ids.add(chat_id)
+    account = normalize_account(request.args.get('account'))
+    orphaned = request.args.get('orphaned') == '1'
+    
+    registry.refresh()
+    removed = [
+        channel for channel in registry.all()
+        if channel['chat_id'] in chat_ids
+        or (account and account in channel['accounts'])
+        or (orphaned and not channel['accounts'])
+    ]
+    if removed and request.args.get('dry_run') != '1':
+        removed_ids = [channel['chat_id'] for channel in removed]
+        registry.remove_many(removed_ids)
+        registry.flush()
+        delivery_queue.drop_chats(removed_ids)
+        poll_scheduler.sync(registry.accounts())
+        logger.info(f"🧹 Rimossi {len(removed_ids)} canali dall'endpoint di amministrazione")
+    return json_lines(removed)
+
+@app.route('/instances')
+def instances():
+    """Salute delle istanze Nitter usata per l'instradamento"""
+    if not leader_lock.held:
+        # Le statistiche aggiornate sono quelle salvate dal leader
+        instance_health.reload()
+    now = time.time()
+    stats = instance_health.snapshot()
+    ranked = sorted(stats.items(), key=lambda item: instance_health.score(item[0]), reverse=True)
+    return {
+        "instances": [
+            {"instance": key, **entry, "score": round(instance_health.score(key), 4), "available": entry['cooldown_until'] <= now}
+            for key, entry in ranked
+        ],
+        "timestamp": datetime.now().isoformat()
+    }
+
 @app.route('/webhook-info')
 def webhook_info():
     """Verifica lo stato del webhook"""
@@ -572,9 +3945,9 @@ def webhook_info():
 
 @app.route('/test-bot')
 def test_bot():
-    """Testa se il bot funziona"""
+    """Testa se il bot funziona (identità in cache, ?refresh=1 per interrogare Telegram)"""
     try:
-        bot_info = bot.get_me()
+        bot_info = bot_identity.get(refresh=request.args.get('refresh') == '1')
         return {
             "bot_username": bot_info.username,
             "bot_id": bot_info.id,
@@ -582,19 +3955,90 @@ def test_bot():
             "can_join_groups": bot_info.can_join_groups,
             "can_read_all_group_messages": bot_info.can_read_all_group_messages,
             "supports_inline_queries": bot_info.supports_inline_queries,
+            "identity_age_seconds": round(time.time() - bot_identity.fetched_at),
             "status": "Bot funzionante",
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
         return {"error": str(e), "status": "Bot non funzionante", "timestamp": datetime.now().isoformat()}
 
+class UpdateDispatcher:
+    """
+    Elabora gli update del webhook in background, così la risposta a Telegram parte subito.
+    Ogni chat è assegnata sempre allo stesso worker (ordine dei messaggi garantito per chat);
+    le code sono limitate e, se piene, l'update viene rifiutato e Telegram lo rinvia più tardi.
+    I thread partono al primo update ricevuto.
+    """
+
+    def __init__(self, workers=UPDATE_WORKERS, queue_size=UPDATE_QUEUE_SIZE):
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.started = False
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def chat_key(update):
+        """Chat a cui appartiene l'update (update_id se non ce n'è una)"""
+        for field in ('message', 'edited_message', 'channel_post', 'edited_channel_post', 'my_chat_member', 'chat_member', 'chat_join_request'):
+            item = getattr(update, field, None)
+            if item is not None and getattr(item, 'chat', None) is not None:
+                return item.chat.id
+        callback_query = getattr(update, 'callback_query', None)
+        if callback_query is not None:
+            return callback_query.from_user.id
+        return update.update_id
+
+    def start(self):
+        """Avvia i worker (una sola volta)"""
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+            for update_queue in self.queues:
+                threading.Thread(target=self.worker, args=(update_queue,), daemon=True).start()
+
+    def submit(self, update, timeout=UPDATE_ENQUEUE_TIMEOUT):
+        """Accoda l'update, ritorna False se la coda della chat è piena"""
+        if not self.started:
+            self.start()
+        update_queue = self.queues[hash(self.chat_key(update)) % len(self.queues)]
+        try:
+            update_queue.put(update, timeout=timeout)
+        except queue.Full:
+            metrics.inc('updates_received_total', outcome='rejected')
+            return False
+        metrics.inc('updates_received_total', outcome='queued')
+        return True
+
+    def worker(self, update_queue):
+        """Esegue gli handler per gli update di una coda, uno alla volta"""
+        while True:
+            update = update_queue.get()
+            started = time.monotonic()
+            try:
+                # I comandi possono modificare canali salvati da altri processi
+                registry.refresh()
+                bot.process_new_updates([update])
+            except Exception as e:
+                logger.error(f"❌ Errore nell'elaborazione dell'update {update.update_id}: {e}")
+            finally:
+                metrics.observe('update_processing_seconds', time.monotonic() - started)
+                update_queue.task_done()
+
+    def __len__(self):
+        return sum(update_queue.qsize() for update_queue in self.queues)
+
+update_dispatcher = UpdateDispatcher()
+metrics.gauge('update_queue_depth', "Update del webhook in attesa di elaborazione", lambda: len(update_dispatcher))
+
 @app.route(f'/{TELEGRAM_BOT_TOKEN}', methods=['POST'])
 def webhook():
-    """Webhook per ricevere messaggi da Telegram"""
+    """Webhook per ricevere messaggi da Telegram (risponde subito, gli handler girano in background)"""
     if request.headers.get('content-type') == 'application/json':
         json_string = request.get_data().decode('utf-8')
         update = telebot.types.Update.de_json(json_string)
-        bot.process_new_updates([update])
+        if not update_dispatcher.submit(update):
+            logger.warning(f"⚠️ Coda update piena, update {update.update_id} rifiutato")
+            return 'Too Many Requests', 503, {'Retry-After': str(UPDATE_RETRY_AFTER)}
         return ''
     else:
         return 'Bad Request', 400
@@ -640,15 +4084,77 @@ def start_polling_fallback():
     polling = threading.Thread(target=polling_thread, daemon=True)
     polling.start()
 
-def main():
-    """Funzione principale"""
-    logger.info("🤖 Avvio Bot Telegram Multi-Canale per Render")
-    logger.info(f"📢 Account Twitter monitorato: @{TWITTER_USERNAME}")
-    logger.info(f"🌐 Porta: {PORT}")
+class LeaderLock:
+    """
+    Lock esclusivo su file (flock) che elegge un solo processo leader tra i worker
+    Gunicorn e gli eventuali processi monitor. Il sistema operativo lo rilascia
+    quando il processo termina, così un altro processo può subentrare.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def try_acquire(self):
+        """Prova a diventare leader senza attendere, ritorna True se il lock è nostro"""
+        if self.file is not None:
+            return True
+        if fcntl is None:
+            logger.warning("⚠️ Lock su file non disponibile: questo processo fa da leader")
+            self.file = True
+            return True
+        
+        f = open(self.path, 'a+')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self.file = f
+        return True
+
+    @property
+    def held(self):
+        return self.file is not None
+
+leader_lock = LeaderLock(LEADER_LOCK_FILE)
+started_role = None
+started_role_lock = threading.Lock()
+stores_lock = threading.Lock()
+
+def open_stores():
+    """
+    Apre registro dei canali, database SQLite, cache delle immagini e salute delle istanze
+    (una sola volta per processo). Chiamata da start() e dai processi di consegna, così
+    l'import del modulo resta senza effetti collaterali.
+    """
+    global registry, posted_tweets, message_index, instance_health, media_cache, delivery_queue
+    with stores_lock:
+        if registry is not None:
+            return
+        posted_tweets = PostedTweetsStore(POSTED_TWEETS_DB)
+        message_index = MessageIndex(MESSAGE_INDEX_DB)
+        instance_health = InstanceHealth(INSTANCE_HEALTH_FILE)
+        media_cache = MediaCache(MEDIA_CACHE_DIR)
+        delivery_queue = DeliveryQueue(DELIVERY_QUEUE_DB)
+        # Per ultimo: registry non None indica che tutti gli archivi sono aperti
+        registry = ChannelRegistry(CHANNELS_FILE)
+        atexit.register(registry.flush)
+
+def start_leader_services():
+    """Servizi eseguiti solo dal leader: monitoraggio, consegne e webhook (o polling)"""
+    logger.info(f"👑 Processo {os.getpid()} eletto leader")
+    posted_tweets.migrate_legacy_file(POSTED_TWEETS_FILE)
+    logger.info(f"📢 Account Twitter monitorati: {', '.join(registry.accounts()) or 'nessuno'}")
     
-    # Avvia il monitoraggio tweet in un thread separato
+    # Avvia il monitoraggio tweet in un thread separato e i worker delle consegne
     tweet_thread = threading.Thread(target=tweet_monitor, daemon=True)
     tweet_thread.start()
+    start_delivery()
     
     # Configura webhook se siamo su Render, altrimenti usa polling
     if WEBHOOK_URL:
@@ -662,16 +4168,54 @@ def main():
         logger.info("🔄 Modalità polling attiva (sviluppo)")
         start_polling_fallback()
 
-# Avvia automaticamente quando importato da Gunicorn
-logger.info("🚀 Inizializzazione automatica")
-main()
+def leader_election():
+    """Attende di diventare leader e avvia i relativi servizi (da eseguire in thread separato)"""
+    while not leader_lock.try_acquire():
+        time.sleep(LEADER_RETRY_INTERVAL)
+    start_leader_services()
 
-if __name__ == "__main__":
-    # Verifica che il token sia configurato
-    if not TELEGRAM_BOT_TOKEN:
-        logger.error("❌ TELEGRAM_BOT_TOKEN non configurato!")
-        exit(1)
+def start(role=BOT_ROLE):
+    """
+    Avvia i servizi del ruolo indicato (una sola volta per processo):
+    "web" solo webhook ed endpoint, "monitor" e "all" concorrono anche per diventare leader.
+    """
+    global started_role
+    with started_role_lock:
+        if started_role is not None:
+            return
+        if role not in ('web', 'monitor', 'all'):
+            logger.error(f"❌ Ruolo sconosciuto: {role}, uso 'all'")
+            role = 'all'
+        started_role = role
+    
+    configure_logging()
+    open_stores()
+    logger.info(f"🤖 Avvio Bot Telegram Multi-Canale (ruolo {role}, pid {os.getpid()})")
+    threading.Thread(target=publish_metrics, daemon=True).start()
+    threading.Thread(target=bot_identity.warm_up, daemon=True).start()
+    if role == 'web':
+        return
+    threading.Thread(target=leader_election, daemon=True).start()
+
+@app.before_request
+def start_on_first_request():
+    """Avvio pigro se il server WSGI non ha chiamato start() (es. Gunicorn senza gunicorn.conf.py)"""
+    if started_role is None:
+        start()
+
+def main():
+    """Funzione principale: python twitter_telegram_bot.py [web|monitor|all]"""
+    role = sys.argv[1] if len(sys.argv) > 1 else BOT_ROLE
+    start(role)
+    
+    if role == 'monitor':
+        # Nessun server web: resta in esecuzione per i thread di monitoraggio e consegna
+        threading.Event().wait()
+        return
     
     # Avvia Flask solo se eseguito direttamente
-    logger.info("🚀 Server Flask attivo (modalità sviluppo)")
+    logger.info(f"🚀 Server Flask attivo sulla porta {PORT} (modalità sviluppo)")
     app.run(host='0.0.0.0', port=PORT, debug=False)
+
+if __name__ == "__main__":
+    main()